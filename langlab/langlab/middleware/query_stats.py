@@ -0,0 +1,144 @@
+import heapq
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('langlab.query_stats')
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def query_shape(sql):
+    """The SQL of a query without its parameters, with IN lists of any length made the same"""
+    return IN_LIST.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that counts and times the queries run through it, and keeps the slowest statements and
+    the number of runs of each query shape. Parameters are never formatted into the SQL, to keep it cheap.
+    """
+    def __init__(self, slowest=3):
+        self.count = 0
+        self.time = 0.0
+        self.slowest = []  # heap of (seconds, sql)
+        self.slowest_size = slowest
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.time += duration
+            self.shapes[query_shape(sql)] += 1
+            if len(self.slowest) < self.slowest_size:
+                heapq.heappush(self.slowest, (duration, sql))
+            elif duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (duration, sql))
+
+    def record(self):
+        """Enters the recorder on all database connections, as a context manager"""
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+    def duplicates(self):
+        return [(count, shape) for shape, count in self.shapes.most_common() if count > 1]
+
+    def summary(self, limit=3, sql_length=200):
+        return {
+            'queries': self.count,
+            'sql_ms': round(self.time * 1000, 2),
+            'slowest': [{'ms': round(duration * 1000, 2), 'sql': sql[:sql_length]}
+                        for duration, sql in sorted(self.slowest, reverse=True)],
+            'duplicates': [{'count': count, 'sql': shape[:sql_length]}
+                           for count, shape in self.duplicates()[:limit]],
+        }
+
+
+def query_budget(view_name):
+    """Query count budget of a view, by its namespaced URL name. See QUERY_STATS_BUDGETS"""
+    return getattr(settings, 'QUERY_STATS_BUDGETS', {}).get(view_name, settings.QUERY_STATS_BUDGET)
+
+
+class RecordedStream:
+    """
+    The content of a streaming response, whose queries run as it is read, recorded chunk by chunk. `finish` is called
+    once, when the content is exhausted or closed.
+    """
+    def __init__(self, content, recorder, finish):
+        self.iterator = iter(content)
+        self.recorder = recorder
+        self.finish = finish
+        self.finished = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            with self.recorder.record():
+                return next(self.iterator)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        if not self.finished:
+            self.finished = True
+            if hasattr(self.iterator, 'close'):
+                self.iterator.close()
+            self.finish()
+
+
+class QueryStatsMiddleware(object):
+    """
+    Records the SQL of a sample of the requests, see QUERY_STATS_SAMPLE_RATE. Sets X-Query-Count, X-Query-Time (in
+    ms) and X-Query-Duplicates on the response, and logs a JSON line to the langlab.query_stats logger, as a warning
+    if the view went over its query or time budget. The headers of a streaming response are sent before its content
+    is read, so it gets none, and its line is logged once the content has been sent.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample_rate = settings.QUERY_STATS_SAMPLE_RATE
+        if not sample_rate or random.random() >= sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder(slowest=settings.QUERY_STATS_SLOWEST)
+        started = time.perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+
+        if response.streaming:
+            response.streaming_content = RecordedStream(
+                response.streaming_content, recorder,
+                lambda: self.log(request, response, recorder, time.perf_counter() - started))
+            return response
+
+        response['X-Query-Count'] = str(recorder.count)
+        response['X-Query-Time'] = '%.2f' % (recorder.time * 1000)
+        response['X-Query-Duplicates'] = str(sum(count - 1 for count, _ in recorder.duplicates()))
+        self.log(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    def log(self, request, response, recorder, elapsed):
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        budget = query_budget(view_name)
+        over_budget = recorder.count > budget or recorder.time > settings.QUERY_STATS_TIME_BUDGET
+        line = dict(recorder.summary(limit=settings.QUERY_STATS_SLOWEST), view=view_name, path=request.path,
+                    method=request.method, status=response.status_code, ms=round(elapsed * 1000, 2),
+                    budget=budget, over_budget=over_budget, streamed=response.streaming)
+        logger.log(logging.WARNING if over_budget else logging.INFO, json.dumps(line))
@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'langlab.middleware.query_stats.QueryStatsMiddleware',  # first, to see the queries of the other middleware
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -155,6 +156,56 @@ LOGOUT_REDIRECT_URL = 'home'
 
 
 
+# Point score
+
+POINT_SCORE_CACHE_SIZE = 4096
+
+# Also keep the counts in the PointScoreCacheEntry table. It is not evicted: rescore_tasks deletes the rows of older
+# point score versions
+
+POINT_SCORE_PERSISTENT_CACHE = False
+
+
+
+# SQL instrumentation, see langlab/middleware/query_stats.py. Share of the requests recorded, 0 to turn it off
+
+QUERY_STATS_SAMPLE_RATE = 0
+
+QUERY_STATS_BUDGET = 10  # queries per request, unless the view is in QUERY_STATS_BUDGETS
+
+# by namespaced URL name. Checked against a seeded database by `manage.py check_query_budgets`
+QUERY_STATS_BUDGETS = {
+    'supervisors:user_list': 12,  # creates the sentinel user on the first request
+    'supervisors:translation_add': 12,
+    'supervisors:translation_cancel': 12,
+    'translators:translate_task': 15,
+    'translators:validate_task': 15,
+    'translators:translation_details': 15,
+}
+
+QUERY_STATS_TIME_BUDGET = 0.5  # seconds of SQL per request
+
+QUERY_STATS_SLOWEST = 3  # statements and duplicated query shapes logged per request
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'langlab.query_stats': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+
+
 # During development only
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'ddo')
@@ -162,3 +213,23 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'ddo')
 # Third party apps configuration
 
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
+
+# Users with more translations and validations than this are deleted by a background job, see translatelab/jobs.py
+
+USER_DELETE_INLINE_LIMIT = 2000
+
+# CSV imports with more rows than this are staged and imported by background jobs, see translatelab/imports.py
+
+IMPORT_INLINE_LIMIT = 2000
+
+# Background jobs, run by the run_jobs command, see translatelab/jobs.py
+
+JOB_FILES_DIR = os.path.join(BASE_DIR, 'job_files')  # uploads and exports of the jobs
+
+JOB_MAX_ATTEMPTS = 3
+
+JOB_RETRY_DELAY = 30  # seconds before a failed job is tried again, doubled for every attempt after
+
+JOB_LEASE = 300  # seconds a running job may go without reporting progress before another worker takes it over
+
+JOB_FILES_RETENTION = 7 * 24 * 3600  # seconds the files of a job are kept, see the purge_job_files command
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'langlab.settings')
 
 application = get_wsgi_application()
+
+# the server scores texts on most task writes, so it loads every sentence splitter once, before the first request
+from translatelab.point_score import splitters  # noqa: E402
+splitters.warm()
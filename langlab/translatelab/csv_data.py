@@ -1,78 +1,114 @@
 import csv
-from io import StringIO
-from django.http import HttpResponse
-from .models import Language
+from io import TextIOWrapper
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from .models import Language, Translation
+from .pagination import chunks
 
+EXPORT_CHUNK_SIZE = 500  # tasks fetched per query when exporting
 
-def csv_export(task_list):
+
+class Echo:
+    """File-like object that returns what is written to it, so that csv.writer formats rows for a streaming response"""
+    def write(self, value):
+        return value
+
+
+def translation_column(language_name):
+    return 'translation_' + language_name.lower()
+
+
+def csv_rows(tasks, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Lines of the CSV export of a queryset of tasks, a column per target language. The columns come from a single query
+    up front, and the tasks are fetched in chunks with their translations, so the lines start right away.
+    """
+    language_names = Language.objects.filter(translations__task__in=tasks).order_by('name')\
+        .values_list('name', flat=True).distinct()
     fieldnames = ['name', 'original_text', 'original_language', 'time_spent']
-    task_dict_list = []
-
-    for task in task_list:
-        name = task.name
-        text = task.source_content
-        lang = task.source_language.name
-        time_spent = 0
-        td = {
-            'name': name,
-            'original_text': text,
-            'original_language': lang,
-            'time_spent': time_spent
-              }
-        for trans in task.translations.all():
-            trans_name = 'translation_'+trans.language.name.lower()
-            if trans.validated_text:
-                trans_text = trans.validated_text
-            else:
-                trans_text = trans.text
-            if trans_name not in fieldnames:
-                fieldnames.append(trans_name)
-            td[trans_name] = trans_text
-        task_dict_list.append(td)
-
-    # Create the HttpResponse object with the appropriate CSV header.
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="task_export.csv"'
+    fieldnames += list(dict.fromkeys(translation_column(name) for name in language_names))
+    writer = csv.DictWriter(Echo(), fieldnames=fieldnames)
+    yield writer.writeheader()
+
+    translations = Translation.objects.select_related('language')\
+        .only('task_id', 'text', 'validated_text', 'language__name')
+    tasks = tasks.select_related('source_language').only('name', 'source_content', 'source_language__name')\
+        .prefetch_related(Prefetch('translations', translations))
+    for chunk in chunks(tasks, chunk_size):
+        for task in chunk:
+            row = {
+                'name': task.name,
+                'original_text': task.source_content,
+                'original_language': task.source_language.name if task.source_language else '',
+                'time_spent': 0,
+            }
+            for trans in task.translations.all():
+                if trans.language:
+                    row[translation_column(trans.language.name)] = trans.validated_text or trans.text
+            yield writer.writerow(row)
 
-    writer = csv.DictWriter(response, fieldnames=fieldnames)
-    writer.writeheader()
-    for task in task_dict_list:
-        writer.writerow(task)
+
+def csv_export(tasks):
+    """Streams the CSV export of a queryset of tasks as a download"""
+    response = StreamingHttpResponse(csv_rows(tasks), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="task_export.csv"'
     return response
 
 
-def csv_import(csv_data):
-    fieldnames = ['name', 'text', 'source language', 'target languages', 'priority', 'instructions']
-    priority_acceptable_values = [1, 2, 3, 4, 5]  # , 'Very low', 'Low', 'Default', 'High', 'Very high']
-    tasks = []
-
-    csv_data.seek(0)
-    csv_reader = csv.DictReader(StringIO(csv_data.read().decode('utf-8')))
-    for row in csv_reader:
-        task = {
-            'name': row.get('name', ''),
-            'text': row.get('text', ''),
-            'instructions': row.get('instructions', ''),
-        }
-        p = row.get('priority')
-        if p:
-            task['priority'] = int(p)
-        else:
-            task['priority'] = 3
-
-        sl = row.get('source_language', '')
-        slq = Language.objects.filter(name=sl) | Language.objects.filter(code=sl)
-        if slq:
-            task['source_language'] = slq.first().id
-        tl = row.get('target_languages', '')
-        if not tl or tl.lower() == 'all':
-            tlq = list(Language.objects.all().values_list('id', flat=True))
-        else:
-            tl_list = [x.strip() for x in tl.split(';')]
-            tl_lookup = '|'.join(tl_list)
-            tlq = list(Language.objects.filter(name__iregex=r'(' + tl_lookup + ')').exclude(name="Unknown").values_list('id', flat=True) |
-                       Language.objects.filter(code__iregex=r'(' + tl_lookup + ')').exclude(name="Unknown").values_list('id', flat=True))
-        task['target_languages'] = tlq
-        tasks.append(task)
-
-    return tasks
+class LanguageLookup:
+    """
+    Ids of the languages by lower-cased name and code, loaded with a single query, so that the languages of imported
+    rows are resolved without a query per row. Names take precedence over codes.
+    """
+    def __init__(self):
+        languages = list(Language.objects.exclude(name='Unknown').order_by('pk').values_list('pk', 'name', 'code'))
+        self.all = [pk for pk, name, code in languages]
+        self.codes = {pk: code for pk, name, code in languages}
+        self.ids = {}
+        for pk, name, code in reversed(languages):  # so that the first language with a code or name wins
+            if code:
+                self.ids[code.lower()] = pk
+        for pk, name, code in reversed(languages):
+            self.ids[name.lower()] = pk
+
+    def get(self, value):
+        return self.ids.get((value or '').strip().lower())
+
+    def targets(self, value):
+        """Ids of a ';' separated list of language names or codes, or of all the languages for 'all' or nothing"""
+        if not value or value.strip().lower() == 'all':
+            return list(self.all)
+        return list(dict.fromkeys(pk for pk in map(self.get, value.split(';')) if pk))
+
+
+def csv_import(csv_file, lookup=None):
+    """
+    Reads an uploaded CSV file of tasks as a stream, and yields a dict per row, with its languages resolved to ids.
+    The columns are name, text, source_language, target_languages (separated by ';', or 'all'), priority and
+    instructions. The priority is None if it is not a number, and the language columns are also kept as they were read.
+    """
+    lookup = lookup or LanguageLookup()
+    csv_file.seek(0)
+    text = TextIOWrapper(csv_file, encoding='utf-8-sig', newline='')
+    try:
+        csv_reader = csv.DictReader(text)
+        for row in csv_reader:
+            try:
+                priority = int(row.get('priority') or 3)
+            except ValueError:
+                priority = None
+            source_language = row.get('source_language', row.get('source language')) or ''
+            target_languages = row.get('target_languages', row.get('target languages')) or ''
+            yield {
+                'line': csv_reader.line_num,
+                'name': row.get('name') or '',
+                'text': row.get('text') or '',
+                'instructions': row.get('instructions') or '',
+                'priority': priority,
+                'source_language': lookup.get(source_language),
+                'target_languages': lookup.targets(target_languages),
+                'source_language_text': source_language,
+                'target_languages_text': target_languages,
+            }
+    finally:
+        text.detach()  # leave the upload open
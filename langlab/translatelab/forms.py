@@ -6,6 +6,7 @@ from django.forms.utils import ValidationError
 
 
 from .models import (Translation, Translator, Language, User, Task, Client)
+from .point_score import PointScore
 
 
 class SupervisorSignUpForm(UserCreationForm):
@@ -119,3 +120,15 @@ class ClientEditForm(forms.ModelForm):
     class Meta:
         model = Client
         fields = ('name', 'email', 'website')
+
+
+class RepricingForm(forms.Form):
+    normalizing_factor = forms.FloatField(initial=50, help_text="The LIX is normalized as (lix + factor) / 2")
+    priority_1 = forms.FloatField(label="Very low priority factor", initial=PointScore.priority_factor[1])
+    priority_2 = forms.FloatField(label="Low priority factor", initial=PointScore.priority_factor[2])
+    priority_3 = forms.FloatField(label="Default priority factor", initial=PointScore.priority_factor[3])
+    priority_4 = forms.FloatField(label="High priority factor", initial=PointScore.priority_factor[4])
+    priority_5 = forms.FloatField(label="Very high priority factor", initial=PointScore.priority_factor[5])
+
+    def priority_factor(self):
+        return {p: self.cleaned_data['priority_%d' % p] for p in PointScore.priority_factor}
@@ -0,0 +1,135 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from itertools import islice
+from django.db import connections, models, transaction
+from django.db.models import F, OuterRef, Value
+
+from .csv_data import LanguageLookup
+from .models import (ImportBatch, ImportRow, ImportRowLanguage, Task, Translation, insert_rows, insert_select,
+                     subquery_count, sync_work_items)
+from .point_score import score_cache, score_texts
+
+IMPORT_BATCH_SIZE = 1000  # rows scored and staged per transaction
+
+ROW_FIELDS = ('batch_id', 'line', 'name', 'text', 'instructions', 'priority', 'source_language_id',
+              'source_language_text', 'target_languages_text', 'errors', 'accepted', 'point_score',
+              'point_score_version', 'word_count', 'sentence_count', 'long_words_count')
+
+
+def row_errors(row):
+    """What keeps an imported row from becoming a task, as a list of messages"""
+    errors = []
+    if not row['name']:
+        errors.append('no name')
+    elif len(row['name']) > Task._meta.get_field('name').max_length:
+        errors.append('name too long')
+    if not row['text']:
+        errors.append('no text')
+    if row['priority'] not in dict(Task.PRIORITY_CHOICES):
+        errors.append('priority is not 1 to 5')
+    if not row['source_language']:
+        errors.append('unknown source language')
+    return errors
+
+
+def stage_import(rows, owner, file_name='', batch_size=IMPORT_BATCH_SIZE, processes=None, lookup=None,
+                 progress=None):
+    """
+    Stores the rows of csv_import() as an ImportBatch owned by `owner`, to be reviewed and then promoted to tasks by
+    promote_import(). The rows are read `batch_size` at a time, so any number of them can be staged, and each batch
+    is validated, scored in parallel by score_texts, and written in one transaction with one insert for its rows and
+    one for their target languages. Rows with errors are staged too, without a score. `progress` is called with the
+    number of rows staged after each batch. With processes=1 the rows are scored in the current process, without a
+    pool. Returns the ImportBatch.
+    """
+    lookup = lookup or LanguageLookup()
+    batch = ImportBatch.objects.create(owner=owner, file_name=file_name[:255])
+    rows = iter(rows)
+    row_count = error_count = 0
+    try:
+        if processes == 1:
+            pool = nullcontext()  # score_texts counts in this process when it has no executor
+        else:
+            connections.close_all()  # don't share the database connection with the worker processes
+            pool = ProcessPoolExecutor(max_workers=processes)
+        with pool as executor:
+            while True:
+                chunk = list(islice(rows, batch_size))
+                if not chunk:
+                    break
+                errors = [', '.join(row_errors(row)) for row in chunk]
+                valid = [row for row, error in zip(chunk, errors) if not error]
+                items = [(row['text'], row['priority'], lookup.codes[row['source_language']] or 'en')
+                         for row in valid]
+                scores = iter(score_texts(items, processes=processes, cache=score_cache, executor=executor))
+                values = []
+                for number, (row, error) in enumerate(zip(chunk, errors), start=row_count + 2):
+                    ps = None if error else next(scores)
+                    values.append((batch.pk, row.get('line') or number, row['name'], row['text'],
+                                   row['instructions'], row['priority'], row['source_language'],
+                                   row.get('source_language_text', ''), row.get('target_languages_text', ''),
+                                   error, True)
+                                  + ((ps.score, ps.version, ps.word_count, ps.sentence_count, ps.long_words_count)
+                                     if ps else (0, 0, 0, 0, 0)))
+                with transaction.atomic():
+                    insert_rows(ImportRow, ROW_FIELDS, values)
+                    # the rows of the chunk by line, as the insert cannot return their ids
+                    ids = dict(ImportRow.objects.filter(batch=batch, line__gte=min(v[1] for v in values))
+                               .values_list('line', 'pk'))
+                    insert_rows(ImportRowLanguage, ('row_id', 'language_id'),
+                                [(ids[v[1]], language_id) for v, row in zip(values, chunk)
+                                 for language_id in row['target_languages']])
+                row_count += len(chunk)
+                error_count += sum(1 for error in errors if error)
+                if progress:
+                    progress(row_count)
+    except Exception:
+        batch.delete()
+        raise
+    ImportBatch.objects.filter(pk=batch.pk).update(status=ImportBatch.STAGED, row_count=row_count,
+                                                   error_count=error_count)
+    batch.refresh_from_db()
+    return batch
+
+
+def importable_rows(batch):
+    """The rows of a batch that become tasks: accepted, without errors, and with a source language still there"""
+    return ImportRow.objects.filter(batch=batch, accepted=True, errors='', source_language__isnull=False)
+
+
+def promote_import(batch, check=None):
+    """
+    Turns the importable rows of a staged batch into tasks owned by its owner, and their target languages into
+    translations, with one INSERT ... SELECT each, and adds their work items. The batch is marked as imported in the
+    same transaction, so it is promoted once. `check` is called before the transaction commits, and may raise to roll
+    it back. Returns the number of tasks created, or None if it was not staged.
+    """
+    now = datetime.now(timezone.utc)
+    languages = ImportRowLanguage.objects.exclude(language=F('row__source_language'))
+    fields = ('owner', 'name', 'source_content', 'instructions', 'source_language', 'priority', 'point_score',
+              'point_score_version', 'word_count', 'sentence_count', 'long_words_count', 'stages_total',
+              'time_created', 'time_updated', 'import_row', 'approved', 'status', 'stages_done')
+    # values_list() tells its expressions apart by identity, so every column gets its own Value()
+    rows = importable_rows(batch).order_by('pk').values_list(
+        Value(batch.owner_id, output_field=models.IntegerField()), F('name'), F('text'), F('instructions'),
+        F('source_language'), F('priority'), F('point_score'), F('point_score_version'), F('word_count'),
+        F('sentence_count'), F('long_words_count'),
+        # new tasks get their progress counters right away, four stages per translation
+        subquery_count(languages.filter(row=OuterRef('pk')), 'row') * 4,
+        *[Value(now, output_field=models.DateTimeField()) for _ in range(2)], F('pk'),
+        Value(False, output_field=models.BooleanField()), *[Value(0, output_field=models.IntegerField())
+                                                            for _ in range(2)])
+    translations = languages.filter(row__batch=batch, row__task__isnull=False).order_by('pk').values_list(
+        F('row__task'), F('language'), *[Value('', output_field=models.TextField()) for _ in range(3)])
+    with transaction.atomic():
+        if not ImportBatch.objects.filter(pk=batch.pk, status=ImportBatch.STAGED)\
+                .update(status=ImportBatch.IMPORTED, time_imported=now):
+            return None
+        created = insert_select(Task, fields, rows)
+        insert_select(Translation, ('task', 'language', 'text', 'validated_text', 'comment'), translations)
+        sync_work_items(Translation.objects.filter(task__import_row__batch=batch).values('pk'))
+        ImportBatch.objects.filter(pk=batch.pk).update(task_count=created)
+        if check:
+            check()
+    return created
@@ -0,0 +1,303 @@
+import csv
+import json
+import logging
+import os
+import re
+import socket
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.functions import Greatest
+from django.urls import reverse
+
+from .csv_data import csv_import, csv_rows
+from .imports import promote_import, stage_import
+from .models import ImportBatch, Job, Task, User
+from .rescoring import rescore_batches, stale_tasks
+from .users import delete_user
+from .xml_data import tmx_lines, xliff_archive
+
+logger = logging.getLogger('translatelab.jobs')
+
+JobKind = namedtuple('JobKind', ['function', 'label'])
+
+JOB_KINDS = {}
+
+
+def job_kind(name, label):
+    """
+    Registers a function as the kind of job `name`. It is called with the Job and its arguments, and returns a message
+    about the outcome. It may set job.result_url, and must call keep_claim(), which also reports its progress, at
+    least every JOB_LEASE seconds.
+    """
+    def register(function):
+        JOB_KINDS[name] = JobKind(function, label)
+        return function
+    return register
+
+
+class JobError(Exception):
+    """An error that another attempt would not get past, which fails the job right away"""
+
+
+class JobLost(Exception):
+    """The lease of a running job ran out and it was taken over or failed, so the worker must stop running it"""
+
+
+def job_label(job):
+    kind = JOB_KINDS.get(job.kind)
+    return kind.label if kind else job.kind
+
+
+def job_file(name):
+    """Path of a file that a job reads or writes, in JOB_FILES_DIR"""
+    os.makedirs(settings.JOB_FILES_DIR, exist_ok=True)
+    return os.path.join(settings.JOB_FILES_DIR, name)
+
+
+def enqueue(kind, owner=None, **arguments):
+    """Queues a job of a registered kind, to be run by the run_jobs command. Returns the Job"""
+    if kind not in JOB_KINDS:
+        raise ValueError('Unknown kind of job: %s' % kind)
+    return Job.objects.create(kind=kind, owner=owner, arguments=json.dumps(arguments),
+                              run_after=datetime.now(timezone.utc))
+
+
+def pending_jobs(kind, **arguments):
+    """The queued and running jobs of a kind with exactly these arguments"""
+    return Job.objects.filter(kind=kind, arguments=json.dumps(arguments), status__in=(Job.QUEUED, Job.RUNNING))
+
+
+def claim_job(worker):
+    """
+    Takes the next job that is due, or that was running on a worker that stopped reporting, for `worker`. The check
+    and the write are a single conditional UPDATE on the number of attempts, so of any number of workers exactly one
+    gets a job. Jobs whose worker stopped reporting during their last attempt are failed instead. Returns the Job, or
+    None if no job is due.
+    """
+    now = datetime.now(timezone.utc)
+    Job.objects.filter(status=Job.RUNNING, locked_until__lt=now, attempts__gte=settings.JOB_MAX_ATTEMPTS).update(
+        status=Job.FAILED, message='The worker stopped reporting during the last attempt', locked_until=None,
+        time_finished=now)
+    due = Q(status=Job.QUEUED, run_after__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now,
+                                                        attempts__lt=settings.JOB_MAX_ATTEMPTS)
+    for pk, attempts in Job.objects.filter(due).order_by('run_after', 'pk').values_list('pk', 'attempts')[:10]:
+        claimed = Job.objects.filter(due, pk=pk, attempts=attempts).update(
+            status=Job.RUNNING, attempts=attempts + 1, worker=worker, time_started=now,
+            locked_until=now + timedelta(seconds=settings.JOB_LEASE))
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def report_progress(job, progress=None, total=None):
+    """Extends the lease of a running job, and stores its progress if given. Returns False if it lost its claim"""
+    now = datetime.now(timezone.utc)
+    values = {'locked_until': now + timedelta(seconds=settings.JOB_LEASE)}
+    if progress is not None:
+        values['progress'] = progress
+    if total is not None:
+        values['total'] = total
+    return bool(Job.objects.filter(pk=job.pk, attempts=job.attempts, status=Job.RUNNING).update(**values))
+
+
+def keep_claim(job, progress=None, total=None):
+    """report_progress(), which raises JobLost if the job lost its claim, so that the worker stops running it"""
+    if not report_progress(job, progress, total):
+        raise JobLost('Job %d was taken over' % job.pk)
+
+
+def run_job(job):
+    """
+    Runs a claimed job. If it raises an exception it is queued again, after JOB_RETRY_DELAY seconds doubled for
+    every attempt before, until it has had JOB_MAX_ATTEMPTS attempts. Returns whether it succeeded.
+    """
+    kind = JOB_KINDS.get(job.kind)
+    claim = Job.objects.filter(pk=job.pk, attempts=job.attempts, status=Job.RUNNING)
+    try:
+        if kind is None:
+            raise JobError('Unknown kind of job: %s' % job.kind)
+        message = kind.function(job, **json.loads(job.arguments)) or ''
+    except JobLost:
+        logger.warning('Job %d (%s) lost its claim, attempt %d', job.pk, job.kind, job.attempts)
+        return False
+    except Exception as e:
+        logger.exception('Job %d (%s) failed, attempt %d', job.pk, job.kind, job.attempts)
+        now = datetime.now(timezone.utc)
+        message = str(e) if isinstance(e, JobError) else '%s: %s' % (type(e).__name__, e)
+        if isinstance(e, JobError) or job.attempts >= settings.JOB_MAX_ATTEMPTS:
+            claim.update(status=Job.FAILED, message=message, locked_until=None, time_finished=now)
+        else:
+            delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            claim.update(status=Job.QUEUED, message=message, locked_until=None,
+                         run_after=now + timedelta(seconds=delay))
+        return False
+    claim.update(status=Job.DONE, progress=Greatest('progress', 'total'), message=message, result_url=job.result_url,
+                 locked_until=None, time_finished=datetime.now(timezone.utc))
+    return True
+
+
+def worker_name():
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+def work(worker=None, poll_interval=1.0, burst=False, stopping=None):
+    """
+    Claims and runs jobs one after the other, and waits `poll_interval` seconds when none are due, until the
+    `stopping` event is set, or until none are due if `burst`. Returns the number of jobs run.
+    """
+    worker = worker or worker_name()
+    count = 0
+    while not (stopping and stopping.is_set()):
+        job = claim_job(worker)
+        if job is None:
+            if burst:
+                break
+            if stopping:
+                stopping.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+        run_job(job)
+        count += 1
+    return count
+
+
+@job_kind('stage_import', 'Reading the CSV file')
+def stage_import_job(job, path, file_name):
+    """
+    Stages an uploaded CSV file for review, see imports.stage_import(). The file is removed once the job is done or
+    failed for good, and kept for the next attempt otherwise
+    """
+    finished = False
+    try:
+        with open(path, 'rb') as csv_file:
+            batch = stage_import(csv_import(csv_file), job.owner, file_name=file_name,
+                                 progress=lambda rows: keep_claim(job, rows))
+        finished = True
+    except (UnicodeDecodeError, csv.Error, FileNotFoundError) as e:
+        finished = True
+        raise JobError('Could not read the file: %s' % e)
+    except JobLost:
+        raise  # another worker has the job, and the file
+    except Exception:
+        finished = job.attempts >= settings.JOB_MAX_ATTEMPTS
+        raise
+    finally:
+        if finished and os.path.exists(path):
+            os.remove(path)
+    job.result_url = reverse('supervisors:task_csv_import_review', args=[batch.pk])
+    return '%d rows read, %d with errors' % (batch.row_count, batch.error_count)
+
+
+@job_kind('promote_import', 'Importing the tasks')
+def promote_import_job(job, batch):
+    batch = ImportBatch.objects.filter(pk=batch).first()
+    if batch is None:
+        raise JobError('The import was discarded')
+    created = promote_import(batch, check=lambda: keep_claim(job))
+    job.result_url = reverse('supervisors:task_change_list')
+    if created is None:
+        return 'The tasks were imported already'
+    return '%d tasks imported' % created
+
+
+@job_kind('delete_user', 'Deleting a user')
+def delete_user_job(job, user):
+    job.result_url = reverse('supervisors:user_list')
+    user = User.objects.filter(pk=user).first()
+    if user is None:
+        return 'The user was deleted already'
+    delete_user(user, check=lambda: keep_claim(job))
+    return 'The user %s was deleted' % user.username
+
+
+EXPORT_WRITERS = {  # format: (writer of a queryset of tasks, file name)
+    'csv': (csv_rows, 'task_export.csv'),
+    'xliff': (xliff_archive, 'task_export.zip'),
+    'tmx': (tmx_lines, 'task_export.tmx'),
+}
+
+
+EXPORT_FILE = re.compile(r'export-(\d+)-')  # the start of the names of export files and their parts
+
+
+def export_path(job):
+    """Where the export job `job` writes its file, and the name it is downloaded under"""
+    file_name = EXPORT_WRITERS[json.loads(job.arguments)['format']][1]
+    return job_file('export-%d-%s' % (job.pk, file_name)), file_name
+
+
+@job_kind('export', 'Exporting tasks')
+def export_job(job, tasks, format):
+    """
+    Writes the export of the given tasks to a file in JOB_FILES_DIR, to be downloaded with job_download. Every attempt
+    writes its own file, which replaces the export only while the attempt still has its claim.
+    """
+    writer = EXPORT_WRITERS[format][0]
+    path, file_name = export_path(job)
+    part = '%s.%d.part' % (path, job.attempts)
+    try:
+        with open(part, 'wb') as file:
+            renewed = time.monotonic()
+            for piece in writer(Task.objects.filter(pk__in=tasks)):
+                file.write(piece if isinstance(piece, bytes) else piece.encode('utf-8'))
+                if time.monotonic() - renewed > settings.JOB_LEASE / 3:
+                    keep_claim(job)
+                    renewed = time.monotonic()
+        keep_claim(job)
+        os.replace(part, path)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    job.result_url = reverse('supervisors:job_download', args=[job.pk])
+    return '%d tasks exported' % len(tasks)
+
+
+def purge_job_files(retention=None):
+    """
+    Removes the files in JOB_FILES_DIR last written more than `retention` seconds ago, JOB_FILES_RETENTION by default,
+    that no queued or running job still needs: exports, uploads, and the parts left by workers that stopped. The
+    export jobs whose file was removed lose their result_url. Returns the number of files removed.
+    """
+    if not os.path.isdir(settings.JOB_FILES_DIR):
+        return 0
+    cutoff = time.time() - (settings.JOB_FILES_RETENTION if retention is None else retention)
+    pending = set()
+    needed = set()
+    for pk, arguments in Job.objects.filter(status__in=(Job.QUEUED, Job.RUNNING)).values_list('pk', 'arguments'):
+        pending.add(pk)
+        path = json.loads(arguments).get('path')
+        if path:
+            needed.add(os.path.basename(path))
+    removed = 0
+    exports = set()
+    with os.scandir(settings.JOB_FILES_DIR) as entries:
+        for entry in entries:
+            match = EXPORT_FILE.match(entry.name)
+            pk = int(match.group(1)) if match else None
+            if entry.name in needed or pk in pending or entry.stat().st_mtime >= cutoff:
+                continue
+            os.remove(entry.path)
+            removed += 1
+            if pk is not None:
+                exports.add(pk)
+    Job.objects.filter(pk__in=exports, kind='export', status=Job.DONE).update(result_url='')
+    return removed
+
+
+@job_kind('rescore', 'Re-scoring tasks')
+def rescore_job(job):
+    """Re-scores the tasks that are behind the point score algorithm, see rescoring.py"""
+    total = stale_tasks().count()
+    keep_claim(job, 0, total)
+    done = changed = 0
+    for last_id, count, changes in rescore_batches(processes=1):
+        done += count
+        changed += len(changes)
+        keep_claim(job, done)
+    job.result_url = reverse('supervisors:task_change_list')
+    return '%d tasks re-scored, %d changed' % (done, changed)
@@ -0,0 +1,117 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Client, PointsEntry, Task, Translator
+
+# (ledger field, account model, stored balance field)
+ACCOUNTS = (
+    ('translator', Translator, 'points_earned'),
+    ('client', Client, 'points_owed'),
+)
+
+ROLL_UP_BATCH_SIZE = 1000  # ledger entries rolled up per transaction, and ids per IN clause
+
+
+def points_balance(account, prefix=''):
+    """
+    Expression for the balance of translators (account 'translator') or clients ('client'), to annotate a queryset of
+    them as points_balance, which get_points() then uses. `prefix` is the path to the account from the queryset model,
+    such as 'translator__' for users.
+    """
+    field = dict((a, f) for a, _, f in ACCOUNTS)[account]
+    tail = PointsEntry.objects\
+        .filter(**{account: OuterRef(prefix + 'pk')}, rolled_up=False)\
+        .order_by().values(account).annotate(total=Sum('points')).values('total')
+    return F(prefix + field) + Coalesce(Subquery(tail), Value(0))
+
+
+def approve_task(task):
+    """
+    Approves a completed task and books its points to the translator and the validator of every translation, and to
+    the client. Approving is a conditional UPDATE, so the points of a task are only booked once, and the entries are
+    written with a single bulk insert. Returns whether the task was approved.
+    """
+    with transaction.atomic():
+        if not Task.objects.filter(pk=task.pk, approved=False, status=100).update(approved=True):
+            return False
+        points = task.point_score
+        entries = []
+        for translation_id, translator_id, validator_id in task.translations.values_list('pk', 'translator_id',
+                                                                                         'validator_id'):
+            for account_id, reason in ((translator_id, PointsEntry.TRANSLATION),
+                                       (validator_id, PointsEntry.VALIDATION)):
+                if account_id:
+                    entries.append(PointsEntry(translator_id=account_id, task_id=task.pk, translation_id=translation_id,
+                                               points=points, reason=reason))
+        if task.client_id:
+            entries.append(PointsEntry(client_id=task.client_id, task_id=task.pk, points=points,
+                                       reason=PointsEntry.ORDER))
+        PointsEntry.objects.bulk_create(entries)
+    task.approved = True
+    return True
+
+
+def roll_up_points(until=None, batch_size=ROLL_UP_BATCH_SIZE):
+    """
+    Folds the ledger entries that are not rolled up yet, up to the entry `until` if given, into the stored balances of
+    their accounts. Each batch of entries is locked, marked as rolled up and added to the balances in one transaction,
+    so concurrent roll-ups cannot count an entry twice. Entries are picked by their flag, not by their id or time, so
+    an entry whose transaction commits late is rolled up by the next run. Returns the number of accounts updated.
+    """
+    accounts = set()
+    while True:
+        with transaction.atomic():
+            pending = PointsEntry.objects.select_for_update().filter(rolled_up=False)
+            if until is not None:
+                pending = pending.filter(pk__lte=until)
+            entries = list(pending.order_by('pk').values_list(
+                'pk', 'points', *[account for account, _, _ in ACCOUNTS])[:batch_size])
+            if not entries:
+                return len(accounts)
+            PointsEntry.objects.filter(pk__in=[entry[0] for entry in entries]).update(rolled_up=True)
+            for index, (account, model, field) in enumerate(ACCOUNTS, start=2):
+                totals = defaultdict(int)
+                for entry in entries:
+                    if entry[index]:
+                        totals[entry[index]] += entry[1]
+                for account_id, total in totals.items():
+                    model.objects.filter(pk=account_id).update(**{field: F(field) + total})
+                    accounts.add((account, account_id))
+        if len(entries) < batch_size:
+            return len(accounts)
+
+
+def replay_balances():
+    """
+    Replays the whole ledger and compares the result with the balances. Returns (account, id, balance, replayed) for
+    every account where they differ.
+    """
+    mismatches = []
+    for account, model, field in ACCOUNTS:
+        replayed = dict(PointsEntry.objects.filter(**{account + '__isnull': False}).order_by()
+                        .values_list(account).annotate(total=Sum('points')))
+        for account_id, balance in model.objects.annotate(points_balance=points_balance(account))\
+                .values_list('pk', 'points_balance'):
+            if balance != replayed.get(account_id, 0):
+                mismatches.append((account, account_id, balance, replayed.get(account_id, 0)))
+    return mismatches
+
+
+def open_balances():
+    """
+    Moves the balances of accounts that have no ledger entries yet, from before the ledger, into an opening entry, so
+    that the ledger explains every balance. Returns the number of entries written.
+    """
+    count = 0
+    for account, model, field in ACCOUNTS:
+        with transaction.atomic():
+            accounts = list(model.objects.select_for_update(of=('self', )).filter(points_entries__isnull=True)
+                            .exclude(**{field: 0}).values_list('pk', field))
+            PointsEntry.objects.bulk_create([PointsEntry(**{account + '_id': account_id}, points=balance,
+                                                         reason=PointsEntry.OPENING)
+                                             for account_id, balance in accounts])
+            model.objects.filter(pk__in=[account_id for account_id, _ in accounts]).update(**{field: 0})
+            count += len(accounts)
+    return count
@@ -0,0 +1,109 @@
+import random
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from ...ledger import approve_task
+from ...models import Client, Language, Task, Translation, Translator, User, translation_batch
+from ...point_score import score_texts, splitter_language
+from .bench_point_score import VOCABULARY, generate_corpus
+
+# Shared by the commands that need a realistic database: check_query_budgets, load_harness
+
+LANGUAGES = (
+    ('English', 'gb'), ('Danish', 'dk'), ('German', 'de'), ('French', 'fr'),
+    ('Spanish', 'es'), ('Italian', 'it'), ('Dutch', 'nl'), ('Swedish', 'se'),
+)
+
+PASSWORD = 'dataset-password'
+
+Dataset = namedtuple('Dataset', ['languages', 'supervisors', 'translators', 'clients', 'tasks'])
+
+
+@contextmanager
+def test_database(name=None):
+    """
+    Runs the block on a fresh test database, as the test runner would, and destroys it afterwards. `name` overrides the
+    name of the test database, e.g. to put an SQLite one in a file rather than in memory.
+    """
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    if name:
+        connection.settings_dict['TEST']['NAME'] = name
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def seed_dataset(scale=1, prefix='ds', seed=0):
+    """
+    Creates supervisors, translators, clients, and tasks whose translations are spread over every stage, from open
+    to approved. `scale` multiplies the number of all of them, and `prefix` keeps the names of several datasets in one
+    database apart. All users have the password PASSWORD. Returns a Dataset of the created objects.
+    """
+    rng = random.Random('%s:%d:%d' % (prefix, scale, seed))
+    now = datetime.now(timezone.utc)
+    languages = [Language.objects.get_or_create(name=name, code=code)[0] for name, code in LANGUAGES]
+
+    supervisors = [User.objects.create_user('%s-supervisor%d' % (prefix, i), password=PASSWORD, is_supervisor=True)
+                   for i in range(2 * scale)]
+    translators = []
+    spoken = {}
+    for i in range(10 * scale):
+        user = User.objects.create_user('%s-translator%d' % (prefix, i), password=PASSWORD, is_translator=True)
+        translator = Translator.objects.create(user=user)
+        translator_languages = rng.sample(languages, rng.randint(2, 4))
+        translator.languages.add(*translator_languages)
+        spoken[translator.pk] = {language.pk for language in translator_languages}
+        translators.append(translator)
+    clients = [Client.objects.create(name='%s client %d' % (prefix, i), code='%s-%d' % (prefix, i))
+               for i in range(5 * scale)]
+
+    specs = []
+    for i in range(20 * scale):
+        source = rng.choice(languages)
+        language = splitter_language(source.code)
+        text = generate_corpus(language if language in VOCABULARY else 'en', rng.randint(50, 400), seed=i)
+        specs.append((source, rng.choice(clients + [None]), rng.randint(1, 5), text))
+    scores = score_texts([(text, priority, source.code) for source, _, priority, text in specs])
+
+    tasks = []
+    with translation_batch() as batch:
+        for i, ((source, client, priority, text), score) in enumerate(zip(specs, scores)):
+            task = Task.objects.create(owner=rng.choice(supervisors), name='%s task %d' % (prefix, i), client=client,
+                                       source_content=text, source_language=source, priority=priority,
+                                       point_score=score.score, point_score_version=score.version,
+                                       word_count=score.word_count, sentence_count=score.sentence_count,
+                                       long_words_count=score.long_words_count)
+            tasks.append(task)
+            targets = rng.sample([language for language in languages if language != source], rng.randint(1, 4))
+            Translation.objects.bulk_create([Translation(task=task, language=target) for target in targets])
+        batch.add_tasks([task.pk for task in tasks])
+
+    # move the translations along: 0 open, 1 translating, 2 translated, 3 validating, 4 validated
+    with translation_batch():
+        for translation in Translation.objects.filter(task__in=tasks).select_related('task'):
+            stage = rng.choice((0, 1, 2, 2, 3, 4, 4, 4))
+            pair = {translation.language_id, translation.task.source_language_id}
+            qualified = [t for t in translators if pair <= spoken[t.pk]] or translators
+            if stage >= 1:
+                translation.claim_translation(rng.choice(qualified))
+            if stage >= 2:
+                translation.text = 'Translated text'
+                translation.translation_time_finished = now
+                translation.save()
+            if stage >= 3:
+                translation.claim_validation(rng.choice([t for t in translators if t != translation.translator]))
+            if stage >= 4:
+                translation.validation_time_finished = now
+                translation.save()
+
+    for i, task in enumerate(Task.objects.filter(pk__in=[task.pk for task in tasks], status=100).order_by('pk')):
+        if i % 2 == 0:  # leave the others awaiting approval
+            approve_task(task)
+    return Dataset(languages, supervisors, translators, clients, tasks)
@@ -0,0 +1,163 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ...point_score import PUNCTUATION_TABLE, PointScore, splitters
+
+VOCABULARY = {
+    'en': ('the of and to in is was for that with as on by at from his her they this which translation document '
+           'important government international information development understanding relationship performance '
+           'community experience particularly'),
+    'da': ('og i at det en den til er som på de med han af for ikke der var mig sig men et har om vi oversættelse '
+           'dokumentet regeringen international information udviklingen forståelse forholdet'),
+    'de': ('der die und in den von zu das mit sich des auf für ist im dem nicht ein eine als auch Übersetzung '
+           'Dokument Regierung international Information Entwicklung Verständnis Beziehung'),
+    'fr': ('de la le et les des en un du une que est pour qui dans par plus pas au sur traduction document '
+           'gouvernement international information développement compréhension relation'),
+    'es': ('de la que el en y a los se del las un por con no una su para es traducción documento gobierno '
+           'internacional información desarrollo comprensión relación'),
+}
+
+# The flag each language is given as Language.code, which is what PointScore takes
+FLAGS = {'en': 'gb', 'da': 'dk', 'de': 'de', 'fr': 'fr', 'es': 'es'}
+
+# Abbreviations the splitter should not break on, to exercise the non-breaking prefixes
+ABBREVIATIONS = {
+    'en': ('Mr.', 'Dr.', 'e.g.', 'No.'),
+    'da': ('hr.', 'f.eks.', 'nr.'),
+    'de': ('Dr.', 'z.B.', 'Nr.'),
+    'fr': ('M.', 'p.ex.', 'av.'),
+    'es': ('Sr.', 'p.ej.', 'núm.'),
+}
+
+DEFAULT_SIZES = '100,1000,10000,100000,1000000'
+
+
+def generate_corpus(language, words, seed=0):
+    """Returns a reproducible text of about `words` words in the language, in sentences and paragraphs"""
+    rng = random.Random('%s:%d:%d' % (language, words, seed))
+    vocabulary = VOCABULARY[language].split()
+    abbreviations = ABBREVIATIONS[language]
+    parts = []
+    count = 0
+    while count < words:
+        length = min(rng.randint(5, 25), words - count)
+        sentence = [rng.choice(vocabulary) for _ in range(length)]
+        if length > 3 and rng.random() < 0.1:
+            sentence[rng.randrange(1, length - 1)] = rng.choice(abbreviations)
+        if length > 6 and rng.random() < 0.3:
+            sentence[length // 2] += ','
+        parts.append(' '.join(sentence).capitalize() + rng.choice('...?!'))
+        parts.append('\n\n' if rng.random() < 0.15 else ' ')
+        count += length
+    return ''.join(parts).strip()
+
+
+def bench_phases(text, language):
+    """Times the phases of PointScore._count_it_up on the text"""
+    splitter = splitters.for_language(language)
+    started = time.perf_counter()
+    sentences = splitter.split(text=text)
+    split_done = time.perf_counter()
+    stripped = [sentence.translate(PUNCTUATION_TABLE) for sentence in sentences]
+    strip_done = time.perf_counter()
+    word_count = 0
+    long_words_count = 0
+    for sentence in stripped:
+        for word in sentence.split():
+            word_count += 1
+            if len(word) >= 7:
+                long_words_count += 1
+    count_done = time.perf_counter()
+    return {
+        'split': split_done - started,
+        'strip': strip_done - split_done,
+        'count': count_done - strip_done,
+        'words': word_count,
+        'sentences': len(sentences),
+    }
+
+
+def peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              check=True, universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the point score algorithm on generated corpora, and saves the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Comma separated corpus sizes, in words')
+        parser.add_argument('--languages', default=','.join(VOCABULARY), help='Comma separated language codes')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement. The median is reported')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='bench_point_score.json', help='File the JSON results are saved to')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        languages = options['languages'].split(',')
+        unknown = [language for language in languages if language not in VOCABULARY]
+        if unknown:
+            raise CommandError('No corpus for the languages: %s. Choose from %s' % (', '.join(unknown),
+                                                                                  ', '.join(VOCABULARY)))
+        repeat = max(options['repeat'], 1)
+        splitters.warm(languages)
+
+        results = []
+        for language in languages:
+            for size in sizes:
+                text = generate_corpus(language, size, options['seed'])
+                phases = [bench_phases(text, language) for _ in range(repeat)]
+                totals = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    PointScore(text, language=FLAGS[language]).score()
+                    totals.append(time.perf_counter() - started)
+                total = statistics.median(totals)
+                result = {
+                    'language': language,
+                    'words': phases[0]['words'],
+                    'sentences': phases[0]['sentences'],
+                    'characters': len(text),
+                    'seconds': total,
+                    'words_per_second': phases[0]['words'] / total if total else None,
+                    'phases': {phase: statistics.median(p[phase] for p in phases)
+                               for phase in ('split', 'strip', 'count')},
+                    'peak_memory': peak_memory(lambda: PointScore(text, language=FLAGS[language])),
+                    'peak_memory_stream': peak_memory(lambda: PointScore.from_stream(text, language=FLAGS[language])),
+                }
+                results.append(result)
+                self.stdout.write('%(language)s %(words)9d words  %(words_per_second)12.0f words/s  '
+                                  'peak %(peak_memory)11d B  stream %(peak_memory_stream)11d B' % result)
+
+        report = {
+            'time': timezone.now().isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'point_score_version': PointScore.version,
+            'repeat': repeat,
+            'seed': options['seed'],
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS('Results saved to %s' % options['output']))
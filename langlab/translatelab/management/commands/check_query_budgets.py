@@ -0,0 +1,215 @@
+import tempfile
+import time
+from collections import namedtuple
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client as TestClient, override_settings
+from django.urls import URLPattern, URLResolver, reverse
+
+from langlab.middleware.query_stats import QueryRecorder, query_budget
+from ... import urls
+from ...imports import stage_import
+from ...jobs import enqueue, work
+from ...models import ImportBatch, Job, Language, Task, User, WorkItem
+from ._dataset import seed_dataset, test_database
+
+# How every route of translatelab/urls.py is requested: the roles it is requested as, its URL kwargs, the query
+# string, and whether requesting it changes the data, so that the second pass may legitimately take another path.
+Route = namedtuple('Route', ['roles', 'kwargs', 'query', 'stateful'])
+
+
+def route(roles, kwargs=None, query='', stateful=False):
+    return Route(roles, kwargs or (lambda s: {}), query, stateful)
+
+
+BOTH = ('supervisor', 'translator')
+SUPERVISOR = ('supervisor', )
+TRANSLATOR = ('translator', )
+
+ROUTES = {
+    'home': route(BOTH),
+    'user_profile': route(BOTH),
+    'user_change_password': route(BOTH),
+    'user_update_profile': route(BOTH),
+    'language_style_guide': route(BOTH, lambda s: {'pk': s.language.pk}),
+    'translators:task_list': route(TRANSLATOR),
+    'translators:translator_languages': route(TRANSLATOR),
+    'translators:translation_details': route(TRANSLATOR, lambda s: {'pk': s.translation.pk}),
+    'translators:translate_task': route(TRANSLATOR, lambda s: {'pk': s.open_translation.pk}, stateful=True),
+    'translators:translation_cancel': route(TRANSLATOR, lambda s: {'pk': s.draft.pk}, stateful=True),
+    'translators:validate_task': route(TRANSLATOR, lambda s: {'pk': s.open_validation.pk}, stateful=True),
+    'supervisors:task_change_list': route(SUPERVISOR),
+    'supervisors:languages_edit': route(SUPERVISOR),
+    'supervisors:language_staffing': route(SUPERVISOR),
+    'supervisors:language_delete': route(SUPERVISOR, lambda s: {'pk': s.language.pk}),
+    'supervisors:language_update': route(SUPERVISOR, lambda s: {'pk': s.language.pk}),
+    'supervisors:user_list': route(SUPERVISOR),
+    'supervisors:user_details': route(SUPERVISOR, lambda s: {'pk': s.translator.pk}),
+    'supervisors:user_delete': route(SUPERVISOR, lambda s: {'pk': s.bystander.pk}),
+    'supervisors:user_toggle_active': route(SUPERVISOR, lambda s: {'pk': s.bystander.pk}, stateful=True),
+    'supervisors:client_list': route(SUPERVISOR),
+    'supervisors:client_add': route(SUPERVISOR),
+    'supervisors:client_details': route(SUPERVISOR, lambda s: {'pk': s.task.client_id}),
+    'supervisors:client_update': route(SUPERVISOR, lambda s: {'pk': s.task.client_id}),
+    'supervisors:task_add': route(SUPERVISOR),
+    'supervisors:csv_export': route(SUPERVISOR),
+    'supervisors:task_csv_import': route(SUPERVISOR),
+    'supervisors:task_csv_import_review': route(SUPERVISOR, lambda s: {'pk': s.import_batch.pk}),
+    'supervisors:job_details': route(SUPERVISOR, lambda s: {'pk': s.job.pk}),
+    'supervisors:job_status': route(SUPERVISOR, lambda s: {'pk': s.job.pk}),
+    'supervisors:job_download': route(SUPERVISOR, lambda s: {'pk': s.job.pk}),
+    'supervisors:task_repricing': route(SUPERVISOR, query='normalizing_factor=40&priority_1=0.8&priority_2=0.9'
+                                                         '&priority_3=1&priority_4=1.2&priority_5=1.5'),
+    'supervisors:task_details': route(SUPERVISOR, lambda s: {'pk': s.task.pk}),
+    'supervisors:task_change': route(SUPERVISOR, lambda s: {'pk': s.task.pk}),
+    'supervisors:task_delete': route(SUPERVISOR, lambda s: {'pk': s.task.pk}),
+    'supervisors:task_approve': route(SUPERVISOR, lambda s: {'pk': s.completed_task.pk}, stateful=True),
+    'supervisors:csv_export_single': route(SUPERVISOR, lambda s: {'task_pk': s.task.pk}),
+    'supervisors:translation_add': route(SUPERVISOR, lambda s: {'pk': s.task.pk, 'language_pk': s.language.pk},
+                                         stateful=True),
+    'supervisors:translation_details': route(SUPERVISOR, lambda s: {'task_pk': s.task.pk,
+                                                                    'translation_pk': s.translation.pk}),
+    'supervisors:translation_change': route(SUPERVISOR, lambda s: {'task_pk': s.task.pk,
+                                                                   'translation_pk': s.translation.pk}),
+    'supervisors:translation_cancel': route(SUPERVISOR, lambda s: {'task_pk': s.draft.task_id,
+                                                                   'translation_pk': s.draft.pk}, stateful=True),
+    'supervisors:translation_delete': route(SUPERVISOR, lambda s: {'task_pk': s.task.pk,
+                                                                   'translation_pk': s.translation.pk}),
+    'ajax:ajax_language_style_guide': route(BOTH, query='style_guide=1'),
+}
+
+Samples = namedtuple('Samples', ['supervisor', 'translator', 'bystander', 'language', 'task', 'completed_task',
+                                 'translation', 'open_translation', 'open_validation', 'draft', 'import_batch', 'job'])
+
+
+def route_names(patterns, namespace=None):
+    """Namespaced names of all the routes under the URL patterns"""
+    names = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names += route_names(pattern.url_patterns, pattern.namespace or namespace)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.append('%s:%s' % (namespace, pattern.name) if namespace else pattern.name)
+    return names
+
+
+def pick_samples(prefix):
+    """Objects of the dataset with `prefix` to request the routes with. Work that a request consumes is picked anew"""
+    translator = WorkItem.objects.filter(assignee__user__username__startswith=prefix + '-')\
+        .values_list('assignee', flat=True).order_by('assignee').first()
+    translator = User.objects.get(pk=translator)
+    tasks = Task.objects.filter(name__startswith=prefix + ' ').order_by('pk')
+    task = tasks.exclude(client=None).filter(translations__translator__isnull=False).first()
+    work = WorkItem.objects.filter(translation__task__in=tasks).order_by('pk')
+    drafts = work.filter(kind=WorkItem.TRANSLATE, state=WorkItem.DRAFT)
+    return Samples(
+        supervisor=task.owner,  # the supervisor views of a translation only show the tasks of their owner
+        translator=translator,
+        bystander=User.objects.filter(username__startswith=prefix + '-translator').order_by('-pk').first(),
+        language=Language.objects.exclude(name='Unknown').order_by('pk').first(),
+        task=task,
+        completed_task=tasks.filter(status=100).order_by('approved', 'pk').first(),
+        translation=task.translations.filter(translator_id=translator.pk).first()
+        or task.translations.order_by('pk').first(),
+        open_translation=work.filter(kind=WorkItem.TRANSLATE, state=WorkItem.AVAILABLE).first().translation,
+        open_validation=work.filter(kind=WorkItem.VALIDATE, state=WorkItem.AVAILABLE)
+        .exclude(excluded=translator.pk).first().translation,
+        draft=(drafts.filter(assignee=translator.pk).first() or drafts.first()).translation,
+        import_batch=ImportBatch.objects.filter(owner=task.owner, status=ImportBatch.STAGED).order_by('-pk').first(),
+        job=Job.objects.filter(owner=task.owner, kind='export', status=Job.DONE).order_by('-pk').first(),
+    )
+
+
+def stage_sample_import(prefix, size):
+    """Stages an import of `size` rows for the supervisor of the dataset with `prefix`, every tenth of them invalid"""
+    languages = list(Language.objects.exclude(name='Unknown').order_by('pk').values_list('pk', flat=True))
+    rows = [{'name': 'Imported %d' % number, 'text': 'An imported text, number %d.' % number, 'instructions': '',
+             'priority': 0 if number % 10 == 0 else 3, 'source_language': languages[number % len(languages)],
+             'target_languages': languages[:3]} for number in range(size)]
+    stage_import(rows, pick_samples(prefix).supervisor, file_name='%s.csv' % prefix, processes=1)
+
+
+def run_sample_export(prefix):
+    """Exports the tasks of the dataset with `prefix` with a background job, run right away"""
+    tasks = list(Task.objects.filter(name__startswith=prefix + ' ').values_list('pk', flat=True))
+    enqueue('export', owner=pick_samples(prefix).supervisor, tasks=tasks, format='csv')
+    work(burst=True)
+
+
+class Command(BaseCommand):
+    help = ('Requests every route of translatelab as a supervisor and as a translator on a seeded test database, and '
+            'fails if a route runs more queries than its budget (QUERY_STATS_BUDGETS), takes longer than --max-ms, '
+            'or runs more queries once the dataset has grown')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1, help='Size of the first dataset')
+        parser.add_argument('--growth', type=int, default=3, help='Size of the dataset added for the second pass')
+        parser.add_argument('--max-ms', type=float, default=1000, help='Response time ceiling per request')
+
+    def handle(self, *args, **options):
+        missing = set(route_names(urls.urlpatterns)) - set(ROUTES)
+        if missing:
+            raise CommandError('No budget check for the routes: %s' % ', '.join(sorted(missing)))
+
+        # the files of the jobs go with the test database
+        with test_database(), tempfile.TemporaryDirectory() as job_files, override_settings(JOB_FILES_DIR=job_files):
+            failures = self.check_budgets(options)
+
+        if failures:
+            raise CommandError('%d routes failed their budget' % len(failures))
+        self.stdout.write(self.style.SUCCESS('All routes are within their budgets'))
+
+    def check_budgets(self, options):
+        seed_dataset(scale=options['scale'], prefix='budget')
+        stage_sample_import('budget', 30 * options['scale'])
+        run_sample_export('budget')
+        first = self.run_pass('budget')
+        seed_dataset(scale=options['growth'], prefix='growth')
+        stage_sample_import('budget', 30 * (options['scale'] + options['growth']))
+        second = self.run_pass('budget')
+
+        failures = []
+        self.stdout.write('%-45s %-10s %7s %7s %7s %9s' % ('route', 'role', 'queries', 'grown', 'budget', 'ms'))
+        for key in sorted(first):
+            name, role = key
+            (status, count, elapsed), (status2, count2, elapsed2) = first[key], second[key]
+            budget = query_budget(name)
+            problems = []
+            if max(status, status2) >= 400:
+                problems.append('status %d' % max(status, status2))
+            if max(count, count2) > budget:
+                problems.append('over budget')
+            if count2 > count and not ROUTES[name].stateful:
+                problems.append('grows with the data')
+            if max(elapsed, elapsed2) * 1000 > options['max_ms']:
+                problems.append('too slow')
+            line = '%-45s %-10s %7d %7d %7d %9.1f  %s' % (name, role, count, count2, budget,
+                                                           max(elapsed, elapsed2) * 1000, ', '.join(problems))
+            if problems:
+                failures.append(key)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        return failures
+
+    def run_pass(self, prefix):
+        """Requests every route once per role. Returns (status, queries, seconds) by (route, role)"""
+        samples = pick_samples(prefix)
+        clients = {'supervisor': TestClient(), 'translator': TestClient()}
+        clients['supervisor'].force_login(samples.supervisor)
+        clients['translator'].force_login(samples.translator)
+
+        results = {}
+        # the routes that change the data go last, so that they do not change what the others see
+        for name, spec in sorted(ROUTES.items(), key=lambda item: (item[1].stateful, item[0])):
+            url = reverse(name, kwargs=spec.kwargs(samples))
+            if spec.query:
+                url += '?' + spec.query
+            for role in spec.roles:
+                recorder = QueryRecorder()
+                started = time.perf_counter()
+                with recorder.record():
+                    response = clients[role].get(url)
+                    if response.streaming:
+                        b''.join(response.streaming_content)  # the queries of a streaming response run as it is read
+                results[name, role] = (response.status_code, recorder.count, time.perf_counter() - started)
+        return results
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from ...jobs import enqueue, pending_jobs
+from ...users import count_user_work, pending_deletions
+
+
+class Command(BaseCommand):
+    help = ('Queues a delete_user job for every user marked for deletion that has none queued or running, such as '
+            'after a job failed for good. The users are deleted by the run_jobs workers, never by this command')
+
+    def handle(self, *args, **options):
+        queued = 0
+        for user in pending_deletions():
+            if pending_jobs('delete_user', user=user.pk).exists():
+                continue
+            self.stdout.write('Queueing %s (%d translations and validations)' % (user.username, count_user_work(user)))
+            enqueue('delete_user', user=user.pk)
+            queued += 1
+        self.stdout.write(self.style.SUCCESS('Done. %d deletions queued' % queued))
@@ -0,0 +1,234 @@
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections
+from django.db.models import Count, Max
+from django.test import Client as TestClient
+from django.urls import reverse
+
+from ...ledger import replay_balances, roll_up_points
+from ...models import PointsEntry, Task, Translation, WorkItem, recount_task_progress, sync_work_items
+from ...views.translators import TaskListView
+from ._dataset import seed_dataset, test_database
+
+# Words in the message of a database error that mean the database was locked or busy, for SQLite and PostgreSQL
+LOCK_ERRORS = ('locked', 'busy', 'deadlock', 'could not serialize', 'lock timeout')
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))] if values else 0
+
+
+def logged_in(client, user):
+    client.force_login(user)
+    return client
+
+
+class Stats:
+    """Latencies and outcomes of the requests of all the simulated users, shared by their threads"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.outcomes = defaultdict(Counter)
+        self.errors = Counter()
+        self.claims = []  # (kind, translation id, translator id) of every claim that was won, or draft reopened
+
+    def run(self, action, function, *args):
+        """Calls `function` and records it under `action`. Returns its result, or None if it raised an exception"""
+        started = time.perf_counter()
+        try:
+            result = function(*args)
+        except DatabaseError as e:
+            locked = any(word in str(e).lower() for word in LOCK_ERRORS)
+            self.record(action, started, 'lock error' if locked else 'error', '%s: %s' % (type(e).__name__, e))
+            return None
+        except Exception as e:
+            self.record(action, started, 'error', '%s: %s' % (type(e).__name__, e))
+            return None
+        self.record(action, started, getattr(result, 'status_code', 'ok'))
+        return result
+
+    def request(self, action, client, method, url, data=None):
+        """Requests `url` through the views and records it under `action`. Returns the response, or None on error"""
+        response = self.run(action, getattr(client, method), url, data or {})
+        return response if response is not None and response.status_code < 500 else None
+
+    def record(self, action, started, outcome, error=None):
+        with self.lock:
+            self.latencies[action].append(time.perf_counter() - started)
+            self.outcomes[action][outcome] += 1
+            if error:
+                self.errors[error] += 1
+
+    def claimed(self, kind, translation_id, translator_id):
+        with self.lock:
+            self.claims.append((kind, translation_id, translator_id))
+
+
+class Command(BaseCommand):
+    help = ('Drives the claim, translate, validate and approve views with many concurrent translators and supervisors '
+            'on a seeded test database. Reports throughput, latency percentiles, lock errors, and integrity violations '
+            'such as double claims or lost points, and fails if there are any violations')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--translators', type=int, default=20, help='Concurrent translators')
+        parser.add_argument('--supervisors', type=int, default=3, help='Concurrent supervisors')
+        parser.add_argument('--scale', type=int, default=5, help='Size of the seeded dataset, 20 tasks per unit')
+        parser.add_argument('--duration', type=float, default=60, help='Seconds to run at most')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        # enough users in the dataset for a thread each
+        scale = max(options['scale'], -(-options['translators'] // 10), -(-options['supervisors'] // 2))
+        name = None
+        if connection.vendor == 'sqlite':
+            # the threads of an in-memory SQLite database share a cache that fails every concurrent write at once,
+            # while a file waits for its lock the way a deployment would
+            name = os.path.join(tempfile.gettempdir(), 'langlab_load_harness.sqlite3')
+        with test_database(name):
+            dataset = seed_dataset(scale=scale, prefix='load', seed=options['seed'])
+            tasks = [task.pk for task in dataset.tasks]
+            stats = Stats()
+            elapsed = self.run_users(dataset, stats, options)
+            self.report(stats, elapsed)
+            violations = self.check_integrity(tasks, stats)
+        if violations:
+            raise CommandError('%d integrity violations' % sum(violations.values()))
+        self.stdout.write(self.style.SUCCESS('No integrity violations'))
+
+    def run_users(self, dataset, stats, options):
+        deadline = time.monotonic() + options['duration']
+        translators_done = threading.Event()
+        rng = random.Random(options['seed'])
+        translators = [threading.Thread(target=self.translator, args=(translator.user, stats, deadline,
+                                                                      random.Random(rng.random())))
+                       for translator in dataset.translators[:options['translators']]]
+        supervisors = [threading.Thread(target=self.supervisor, args=(user, stats, deadline, translators_done,
+                                                                      random.Random(rng.random())))
+                       for user in dataset.supervisors[:options['supervisors']]]
+        # the errors are counted in the report instead
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        started = time.perf_counter()
+        for thread in translators + supervisors:
+            thread.start()
+        for thread in translators:
+            thread.join()
+        translators_done.set()
+        for thread in supervisors:
+            thread.join()
+        return time.perf_counter() - started
+
+    def translator(self, user, stats, deadline, rng):
+        """Picks work off the first page of the taskboard, claims it, and finishes it, until there is none left"""
+        client = TestClient()
+        try:
+            if stats.run('login', logged_in, client, user) is None:
+                return
+            pair_codes = user.translator.eligible_pair_codes()
+            while time.monotonic() < deadline:
+                stats.request('task list', client, 'get', reverse('translators:task_list'))
+                # what the first page of the taskboard shows, without parsing it
+                available = stats.run('pick', lambda: list(
+                    WorkItem.objects.filter(state=WorkItem.AVAILABLE, pair_code__in=pair_codes)
+                    .exclude(excluded=user.pk).order_by('pk')
+                    .values_list('kind', 'translation_id')[:TaskListView.per_page]))
+                if available == []:
+                    break
+                if not available:
+                    continue
+                kind, translation_id = rng.choice(available)
+                if kind == WorkItem.TRANSLATE:
+                    url = reverse('translators:translate_task', kwargs={'pk': translation_id})
+                    data = {'text': 'Translated by %s' % user.username, 'comment': '', 'finish': 'Finish'}
+                else:
+                    url = reverse('translators:validate_task', kwargs={'pk': translation_id})
+                    data = {'validated_text': 'Validated by %s' % user.username, 'comment': '', 'finish': 'Finish'}
+                response = stats.request('claim', client, 'get', url)
+                if response is None or response.status_code != 200:
+                    continue  # another translator got there first
+                stats.claimed(kind, translation_id, user.pk)
+                stats.request('finish', client, 'post', url, data)
+        finally:
+            connections.close_all()
+
+    def supervisor(self, user, stats, deadline, translators_done, rng):
+        """Approves completed tasks off the first page of those awaiting approval, until the translators are done"""
+        client = TestClient()
+        try:
+            if stats.run('login', logged_in, client, user) is None:
+                return
+            while time.monotonic() < deadline:
+                stats.request('taskboard', client, 'get', reverse('supervisors:task_change_list'))
+                completed = stats.run('pick', lambda: list(
+                    Task.objects.filter(status=100, approved=False).order_by('pk')
+                    .values_list('pk', flat=True)[:TaskListView.per_page]))
+                if not completed:
+                    if translators_done.is_set() and completed == []:
+                        break
+                    time.sleep(0.05)
+                    continue
+                stats.request('approve', client, 'get', reverse('supervisors:task_approve',
+                                                                kwargs={'pk': rng.choice(completed)}))
+        finally:
+            connections.close_all()
+
+    def report(self, stats, elapsed):
+        total = sum(len(latencies) for latencies in stats.latencies.values())
+        self.stdout.write('%d requests in %.1f s, %.1f requests/s' % (total, elapsed, total / elapsed))
+        self.stdout.write('%-10s %8s %8s %8s %8s %8s  %s' % ('action', 'requests', 'per s', 'p50 ms', 'p95 ms',
+                                                            'p99 ms', 'outcomes'))
+        for action, latencies in sorted(stats.latencies.items()):
+            outcomes = ', '.join('%s: %d' % (outcome, count)
+                                 for outcome, count in sorted(stats.outcomes[action].items(), key=str))
+            self.stdout.write('%-10s %8d %8.1f %8.1f %8.1f %8.1f  %s' % (
+                action, len(latencies), len(latencies) / elapsed, percentile(latencies, 0.5) * 1000,
+                percentile(latencies, 0.95) * 1000, percentile(latencies, 0.99) * 1000, outcomes))
+        lock_errors = sum(outcomes['lock error'] for outcomes in stats.outcomes.values())
+        self.stdout.write('%d lock or busy errors' % lock_errors)
+        for error, count in stats.errors.most_common(5):
+            self.stdout.write('  %dx %s' % (count, error[:200]))
+
+    def check_integrity(self, task_ids, stats):
+        """Counts the violations of the invariants that concurrent requests could break. Returns them by name"""
+        violations = Counter()
+
+        claimants = defaultdict(set)
+        for kind, translation_id, translator_id in stats.claims:
+            claimants[kind, translation_id].add(translator_id)
+        violations['double claims'] = sum(len(translator_ids) - 1 for translator_ids in claimants.values())
+        assignees = {pk: (translator_id, validator_id) for pk, translator_id, validator_id in Translation.objects
+                     .filter(pk__in=[pk for _, pk, _ in stats.claims]).values_list('pk', 'translator_id',
+                                                                                  'validator_id')}
+        violations['claims taken over'] = sum(
+            1 for kind, translation_id, translator_id in stats.claims
+            if assignees[translation_id][kind - WorkItem.TRANSLATE] != translator_id)
+
+        # every approved task books one entry per translator and validator of each translation, and one for its client
+        expected = Counter()
+        for task_id, translator_id, validator_id in Task.objects.filter(pk__in=task_ids, approved=True)\
+                .values_list('pk', 'translations__translator_id', 'translations__validator_id'):
+            expected[task_id] += bool(translator_id) + bool(validator_id)
+        for task_id, client_id in Task.objects.filter(pk__in=task_ids, approved=True).values_list('pk', 'client_id'):
+            expected[task_id] += bool(client_id)
+        booked = dict(PointsEntry.objects.filter(task__in=task_ids).order_by().values_list('task')
+                      .annotate(entries=Count('pk')))
+        violations['tasks with points booked twice or lost'] = sum(
+            1 for task_id in set(expected) | set(booked) if expected[task_id] != booked.get(task_id, 0))
+        violations['balances that do not match the ledger'] = len(replay_balances())
+        roll_up_points(until=PointsEntry.objects.aggregate(last=Max('pk'))['last'] or 0)
+        violations['balances that do not match the ledger after a roll-up'] = len(replay_balances())
+
+        violations['tasks with drifted progress'] = len(recount_task_progress(task_ids, dry_run=True))
+        translation_ids = list(Translation.objects.filter(task__in=task_ids).values_list('pk', flat=True))
+        violations['drifted work items'] = sum(sync_work_items(translation_ids))
+
+        for name, count in violations.items():
+            line = '%-55s %d' % (name, count)
+            self.stdout.write(self.style.ERROR(line) if count else line)
+        return +violations
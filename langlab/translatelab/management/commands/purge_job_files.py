@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...jobs import purge_job_files
+
+
+class Command(BaseCommand):
+    help = ('Removes the uploads and exports of the jobs that are older than JOB_FILES_RETENTION and that no queued or '
+            'running job needs. Run it periodically')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention', type=int, default=settings.JOB_FILES_RETENTION,
+                            help='Seconds to keep the files for')
+
+    def handle(self, *args, **options):
+        removed = purge_job_files(options['retention'])
+        self.stdout.write(self.style.SUCCESS('Done. %d files removed' % removed))
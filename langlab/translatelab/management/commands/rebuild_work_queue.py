@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...models import Language, Translation, sync_work_items, update_language_masks
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the translator work queue from the translations, and the language masks of the translators. '
+            'Needed once for existing data')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Translations synced per batch')
+
+    def handle(self, *args, **options):
+        for language in Language.objects.filter(bit=None):
+            language.save()  # assigns a mask bit
+        update_language_masks()
+
+        total = Translation.objects.count()
+        done = 0
+        created = updated = deleted = 0
+        last_id = 0
+        while True:
+            translation_ids = list(Translation.objects.filter(pk__gt=last_id).order_by('pk')
+                                   .values_list('pk', flat=True)[:options['batch_size']])
+            if not translation_ids:
+                break
+            with transaction.atomic():
+                counts = sync_work_items(translation_ids)
+            created += counts[0]
+            updated += counts[1]
+            deleted += counts[2]
+            done += len(translation_ids)
+            last_id = translation_ids[-1]
+            self.stdout.write('%d/%d translations' % (done, total))
+
+        self.stdout.write(self.style.SUCCESS('Done. %d work items created, %d updated, %d deleted'
+                                             % (created, updated, deleted)))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from ...models import Task, recount_task_progress
+
+
+class Command(BaseCommand):
+    help = 'Recounts the progress counters of all tasks from their translations, and repairs the ones that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Tasks recounted per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Show the drifted tasks without repairing them')
+
+    def handle(self, *args, **options):
+        total = Task.objects.count()
+        done = 0
+        repaired = 0
+        last_id = 0
+        while True:
+            task_ids = list(Task.objects.filter(pk__gt=last_id).order_by('pk')
+                            .values_list('pk', flat=True)[:options['batch_size']])
+            if not task_ids:
+                break
+            drifted = recount_task_progress(task_ids, dry_run=options['dry_run'])
+            for task in drifted:
+                self.stdout.write('  #%d: %d/%d stages, %d%%' % (task.pk, task.stages_done, task.stages_total,
+                                                                  task.status))
+            repaired += len(drifted)
+            done += len(task_ids)
+            last_id = task_ids[-1]
+            self.stdout.write('%d/%d tasks' % (done, total))
+
+        verb = 'had drifted' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS('Done. %d tasks %s' % (repaired, verb)))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from ...point_score import PointScore, ScoreCache
+from ...rescoring import rescore_batches, stale_tasks
+
+
+class Command(BaseCommand):
+    help = 'Re-scores tasks whose point_score_version is behind the current point score algorithm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Tasks scored and written per batch')
+        parser.add_argument('--processes', type=int, default=None, help='Worker processes. Default: number of CPUs')
+        parser.add_argument('--start-after', type=int, default=0, help='Resume after this task id')
+        parser.add_argument('--dry-run', action='store_true', help='Show the changes without writing them')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        total = stale_tasks().filter(pk__gt=options['start_after']).count()
+        self.stdout.write('%d tasks are behind point score version %d' % (total, PointScore.version))
+
+        done = 0
+        changed = 0
+        points_delta = 0
+        batches = rescore_batches(batch_size=options['batch_size'], processes=options['processes'],
+                                  dry_run=dry_run, start_after=options['start_after'])
+        for last_id, count, changes in batches:
+            done += count
+            changed += len(changes)
+            for change in changes:
+                points_delta += change.new_score - change.old_score
+                if dry_run:
+                    self.stdout.write('  #%d %s: points %d -> %d, words %d -> %d' % change)
+            self.stdout.write('%d/%d tasks (last id %d)' % (done, total, last_id))
+
+        if not dry_run:
+            purged = ScoreCache.purge_stale()
+            if purged:
+                self.stdout.write('%d point score cache entries of older versions deleted' % purged)
+
+        verb = 'would change' if dry_run else 'changed'
+        self.stdout.write(self.style.SUCCESS('Done. %d tasks %s, points %+d' % (changed, verb, points_delta)))
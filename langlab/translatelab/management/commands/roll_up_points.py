@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from ...ledger import open_balances, replay_balances, roll_up_points
+
+
+class Command(BaseCommand):
+    help = 'Rolls the points ledger up into the stored balances of translators and clients. Run it periodically'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--open-balances', action='store_true',
+                            help='First move balances from before the ledger into opening entries. Needed once')
+        parser.add_argument('--verify', action='store_true', help='Replay the ledger and compare it with the balances')
+
+    def handle(self, *args, **options):
+        if options['open_balances']:
+            self.stdout.write('%d opening entries written' % open_balances())
+
+        self.stdout.write('%d accounts rolled up' % roll_up_points())
+
+        if options['verify']:
+            mismatches = replay_balances()
+            for mismatch in mismatches:
+                self.stdout.write('  %s #%d: balance %d, ledger %d' % mismatch)
+            if mismatches:
+                self.stdout.write(self.style.ERROR('%d balances differ from the ledger' % len(mismatches)))
+            else:
+                self.stdout.write(self.style.SUCCESS('All balances match the ledger'))
@@ -0,0 +1,50 @@
+import multiprocessing
+import signal
+import threading
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from ...jobs import work, worker_name
+from ...point_score import splitters
+
+
+def run_worker(poll_interval, burst):
+    """A worker process. It finishes the job it is running when it gets SIGINT or SIGTERM, and stops"""
+    stopping = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    try:
+        work(worker_name(), poll_interval=poll_interval, burst=burst, stopping=stopping)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Runs the background jobs queued in the database, see jobs.py, with a number of worker processes. Stops '
+            'on SIGINT or SIGTERM once the jobs being run are done')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help='Worker processes')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when no job is due')
+        parser.add_argument('--burst', action='store_true', help='Stop once no job is due')
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')  # the workers start with Django set up
+        splitters.warm()  # and with the sentence splitters loaded
+        connections.close_all()  # don't share the database connection with the workers
+        workers = [context.Process(target=run_worker, args=(options['poll_interval'], options['burst']))
+                   for _ in range(max(options['workers'], 1))]
+
+        def stop(signum, frame):
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()  # SIGTERM, which the worker takes as the signal to stop
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        self.stdout.write('Starting %d workers' % len(workers))
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.stdout.write(self.style.SUCCESS('Done'))
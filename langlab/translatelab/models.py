@@ -1,12 +1,62 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Case, Count, F, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+from django.urls import reverse
 from django.utils.html import escape, mark_safe
 from django.conf import settings
 from django.contrib.auth import get_user_model
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pytz import common_timezones
 
 
+def subquery_count(queryset, group_by):
+    """
+    Count of a queryset filtered on an OuterRef(), as an expression for annotate(). Unlike Count() over a join, several
+    of them can be combined without multiplying each other's rows. `group_by` is the field the OuterRef() is on.
+    """
+    counts = queryset.order_by().values(group_by).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), Value(0))
+
+
+def insert_rows(model, fields, rows):
+    """
+    Inserts rows of values for the given fields with a single executemany(), for large inserts, where bulk_create()
+    spends most of its time building model instances and preparing every value. The values are written as they are,
+    other than datetimes, so they must otherwise be plain numbers, strings or None. Fields left out must be nullable.
+    """
+    fields = [model._meta.get_field(f) for f in fields]
+    datetimes = [i for i, field in enumerate(fields) if isinstance(field, models.DateTimeField)]
+    if datetimes:
+        adapt = connection.ops.adapt_datetimefield_value
+        rows = ([adapt(value) if i in datetimes and value is not None else value for i, value in enumerate(row)]
+                for row in rows)
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (qn(model._meta.db_table), ', '.join(qn(f.column) for f in fields),
+                                               ', '.join(['%s'] * len(fields)))
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def insert_select(model, fields, queryset):
+    """
+    Inserts a row for every row of a queryset with a single INSERT ... SELECT, so the rows never leave the database.
+    The queryset selects an expression per field, in the same order, with values_list(). Returns the rows inserted.
+    """
+    select, params = queryset.query.sql_with_params()
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s) %s' % (qn(model._meta.db_table),
+                                      ', '.join(qn(model._meta.get_field(f).column) for f in fields), select)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
 def get_sentinel_user():
     user = get_user_model().objects.get_or_create(username='Deleted user')[0]
     user.is_translator = True
@@ -21,6 +71,13 @@ def get_sentinel_language():
     return Language.objects.get_or_create(name='Unknown')[0]
 
 
+def language_code(language):
+    """Code of a Language, or of English if there is none. Used to pick the sentence splitter of a text"""
+    if language and language.code:
+        return language.code
+    return 'en'
+
+
 class User(AbstractUser):
     is_translator = models.BooleanField(default=False)
     is_supervisor = models.BooleanField(default=False)
@@ -28,15 +85,48 @@ class User(AbstractUser):
     TIMEZONE_CHOICES = [(t, t) for t in common_timezones]
     timezone = models.CharField(max_length=100, choices=TIMEZONE_CHOICES, default=settings.TIME_ZONE)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [  # sort order of the user list by date joined, see pagination.py
+            models.Index(fields=['date_joined', 'id']),
+        ]
+
+
+LANGUAGE_MASK_BITS = 63  # languages that fit in Translator.language_mask, a signed 64 bit integer
+
+
+def pair_code(source_language_id, language_id):
+    """Key of a source and target language pair, see WorkItem.pair_code"""
+    return ((source_language_id or 0) << 32) | (language_id or 0)
+
 
 class Language(models.Model):
     name = models.CharField(max_length=30)
     code = models.CharField(max_length=5, default='')
     style_guide = models.TextField(blank=True)
+    bit = models.SmallIntegerField(null=True, unique=True, editable=False)  # position in Translator.language_mask
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            used = set(Language.objects.exclude(bit=None).values_list('bit', flat=True))
+            self.bit = next((bit for bit in range(LANGUAGE_MASK_BITS) if bit not in used), None)
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        translator_ids = list(self.qualified_translators.values_list('pk', flat=True))
+        translation_ids = list(Translation.objects.filter(Q(language=self) | Q(task__source_language=self))
+                               .values_list('pk', flat=True))
+        result = super().delete(*args, **kwargs)
+        update_language_masks(translator_ids)
+        sync_work_items(translation_ids)  # their languages were replaced without save()
+        return result
+
+    @property
+    def mask(self):
+        return 1 << self.bit if self.bit is not None else 0
+
     def get_html_badge(self):
         name = escape(self.name)
         code = escape(self.code)
@@ -47,22 +137,100 @@ class Language(models.Model):
 class Translator(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
     languages = models.ManyToManyField(Language, related_name='qualified_translators')  # !! goal: languages spoken (add 'through' profiency)
-    points_earned = models.IntegerField(default=0)
+    points_earned = models.IntegerField(default=0)  # balance of the rolled-up ledger entries, see ledger.py
+    language_mask = models.BigIntegerField(default=0)  # Language.mask of each language, kept by update_language_masks()
 
     def __str__(self):
         return self.user.username
 
+    def get_points(self):
+        """The rolled-up balance plus the ledger entries since. Use ledger.points_balance() for lists"""
+        if hasattr(self, 'points_balance'):
+            return self.points_balance
+        tail = self.points_entries.filter(rolled_up=False).aggregate(total=Sum('points'))['total']
+        return self.points_earned + (tail or 0)
+
+    def eligible_pair_codes(self):
+        """Pair codes of all the work this translator has the languages for"""
+        language_ids = list(self.languages.values_list('pk', flat=True))
+        return [pair_code(source, target) for source in language_ids for target in language_ids]
+
+
+def update_language_masks(translator_ids=None):
+    """
+    Recomputes the language mask of the given translators, or of all translators, from their languages. Returns the
+    masks by translator id.
+    """
+    languages = Translator.languages.through.objects.exclude(language__bit=None)
+    translators = Translator.objects.all()
+    if translator_ids is not None:
+        translator_ids = list(translator_ids)
+        languages = languages.filter(translator_id__in=translator_ids)
+        translators = translators.filter(pk__in=translator_ids)
+    masks = defaultdict(int)
+    for translator_id, bit in languages.values_list('translator_id', 'language__bit'):
+        masks[translator_id] |= 1 << bit
+    changed = []
+    for translator in translators.only('language_mask'):
+        if translator.language_mask != masks[translator.pk]:
+            translator.language_mask = masks[translator.pk]
+            changed.append(translator)
+    if changed:
+        Translator.objects.bulk_update(changed, ['language_mask'])
+    return masks
+
+
+@receiver(m2m_changed, sender=Translator.languages.through)
+def translator_languages_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        instance.language_mask = update_language_masks([instance.pk])[instance.pk]
+    else:
+        update_language_masks(pk_set if action != 'post_clear' else None)
+
+
+def qualified_translator_counts(pairs):
+    """
+    Number of active translators with both languages of each (source language, target language) pair, by pair, or
+    None for languages without a mask bit. Needs a single query, as the translators are grouped by language mask.
+    """
+    masks = Translator.objects.filter(user__is_active=True).order_by().values_list('language_mask')\
+        .annotate(count=Count('pk'))
+    masks = list(masks)
+    counts = {}
+    for source, target in pairs:
+        if source.bit is None or target.bit is None:
+            counts[source, target] = None
+        else:
+            wanted = source.mask | target.mask
+            counts[source, target] = sum(count for mask, count in masks if mask & wanted == wanted)
+    return counts
+
 
 class Client(models.Model):
     name = models.CharField(max_length=100)
     code = models.CharField(max_length=12, default='', unique=True)
-    points_owed = models.IntegerField(default=0)
+    points_owed = models.IntegerField(default=0)  # balance of the rolled-up ledger entries, see ledger.py
     email = models.EmailField(max_length=70, blank=True)
     website = models.URLField(blank=True)
 
+    class Meta:
+        indexes = [  # sort orders of the client list, see pagination.py
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['points_owed', 'id']),
+        ]
+
     def __str__(self):
         return self.name
 
+    def get_points(self):
+        """The rolled-up balance plus the ledger entries since. Use ledger.points_balance() for lists"""
+        if hasattr(self, 'points_balance'):
+            return self.points_balance
+        tail = self.points_entries.filter(rolled_up=False).aggregate(total=Sum('points'))['total']
+        return self.points_owed + (tail or 0)
+
 
 class Task(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET(get_sentinel_user), related_name='tasks')  # !! rename
@@ -87,28 +255,139 @@ class Task(models.Model):
     point_score = models.IntegerField(default=0)
     point_score_version = models.IntegerField(default=0)
     word_count = models.IntegerField(default=0)
+    sentence_count = models.IntegerField(default=0)  # text statistics kept for re-pricing, see repricing.py
+    long_words_count = models.IntegerField(default=0)
     approved = models.BooleanField(default=False)
     status = models.IntegerField(default=0)
+    stages_total = models.IntegerField(default=0)  # four stages per translation, see Translation.STAGE_FIELDS
+    stages_done = models.IntegerField(default=0)
+    import_row = models.OneToOneField('ImportRow', on_delete=models.SET_NULL, related_name='task', null=True,
+                                      blank=True)  # the CSV row it was imported from, see imports.py
+
+    PROGRESS_FIELDS = ('status', 'stages_total', 'stages_done')
+
+    class Meta:
+        indexes = [  # sort orders and tabs of the task board, see pagination.py
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['point_score', 'id']),
+            models.Index(fields=['approved', 'status']),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # The progress fields are only written by update_progress() and recount_task_progress(), so that saving a task
+        # that was loaded earlier does not overwrite the progress made since
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields if not f.primary_key
+                                       and f.name not in self.PROGRESS_FIELDS and f.attname not in deferred]
+        super().save(*args, **kwargs)
+        if 'source_language' in (kwargs.get('update_fields') or ()):
+            moved = WorkItem.objects.filter(translation__task_id=self.pk)\
+                .exclude(source_language_id=self.source_language_id).values_list('translation_id', flat=True)
+            moved = list(moved)
+            if moved:
+                sync_work_items(moved)
+
     def get_status(self):
-        max_score = self.translations.count() * 4
-        total_score = 0
-        for translation in self.translations.all():
-            score = 0
-            for point in [translation.translation_time_started,
-                          translation.translation_time_finished,
-                          translation.validation_time_started,
-                          translation.validation_time_finished]:
-                if point:
-                    score += 1
-            total_score += score
-        status = (total_score / max_score) * 100
-        self.status = status
-        self.save()
-        return int(status)
+        """Progress in percent, kept up to date by Translation.save()"""
+        return int(self.status)
+
+    @staticmethod
+    def update_progress(task_id, total_delta, done_delta):
+        """Adds to the stage counters of a task, and updates its status, in a single UPDATE"""
+        total = F('stages_total') + total_delta
+        done = F('stages_done') + done_delta
+        Task.objects.filter(pk=task_id).update(
+            stages_total=total,
+            stages_done=done,
+            status=Case(When(stages_total__gt=-total_delta, then=done * 100 / total), default=Value(0)),
+        )
+
+
+def progress_status(stages_total, stages_done):
+    if stages_total > 0:
+        return stages_done * 100 // stages_total
+    return 0
+
+
+def recount_task_progress(task_ids, dry_run=False):
+    """
+    Recounts the stage counters of the given tasks from their translations, with one grouped query, and writes the
+    counters that have drifted with one bulk update. Returns the tasks that had drifted.
+    """
+    counts = Translation.objects.filter(task_id__in=task_ids).order_by().values('task_id').annotate(
+        total=Count('pk') * 4,
+        done=(Count('translation_time_started') + Count('translation_time_finished')
+              + Count('validation_time_started') + Count('validation_time_finished')),
+    )
+    counts = {c['task_id']: (c['total'], c['done']) for c in counts}
+    drifted = []
+    for task in Task.objects.filter(pk__in=task_ids).only('stages_total', 'stages_done', 'status'):
+        total, done = counts.get(task.pk, (0, 0))
+        status = progress_status(total, done)
+        if (task.stages_total, task.stages_done, task.status) != (total, done, status):
+            task.stages_total, task.stages_done, task.status = total, done, status
+            drifted.append(task)
+    if drifted and not dry_run:
+        Task.objects.bulk_update(drifted, ['stages_total', 'stages_done', 'status'])
+    return drifted
+
+
+class TranslationBatch:
+    """The tasks and translations written within a translation_batch() block"""
+    def __init__(self):
+        self.task_ids = set()
+        self.translation_ids = set()
+
+    def add(self, *task_ids, translation_id=None):
+        self.task_ids.update(task_id for task_id in task_ids if task_id)
+        if translation_id:
+            self.translation_ids.add(translation_id)
+
+    def add_tasks(self, task_ids):
+        """Registers tasks whose translations were written without save(), e.g. with bulk_create()"""
+        self.task_ids.update(task_ids)
+
+    def flush(self):
+        task_ids = sorted(self.task_ids)
+        if task_ids:
+            recount_task_progress(task_ids)
+            self.translation_ids.update(Translation.objects.filter(task_id__in=task_ids).values_list('pk', flat=True))
+        if self.translation_ids:
+            sync_work_items(sorted(self.translation_ids))
+        self.task_ids.clear()
+        self.translation_ids.clear()
+
+
+_batches = threading.local()
+
+
+def current_translation_batch():
+    return getattr(_batches, 'batch', None)
+
+
+@contextmanager
+def translation_batch():
+    """
+    Defers the task progress and work queue updates of Translation.save() and delete() within the block, and runs them
+    once, for all the tasks written, when the block exits. Tasks whose translations are written with bulk_create() or
+    update() inside the block can be registered with add_tasks() on the yielded batch. The block is a transaction.
+    Nested blocks join the outer one.
+    """
+    batch = current_translation_batch()
+    if batch is not None:
+        yield batch
+        return
+    batch = _batches.batch = TranslationBatch()
+    try:
+        with transaction.atomic():
+            yield batch
+            batch.flush()
+    finally:
+        _batches.batch = None
 
 
 class Translation(models.Model):
@@ -127,10 +406,170 @@ class Translation(models.Model):
     def __str__(self):
         return self.text
 
+    STAGE_FIELDS = ('translation_time_started', 'translation_time_finished',
+                    'validation_time_started', 'validation_time_finished')
+
+    WORK_FIELDS = ('task_id', 'language_id', 'translator_id', 'validator_id') + STAGE_FIELDS
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'task_id' in field_names and all(f in field_names for f in cls.STAGE_FIELDS):
+            instance._saved_progress = (instance.task_id, instance.count_stages())
+        else:
+            instance._saved_progress = None  # not known without loading deferred fields
+        if all(f in field_names for f in cls.WORK_FIELDS):
+            instance._saved_work = instance.work_state()
+        else:
+            instance._saved_work = None
+        return instance
+
+    def count_stages(self):
+        return sum(1 for f in self.STAGE_FIELDS if getattr(self, f))
+
+    def work_state(self):
+        return tuple(getattr(self, f) for f in self.WORK_FIELDS)
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        if self.task:
-            self.task.get_status()
+        batch = current_translation_batch()
+        if batch is not None:
+            super().save(*args, **kwargs)
+            self._defer_to(batch)
+            return
+        # one transaction, so that the task progress and the work queue never miss a translation that was written
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._update_task_progress((self.task_id, self.count_stages()))
+            work = self.work_state()
+            if work != getattr(self, '_saved_work', None):
+                sync_work_items([self.pk])
+                self._saved_work = work
+
+    def delete(self, *args, **kwargs):
+        task_id = self.task_id
+        batch = current_translation_batch()
+        if batch is not None:
+            result = super().delete(*args, **kwargs)
+            batch.add(task_id, (getattr(self, '_saved_progress', None) or (None, ))[0])
+            self._saved_progress = (None, 0)
+            return result
+        # one transaction, as in save(), so the task progress never counts a translation that is gone
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self._update_task_progress((None, 0))
+        return result
+
+    def _defer_to(self, batch):
+        # the batch recounts the tasks from the database when it exits, which includes this translation as it is now
+        batch.add(self.task_id, (getattr(self, '_saved_progress', None) or (None, ))[0], translation_id=self.pk)
+        self._saved_progress = (self.task_id, self.count_stages())
+        self._saved_work = self.work_state()
+
+    def claim_translation(self, translator):
+        """
+        Assigns the translation to the translator if nobody has it yet. The check and the write are a single
+        conditional UPDATE, so of any number of concurrent claims exactly one succeeds. Returns whether it did.
+        """
+        now = datetime.now(timezone.utc)
+        with transaction.atomic():
+            claimed = Translation.objects.filter(pk=self.pk, translator__isnull=True)\
+                .update(translator=translator, translation_time_started=now)
+            if claimed:
+                self.translator = translator
+                self.translation_time_started = now
+                self._claimed()
+        return bool(claimed)
+
+    def claim_validation(self, translator):
+        """As claim_translation(), for validating a finished translation made by someone else"""
+        now = datetime.now(timezone.utc)
+        with transaction.atomic():
+            claimed = Translation.objects\
+                .filter(pk=self.pk, validator__isnull=True, translation_time_finished__isnull=False)\
+                .exclude(translator=translator).update(validator=translator, validation_time_started=now)
+            if claimed:
+                self.validator = translator
+                self.validation_time_started = now
+                self._claimed()
+        return bool(claimed)
+
+    def save_translation(self, fields, finish=False):
+        """
+        Writes `fields` of the translation its translator is working on, and marks it finished if `finish`. The write
+        is a conditional UPDATE that only succeeds while the translation is still theirs and not finished, so it can
+        not undo a cancel, or overwrite the validation of a translation finished meanwhile. Returns whether it did.
+        """
+        if finish:
+            self.translation_time_finished = datetime.now(timezone.utc)
+            fields = tuple(fields) + ('translation_time_finished', )
+        return self._write_stage(fields, translator_id=self.translator_id, translation_time_finished__isnull=True)
+
+    def save_validation(self, fields, finish=False):
+        """As save_translation(), for the validation its validator is working on"""
+        if finish:
+            self.validation_time_finished = datetime.now(timezone.utc)
+            fields = tuple(fields) + ('validation_time_finished', )
+        return self._write_stage(fields, validator_id=self.validator_id, validation_time_finished__isnull=True)
+
+    def cancel_translation(self):
+        """
+        Takes an unfinished translation off its translator, with a conditional UPDATE, so that a translation that was
+        finished, or cancelled and claimed by someone else, since it was loaded is left alone. Returns whether it did.
+        """
+        translator_id = self.translator_id
+        self.translator, self.translation_time_started = None, None
+        return self._write_stage(('translator', 'translation_time_started'), translator_id=translator_id,
+                                 translation_time_finished__isnull=True)
+
+    def cancel_validation(self):
+        """As cancel_translation(), for an unfinished validation"""
+        validator_id = self.validator_id
+        self.validator, self.validation_time_started = None, None
+        return self._write_stage(('validator', 'validation_time_started'), validator_id=validator_id,
+                                 validation_time_finished__isnull=True)
+
+    def _write_stage(self, fields, **conditions):
+        # the conditions are those the row had when it was loaded, so the stage counters move by the right amount
+        values = {self._meta.get_field(f).attname: getattr(self, self._meta.get_field(f).attname) for f in fields}
+        with transaction.atomic():
+            written = Translation.objects.filter(pk=self.pk, **conditions).update(**values)
+            if written:
+                self._claimed()
+        return bool(written)
+
+    def _claimed(self):
+        # what save() does after writing, for a claim or a stage written by update()
+        batch = current_translation_batch()
+        if batch is not None:
+            self._defer_to(batch)
+            return
+        self._update_task_progress((self.task_id, self.count_stages()))
+        sync_work_items([self.pk])
+        if getattr(self, '_saved_work', None) is not None:
+            self._saved_work = self.work_state()
+
+    def _update_task_progress(self, progress):
+        """Moves the stage counters of the task by the difference since the translation was loaded or saved"""
+        saved = getattr(self, '_saved_progress', (None, 0))
+        if saved is None:
+            recount_task_progress([task_id for task_id in (self.task_id, ) if task_id])
+        elif saved[0] == progress[0]:
+            if progress[0] and progress[1] != saved[1]:
+                self._move_task_progress(progress[0], 0, progress[1] - saved[1])
+        else:
+            if saved[0]:
+                self._move_task_progress(saved[0], -4, -saved[1])
+            if progress[0]:
+                self._move_task_progress(progress[0], 4, progress[1])
+        self._saved_progress = progress
+
+    def _move_task_progress(self, task_id, total_delta, done_delta):
+        Task.update_progress(task_id, total_delta, done_delta)
+        if Translation.task.is_cached(self) and self.task and self.task.pk == task_id:
+            task = self.task
+            task.stages_total += total_delta
+            task.stages_done += done_delta
+            task.status = progress_status(task.stages_total, task.stages_done)
 
     def get_translation_time(self, get_seconds=False):
         """Returns int of number of seconds spent on a translation task.
@@ -146,3 +585,237 @@ class Translation(models.Model):
 
         else:
             return 0
+
+
+class WorkItem(models.Model):
+    """
+    One open or done unit of work on a translation: translating it, or validating it once it is translated. Derived
+    from the translations by sync_work_items(), so that the task lists of translators are single indexed lookups.
+    """
+    TRANSLATE = 1
+    VALIDATE = 2
+    KIND_CHOICES = [
+        (TRANSLATE, 'Translation'),
+        (VALIDATE, 'Validation'),
+    ]
+    AVAILABLE = 0
+    DRAFT = 1
+    COMPLETED = 2
+    STATE_CHOICES = [
+        (AVAILABLE, 'Available'),
+        (DRAFT, 'Draft'),
+        (COMPLETED, 'Completed'),
+    ]
+    translation = models.ForeignKey(Translation, on_delete=models.CASCADE, related_name='work_items')
+    kind = models.IntegerField(choices=KIND_CHOICES)
+    state = models.IntegerField(choices=STATE_CHOICES, default=AVAILABLE)
+    source_language = models.ForeignKey(Language, on_delete=models.SET_NULL, related_name='+', null=True)
+    language = models.ForeignKey(Language, on_delete=models.SET_NULL, related_name='+', null=True)
+    assignee = models.ForeignKey(Translator, on_delete=models.SET_NULL, related_name='work_items', null=True)
+    excluded = models.ForeignKey(Translator, on_delete=models.SET_NULL, related_name='+', null=True)  # may not claim it
+    pair_code = models.BigIntegerField(default=0)  # pair_code() of the source and target language
+    time_started = models.DateTimeField(null=True, blank=True)
+    time_finished = models.DateTimeField(null=True, blank=True)
+
+    SYNC_FIELDS = ('state', 'source_language_id', 'language_id', 'pair_code', 'assignee_id', 'excluded_id',
+                   'time_started', 'time_finished')
+
+    class Meta:
+        unique_together = [('translation', 'kind')]
+        indexes = [
+            models.Index(fields=['state', 'pair_code']),
+            models.Index(fields=['assignee', 'state']),
+        ]
+
+    def get_work_url(self):
+        """Where the work is started or continued"""
+        if self.kind == self.TRANSLATE:
+            return reverse('translators:translate_task', args=[self.translation_id])
+        return reverse('translators:validate_task', args=[self.translation_id])
+
+    @classmethod
+    def state_of(cls, assignee_id, time_finished):
+        if not assignee_id:
+            return cls.AVAILABLE
+        return cls.COMPLETED if time_finished else cls.DRAFT
+
+
+def sync_work_items(translation_ids):
+    """
+    Brings the work items of the given translations in line with the translations, with one query for the
+    translations, one for their items, and one bulk write per kind of change. Returns (created, updated, deleted).
+    """
+    rows = Translation.objects.filter(pk__in=translation_ids).values_list(
+        'pk', 'task__source_language_id', 'language_id', 'translator_id', 'validator_id', *Translation.STAGE_FIELDS)
+    wanted = {}
+    for (pk, source_language_id, language_id, translator_id, validator_id,
+         translation_started, translation_finished, validation_started, validation_finished) in rows:
+        pair = (source_language_id, language_id, pair_code(source_language_id, language_id))
+        wanted[pk, WorkItem.TRANSLATE] = (WorkItem.state_of(translator_id, translation_finished), *pair,
+                                          translator_id, None, translation_started, translation_finished)
+        if translation_finished:
+            wanted[pk, WorkItem.VALIDATE] = (WorkItem.state_of(validator_id, validation_finished), *pair,
+                                             validator_id, translator_id, validation_started, validation_finished)
+
+    changed = []
+    stale = []
+    for item in WorkItem.objects.filter(translation_id__in=translation_ids):
+        values = wanted.pop((item.translation_id, item.kind), None)
+        if values is None:
+            stale.append(item.pk)
+        elif values != tuple(getattr(item, f) for f in WorkItem.SYNC_FIELDS):
+            for f, value in zip(WorkItem.SYNC_FIELDS, values):
+                setattr(item, f, value)
+            changed.append(item)
+    if wanted:
+        insert_rows(WorkItem, ('translation_id', 'kind') + WorkItem.SYNC_FIELDS,
+                    [(pk, kind) + values for (pk, kind), values in wanted.items()])
+    if changed:
+        WorkItem.objects.bulk_update(changed, [f[:-3] if f.endswith('_id') else f for f in WorkItem.SYNC_FIELDS])
+    if stale:
+        WorkItem.objects.filter(pk__in=stale).delete()
+    return len(wanted), len(changed), len(stale)
+
+
+class PointsEntry(models.Model):
+    """
+    A movement of points on the account of a translator or of a client. Entries are only ever appended: balances are
+    the sum of the entries of an account, periodically rolled up into its stored balance. See ledger.py
+    """
+    TRANSLATION = 1
+    VALIDATION = 2
+    ORDER = 3
+    OPENING = 4
+    REASON_CHOICES = [
+        (TRANSLATION, 'Translation'),
+        (VALIDATION, 'Validation'),
+        (ORDER, 'Order'),
+        (OPENING, 'Opening balance'),
+    ]
+    translator = models.ForeignKey(Translator, on_delete=models.SET_NULL, related_name='points_entries', null=True)
+    client = models.ForeignKey(Client, on_delete=models.SET_NULL, related_name='points_entries', null=True)
+    task = models.ForeignKey(Task, on_delete=models.SET_NULL, related_name='points_entries', null=True)
+    translation = models.ForeignKey(Translation, on_delete=models.SET_NULL, related_name='points_entries', null=True)
+    points = models.IntegerField()
+    reason = models.IntegerField(choices=REASON_CHOICES)
+    time_created = models.DateTimeField(auto_now_add=True, db_index=True)
+    rolled_up = models.BooleanField(default=False)  # whether the stored balance of the account includes the entry
+
+    class Meta:
+        indexes = [  # the entries that are not rolled up yet, which the balances and the roll-up read
+            models.Index(fields=['id'], condition=Q(rolled_up=False), name='pointsentry_pending'),
+            models.Index(fields=['translator'], condition=Q(rolled_up=False), name='pointsentry_pending_translator'),
+            models.Index(fields=['client'], condition=Q(rolled_up=False), name='pointsentry_pending_client'),
+        ]
+
+
+class PointScoreCacheEntry(models.Model):
+    """Persistent tier of the point score cache. See point_score.ScoreCache"""
+    key = models.CharField(max_length=64, primary_key=True)
+    version = models.IntegerField(default=0)
+    word_count = models.IntegerField(default=0)
+    sentence_count = models.IntegerField(default=0)
+    long_words_count = models.IntegerField(default=0)
+    time_created = models.DateTimeField(auto_now_add=True)
+
+
+class ImportBatch(models.Model):
+    """An uploaded CSV file of tasks, staged as ImportRows to be reviewed before they become tasks. See imports.py"""
+    STAGING = 0
+    STAGED = 1
+    IMPORTED = 2
+    STATUS_CHOICES = [
+        (STAGING, 'Staging'),
+        (STAGED, 'Awaiting review'),
+        (IMPORTED, 'Imported'),
+    ]
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='import_batches')
+    file_name = models.CharField(max_length=255, blank=True)
+    status = models.IntegerField(choices=STATUS_CHOICES, default=STAGING)
+    row_count = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    task_count = models.IntegerField(default=0)
+    time_created = models.DateTimeField(auto_now_add=True)
+    time_imported = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.file_name
+
+
+class ImportRow(models.Model):
+    """A row of an ImportBatch, as read from the file, with what keeps it from becoming a task and its point score"""
+    batch = models.ForeignKey(ImportBatch, on_delete=models.CASCADE, related_name='rows')
+    line = models.IntegerField()
+    name = models.TextField()  # as long as it is in the file, which the errors point out
+    text = models.TextField()
+    instructions = models.TextField(blank=True)
+    priority = models.IntegerField(null=True)  # None if it is not a number
+    source_language = models.ForeignKey(Language, on_delete=models.SET_NULL, related_name='+', null=True)
+    source_language_text = models.TextField(blank=True)  # the columns as read, for review
+    target_languages_text = models.TextField(blank=True)
+    errors = models.TextField(blank=True)  # empty if the row can be imported
+    accepted = models.BooleanField(default=True)  # the supervisor may leave out rows that have no errors
+    point_score = models.IntegerField(default=0)
+    point_score_version = models.IntegerField(default=0)
+    word_count = models.IntegerField(default=0)
+    sentence_count = models.IntegerField(default=0)
+    long_words_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [('batch', 'line')]
+
+    def __str__(self):
+        return self.name
+
+
+class ImportRowLanguage(models.Model):
+    """A target language of an ImportRow, so that its translations are inserted with a join"""
+    row = models.ForeignKey(ImportRow, on_delete=models.CASCADE, related_name='languages')
+    language = models.ForeignKey(Language, on_delete=models.CASCADE, related_name='+')
+
+
+class Job(models.Model):
+    """
+    A piece of work run in the background by the run_jobs command, with the database as the queue. `kind` names the
+    function that does it, see jobs.py, and `arguments` are its keyword arguments, as JSON.
+    """
+    QUEUED = 0
+    RUNNING = 1
+    DONE = 2
+    FAILED = 3
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    kind = models.CharField(max_length=50)
+    arguments = models.TextField(default='{}')
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='jobs', null=True)
+    status = models.IntegerField(choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)  # claims so far, which also tells the claims of a job apart
+    run_after = models.DateTimeField()  # not before, to back off between attempts
+    worker = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)  # when another worker may take a running job over
+    progress = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)  # 0 if not known
+    message = models.TextField(blank=True)  # the outcome, or the last error
+    result_url = models.CharField(max_length=255, blank=True)
+    time_created = models.DateTimeField(auto_now_add=True)
+    time_started = models.DateTimeField(null=True, blank=True)
+    time_finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def get_absolute_url(self):
+        return reverse('supervisors:job_details', args=[self.pk])
+
+    def get_percent(self):
+        if self.status == self.DONE:
+            return 100
+        if self.total > 0:
+            return min(self.progress * 100 // self.total, 100)
+        return None
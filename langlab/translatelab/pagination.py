@@ -0,0 +1,206 @@
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q
+from django.utils.functional import cached_property
+
+
+def encode_cursor(values):
+    data = json.dumps([str(v) if v is not None else None for v in values])
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+
+
+def chunks(queryset, size=1000):
+    """
+    Yields the rows of a queryset in lists of up to `size`. Every list is a range query on the primary key, so memory
+    stays flat however many rows there are, and prefetch_related() is done per list, unlike with iterator().
+    """
+    queryset = queryset.order_by('pk')
+    last = None
+    while True:
+        chunk = list((queryset if last is None else queryset.filter(pk__gt=last))[:size])
+        if chunk:
+            yield chunk
+        if len(chunk) < size:
+            return
+        last = chunk[-1].pk
+
+
+class KeysetPage:
+    """
+    A page of a queryset, found by the sort key of the row before it instead of an offset, so every page is a single
+    indexed range query no matter how deep it is.
+
+    `ordering` is a tuple of field names, optionally prefixed with '-', and must end with a unique field, such as
+    'pk'. The fields must not be nullable. `cursor` is the `next_cursor` or `previous_cursor` of another page.
+    """
+    def __init__(self, queryset, ordering, cursor=None, per_page=25):
+        self.queryset = queryset
+        self.ordering = ordering
+        self.per_page = per_page
+        self.backwards = False
+        self.after = None
+        if cursor:
+            try:
+                direction, values = cursor[0], decode_cursor(cursor[1:])
+                self.after = self._to_python(values)
+                self.backwards = direction == 'p'
+            except (ValueError, TypeError, IndexError, ValidationError):
+                self.after = None
+
+    def _fields(self):
+        return [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def _to_python(self, values):
+        model = self.queryset.model
+        fields = self._fields()
+        if len(values) != len(fields):
+            raise ValueError('Cursor does not match the ordering')
+        result = []
+        for (name, descending), value in zip(fields, values):
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            result.append(field.to_python(value))
+        return result
+
+    def _seek(self, values, backwards):
+        # (a, b, pk) > (x, y, z), written out as a > x OR (a = x AND b > y) OR (a = x AND b = y AND pk > z)
+        q = Q()
+        equal = {}
+        for (name, descending), value in zip(self._fields(), values):
+            lookup = 'lt' if descending != backwards else 'gt'
+            q |= Q(**equal, **{'%s__%s' % (name, lookup): value})
+            equal[name] = value
+        return q
+
+    @cached_property
+    def rows(self):
+        if self.backwards:
+            ordering = [name[1:] if name.startswith('-') else '-' + name for name in self.ordering]
+        else:
+            ordering = list(self.ordering)
+        queryset = self.queryset.order_by(*ordering)
+        if self.after is not None:
+            queryset = queryset.filter(self._seek(self.after, self.backwards))
+        rows = list(queryset[:self.per_page + 1])
+        self._has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if self.backwards:
+            rows.reverse()
+        return rows
+
+    def _key(self, row):
+        return [getattr(row, name) for name, descending in self._fields()]
+
+    @property
+    def has_next(self):
+        rows = self.rows
+        return bool(rows) and (self._has_more if not self.backwards else True)
+
+    @property
+    def has_previous(self):
+        rows = self.rows
+        return bool(rows) and (self._has_more if self.backwards else self.after is not None)
+
+    @property
+    def next_cursor(self):
+        if self.has_next:
+            return 'n' + encode_cursor(self._key(self.rows[-1]))
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous:
+            return 'p' + encode_cursor(self._key(self.rows[0]))
+        return None
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class KeysetListMixin:
+    """
+    List view mixin for server-side search, sorting, tabs and keyset pagination, driven by the query string:
+    ?tab=...&q=...&sort=...&cursor=...
+
+    `sort_orders` maps sort names to KeysetPage orderings, with `default_sort` used when none is given, or the
+    entry for the current tab in `default_sorts`. `tabs` optionally maps tab names to Q filters, and the count of
+    every tab, with the search applied, is computed in one aggregate query. `search_fields` are the lookups the
+    search term is matched against. annotate_queryset() adds the columns that only the rows of the page need.
+    """
+    per_page = 25
+    sort_orders = {}
+    default_sort = None
+    default_sorts = {}
+    tabs = {}
+    default_tab = None
+    search_fields = ()
+
+    @cached_property
+    def tab(self):
+        tab = self.request.GET.get('tab')
+        return tab if tab in self.tabs else self.default_tab
+
+    @cached_property
+    def sort(self):
+        sort = self.request.GET.get('sort')
+        return sort if sort in self.sort_orders else self.default_sorts.get(self.tab, self.default_sort)
+
+    @cached_property
+    def search(self):
+        return self.request.GET.get('q', '').strip()
+
+    def search_queryset(self, queryset):
+        if self.search and self.search_fields:
+            q = Q()
+            for lookup in self.search_fields:
+                q |= Q(**{lookup: self.search})
+            queryset = queryset.filter(q)
+        return queryset
+
+    @cached_property
+    def tab_counts(self):
+        if not self.tabs:
+            return {}
+        return self.search_queryset(self.get_queryset())\
+            .aggregate(**{tab: Count('pk', filter=q) for tab, q in self.tabs.items()})
+
+    def annotate_queryset(self, queryset):
+        """Columns only the rows of the page need, such as counts, which the tab counts can do without"""
+        return queryset
+
+    @cached_property
+    def page(self):
+        queryset = self.search_queryset(self.get_queryset())
+        if self.tab:
+            queryset = queryset.filter(self.tabs[self.tab])
+        queryset = self.annotate_queryset(queryset)
+        return KeysetPage(queryset, self.sort_orders[self.sort], self.request.GET.get('cursor'), self.per_page)
+
+    def query_string(self, **params):
+        query = self.request.GET.copy()
+        query.pop('cursor', None)
+        for key, value in params.items():
+            if value is None:
+                query.pop(key, None)
+            else:
+                query[key] = value
+        return query.urlencode()
+
+    def get_context_data(self, **kwargs):
+        page = self.page
+        kwargs['page'] = page
+        kwargs['search'] = self.search
+        kwargs['tab'] = self.tab
+        kwargs['sort'] = self.sort
+        kwargs['tab_queries'] = {tab: self.query_string(tab=tab, sort=None) for tab in self.tabs}
+        kwargs['sort_queries'] = {sort: self.query_string(sort=sort) for sort in self.sort_orders}
+        kwargs['next_query'] = self.query_string(cursor=page.next_cursor) if page.has_next else None
+        kwargs['previous_query'] = self.query_string(cursor=page.previous_cursor) if page.has_previous else None
+        return super().get_context_data(**kwargs)
@@ -1,5 +1,12 @@
+import hashlib
+import os
+import re
 import string
-from sentence_splitter import split_text_into_sentences
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from sentence_splitter import SentenceSplitter
 
 test = [
 "Unlike the other indices, the ARI, along with the Coleman–Liau, relies on a factor of characters per word, instead of the usual syllables per word. Although opinion varies on its accuracy as compared to the syllables/word and complex words indices, characters/word is often faster to calculate, as the number of characters is more readily and accurately counted by computer programs than syllables. In fact, this index was designed for real-time monitoring of readability on electric typewriters",
@@ -8,6 +15,145 @@ test = [
 "Emerging from behind a cloud blind in a blaze orange miter and camouflaged vestments, His Holiness Pope Francis reportedly celebrated with fellow clergymen Thursday after bagging a highly coveted prize in this year’s Vatican seraphim hunt: a six-winged trophy angel."
 ]
 
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# A run of line breaks between two non-whitespace characters. The sentence splitter never joins or splits across
+# such a run, so the text can be split there, as long as the empty lines in the run are counted as sentences.
+_SAFE_BREAK = re.compile(r'(?<=\S)[\r\n]*\n[\r\n]*(?=\S)')
+
+
+# Languages the sentence splitter has non-breaking prefixes for
+SPLITTER_LANGUAGES = ('ca', 'cs', 'da', 'de', 'el', 'en', 'es', 'fi', 'fr', 'hu', 'is', 'it', 'lt', 'lv', 'nl', 'no',
+                      'pl', 'pt', 'ro', 'ru', 'sk', 'sl', 'sv', 'tr')
+
+# Language.code is the flag shown in the language badges, a country code such as 'gb', or a region such as 'es-ct'.
+# The BCP 47 language subtag of every flag is listed, since many country codes are also the code of another language:
+# 'ca' is Canada, not Catalan, and 'sv' is El Salvador, not Swedish.
+FLAG_LANGUAGES = {
+    'ad': 'ca', 'ae': 'ar', 'al': 'sq', 'am': 'hy', 'ar': 'es', 'at': 'de', 'au': 'en', 'az': 'az', 'ba': 'bs',
+    'bd': 'bn', 'be': 'nl', 'bg': 'bg', 'bh': 'ar', 'bo': 'es', 'br': 'pt', 'by': 'be', 'ca': 'en', 'ch': 'de',
+    'cl': 'es', 'cn': 'zh', 'co': 'es', 'cr': 'es', 'cu': 'es', 'cy': 'el', 'cz': 'cs', 'de': 'de', 'dk': 'da',
+    'do': 'es', 'dz': 'ar', 'ec': 'es', 'ee': 'et', 'eg': 'ar', 'es': 'es', 'es-ct': 'ca', 'es-ga': 'gl', 'et': 'am',
+    'fi': 'fi', 'fr': 'fr', 'gb': 'en', 'gb-wls': 'cy', 'ge': 'ka', 'gr': 'el', 'gt': 'es', 'hk': 'zh', 'hn': 'es',
+    'hr': 'hr', 'hu': 'hu', 'id': 'id', 'ie': 'en', 'il': 'he', 'in': 'hi', 'iq': 'ar', 'ir': 'fa', 'is': 'is',
+    'it': 'it', 'jm': 'en', 'jo': 'ar', 'jp': 'ja', 'ke': 'sw', 'kh': 'km', 'kr': 'ko', 'kw': 'ar', 'kz': 'kk',
+    'la': 'lo', 'lb': 'ar', 'li': 'de', 'lk': 'si', 'lt': 'lt', 'lu': 'lb', 'lv': 'lv', 'ma': 'ar', 'md': 'ro',
+    'mk': 'mk', 'mm': 'my', 'mn': 'mn', 'mt': 'mt', 'mx': 'es', 'my': 'ms', 'ng': 'en', 'ni': 'es', 'nl': 'nl',
+    'no': 'no', 'np': 'ne', 'nz': 'en', 'om': 'ar', 'pa': 'es', 'pe': 'es', 'ph': 'fil', 'pk': 'ur', 'pl': 'pl',
+    'pr': 'es', 'pt': 'pt', 'py': 'es', 'qa': 'ar', 'ro': 'ro', 'rs': 'sr', 'ru': 'ru', 'sa': 'ar', 'se': 'sv',
+    'sg': 'en', 'si': 'sl', 'sk': 'sk', 'sl': 'en', 'sv': 'es', 'sy': 'ar', 'th': 'th', 'tn': 'ar', 'tr': 'tr',
+    'tw': 'zh', 'ua': 'uk', 'us': 'en', 'uy': 'es', 'uz': 'uz', 've': 'es', 'vn': 'vi', 'za': 'en',
+}
+
+
+def flag_language(code, default=None):
+    """Language subtag of the flag in a Language.code, such as 'en' for 'gb', or `default` for a flag not listed"""
+    code = (code or '').lower()
+    return FLAG_LANGUAGES.get(code) or FLAG_LANGUAGES.get(code.split('-')[0], default)
+
+
+def splitter_language(code):
+    """Returns the sentence splitter language for a Language.code, or 'en' if the flag or language is not supported"""
+    language = flag_language(code, 'en')
+    if language in SPLITTER_LANGUAGES:
+        return language
+    return 'en'
+
+
+class SplitterRegistry:
+    """
+    Process-wide registry of sentence splitters, one per language. Creating a splitter reads its non-breaking prefix
+    file, so this is done once per language instead of for every text. They are created when first needed, and
+    long-running processes can call warm() once to load them all up front.
+    """
+    def __init__(self):
+        self._splitters = {}
+        self._lock = threading.Lock()
+
+    def get(self, code):
+        """The splitter of a Language.code"""
+        return self.for_language(splitter_language(code))
+
+    def for_language(self, language):
+        """The splitter of one of SPLITTER_LANGUAGES"""
+        splitter = self._splitters.get(language)
+        if splitter is None:
+            with self._lock:
+                splitter = self._splitters.get(language)
+                if splitter is None:
+                    splitter = SentenceSplitter(language=language)
+                    self._splitters[language] = splitter
+        return splitter
+
+    def warm(self, languages=SPLITTER_LANGUAGES):
+        for language in languages:
+            self.for_language(language)
+
+
+splitters = SplitterRegistry()
+
+
+def _count_words(sentences):
+    """Returns (word_count, long_words_count) of a list of sentences"""
+    word_count = 0
+    long_words_count = 0
+    for sentence in sentences:
+        for word in sentence.translate(PUNCTUATION_TABLE).split():
+            word_count += 1
+            if len(word) >= 7:
+                long_words_count += 1
+    return word_count, long_words_count
+
+
+def _read_chunks(source, chunk_size):
+    if isinstance(source, str):
+        for i in range(0, len(source), chunk_size):
+            yield source[i:i + chunk_size]
+    else:
+        chunk = source.read(chunk_size)
+        while chunk:
+            yield chunk
+            chunk = source.read(chunk_size)
+
+
+def iter_text_pieces(source, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Reads a string or file-like object in chunks, and yields (piece, empty_lines) tuples, cut at safe breaks.
+    Splitting every piece into sentences gives the sentences of the whole text, except for the empty lines between
+    pieces, which are counted in empty_lines.
+    """
+    buffer = ''
+    for chunk in _read_chunks(source, chunk_size):
+        scan_from = len(buffer)
+        while scan_from > 0 and buffer[scan_from - 1].isspace():
+            scan_from -= 1
+        scan_from = max(scan_from - 1, 0)
+        buffer += chunk
+        last = None
+        for last in _SAFE_BREAK.finditer(buffer, scan_from):
+            pass
+        if last:
+            yield buffer[:last.end()], last.group().count('\n') - 1
+            buffer = buffer[last.end():]
+    yield buffer, 0
+
+
+def count_text(source, language='en', chunk_size=STREAM_CHUNK_SIZE):
+    """Returns the (word_count, sentence_count, long_words_count) of a text, streaming it piece by piece"""
+    splitter = splitters.get(language)
+    word_count = 0
+    sentence_count = 0
+    long_words_count = 0
+    for piece, empty_lines in iter_text_pieces(source, chunk_size):
+        sentences = splitter.split(text=piece)
+        words, long_words = _count_words(sentences)
+        word_count += words
+        long_words_count += long_words
+        sentence_count += len(sentences) + empty_lines
+    return word_count, sentence_count, long_words_count
+
 
 class PointScore:
     """
@@ -24,45 +170,64 @@ class PointScore:
             1 is very low (0.5), 2 is low (0.75), 3 is normal (1), 4 is high (1.25), 5 is very high (1.5).
         The number is rounded off to become the final score. Minimum score is 10 points.
 
-    Language can also be set as a parameter. This is used for splitting the sentences. Default: 'en'
+    Language can also be set as a parameter. This is a Language.code, and is used for splitting the sentences.
+        Flags not in FLAG_LANGUAGES, and languages the sentence splitter does not support, are split as English.
+        Default: 'en', which is no flag, so English
+
+    If the counts of the text are already known, as (word_count, sentence_count, long_words_count), they can be
+    passed as `counts`, and the text is not parsed again.
 
     Get score by calling obj.score()
     """
-    def __init__(self, text, priority=3, normalizing_factor=50, language='en'):
-        self.version = 1
+    version = 3
+    priority_factor = {
+        1: 0.5,
+        2: 0.75,
+        3: 1,
+        4: 1.25,
+        5: 1.5
+    }
+
+    def __init__(self, text, priority=3, normalizing_factor=50, language='en', counts=None):
         self.text = text
         self.language = language
         self.normalizing_factor = normalizing_factor
         self.priority = priority
-        self.priority_factor = {
-            1: 0.5,
-            2: 0.75,
-            3: 1,
-            4: 1.25,
-            5: 1.5
-        }
         self.word_count = 0
         self._long_words_count = 0
         self._sentence_count = 0
-        self._count_it_up()
+        if counts is None:
+            self._count_it_up()
+        else:
+            self.word_count, self._sentence_count, self._long_words_count = counts
 
     def _count_it_up(self):
-        sentences = split_text_into_sentences(text=self.text, language=self.language)
-        sentence_count = len(sentences)
-        words = []
+        sentences = splitters.get(self.language).split(text=self.text)
+        self.word_count, self._long_words_count = _count_words(sentences)
+        self._sentence_count = len(sentences)
 
-        for sentence in sentences:
-            sentence_stripped = sentence.translate(str.maketrans('', '', string.punctuation))
-            words += sentence_stripped.split()
+    @classmethod
+    def from_stream(cls, source, priority=3, normalizing_factor=50, language='en', chunk_size=None):
+        """
+        Scores a text read in chunks from a string or a file-like object, without holding the whole text in memory.
+        Only the running counts are kept, so memory use is bounded by the chunk size and the longest paragraph.
+        Gives the same counts, LIX and score as PointScore(text).
+        """
+        counts = count_text(source, language=language, chunk_size=chunk_size or STREAM_CHUNK_SIZE)
+        return cls(text=None, priority=priority, normalizing_factor=normalizing_factor, language=language,
+                   counts=counts)
 
-        long_words_count = 0
-        for word in words:
-            if len(word) >= 7:
-                long_words_count += 1
+    @property
+    def counts(self):
+        return self.word_count, self._sentence_count, self._long_words_count
+
+    @property
+    def sentence_count(self):
+        return self._sentence_count
 
-        self.word_count = len(words)
-        self._sentence_count = sentence_count
-        self._long_words_count = long_words_count
+    @property
+    def long_words_count(self):
+        return self._long_words_count
 
     def lix(self):
         lix = self.word_count / self._sentence_count + (100 * self._long_words_count) / self.word_count
@@ -81,3 +246,154 @@ class PointScore:
 
     def __str__(self):
         return str(self.score())
+
+
+ScoreResult = namedtuple('ScoreResult', ['score', 'word_count', 'version', 'sentence_count', 'long_words_count'])
+
+# Below this many texts, the cost of starting a process pool outweighs the gain
+BATCH_MIN_PARALLEL = 8
+
+
+def _count_item(item):
+    text, language = item
+    return PointScore(text=text, language=language).counts
+
+
+def _count_chunk(items):
+    return [_count_item(item) for item in items]
+
+
+def score_texts(items, normalizing_factor=50, processes=None, chunksize=64, cache=None, executor=None):
+    """
+    Scores many texts at once. Takes an iterable of (text, priority, language) tuples and returns a list of
+    ScoreResult(score, word_count, version, sentence_count, long_words_count), in the same order as the input.
+
+    Sentence splitting and counting is spread over a pool of worker processes, each counting chunks of `chunksize`
+    texts. The scores are computed by PointScore itself from those counts, and are the int of PointScore.score() that
+    Task.point_score stores, so rows written without the ORM get the same value. Small batches, or processes=1, are
+    counted in the current process.
+
+    If a ScoreCache is given, only the texts missing from it are counted, and the new counts are added to it.
+    An existing process pool can be passed as `executor`, to avoid starting a new one for every batch.
+    """
+    items = [(text, priority, language) for text, priority, language in items]
+    keys = [ScoreCache.make_key(text, language, normalizing_factor) for text, priority, language in items]
+    known = cache.get_many(keys) if cache is not None else {}
+
+    missing = {}
+    for key, (text, priority, language) in zip(keys, items):
+        if key not in known and key not in missing:
+            missing[key] = (text, language)
+    to_count = list(missing.values())
+
+    chunks = [to_count[i:i + chunksize] for i in range(0, len(to_count), chunksize)]
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(chunks))
+
+    counted = []
+    if len(to_count) < BATCH_MIN_PARALLEL or (executor is None and processes <= 1):
+        counted = [_count_item(item) for item in to_count]
+    elif executor is not None:
+        for chunk_counts in executor.map(_count_chunk, chunks):
+            counted += chunk_counts
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for chunk_counts in executor.map(_count_chunk, chunks):
+                counted += chunk_counts
+
+    new = dict(zip(missing.keys(), counted))
+    if cache is not None and new:
+        cache.set_many(new)
+    known.update(new)
+
+    results = []
+    for key, (text, priority, language) in zip(keys, items):
+        ps = PointScore(text=text, priority=priority, normalizing_factor=normalizing_factor, language=language,
+                        counts=known[key])
+        results.append(ScoreResult(int(ps.score()), ps.word_count, ps.version, ps.sentence_count, ps.long_words_count))
+    return results
+
+
+class ScoreCache:
+    """
+    Cache of the counts PointScore derives from a text, so the sentence splitter only runs once per text.
+    The counts are keyed by a hash of (text, language, normalizing_factor, version), and do not depend on the
+    priority, so changing the priority of a task is always a cache hit.
+
+    The first tier is an in-process LRU holding `maxsize` entries. If `persistent` is set, misses fall through to the
+    PointScoreCacheEntry table, and new counts are written to it, so they survive restarts and are shared between
+    processes.
+    """
+    def __init__(self, maxsize=4096, persistent=False):
+        self.maxsize = maxsize
+        self.persistent = persistent
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text, language='en', normalizing_factor=50, version=PointScore.version):
+        h = hashlib.sha256()
+        h.update(('%s:%s:%s:' % (version, splitter_language(language), normalizing_factor)).encode('utf-8'))
+        h.update(text.encode('utf-8'))
+        return h.hexdigest()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+        missing = [key for key in keys if key not in found]
+        if self.persistent and missing:
+            from .models import PointScoreCacheEntry
+            stored = {}
+            for entry in PointScoreCacheEntry.objects.filter(key__in=missing):
+                stored[entry.key] = (entry.word_count, entry.sentence_count, entry.long_words_count)
+            self._remember(stored)
+            found.update(stored)
+        return found
+
+    def set_many(self, counts):
+        self._remember(counts)
+        if self.persistent and counts:
+            from .models import PointScoreCacheEntry
+            entries = [PointScoreCacheEntry(key=key, version=PointScore.version, word_count=c[0], sentence_count=c[1],
+                                            long_words_count=c[2]) for key, c in counts.items()]
+            PointScoreCacheEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+    def _remember(self, counts):
+        with self._lock:
+            for key, c in counts.items():
+                self._entries[key] = c
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def purge_stale():
+        """Deletes the persistent entries of older point score versions, which no key can reach. Returns how many"""
+        from .models import PointScoreCacheEntry
+        return PointScoreCacheEntry.objects.filter(version__lt=PointScore.version).delete()[0]
+
+    def point_score(self, text, priority=3, normalizing_factor=50, language='en'):
+        """Returns a PointScore for the text, re-using cached counts if the text has been seen before"""
+        key = self.make_key(text, language, normalizing_factor)
+        counts = self.get_many([key]).get(key)
+        if counts is None:
+            ps = PointScore(text=text, priority=priority, normalizing_factor=normalizing_factor, language=language)
+            self.set_many({key: ps.counts})
+            return ps
+        return PointScore(text=text, priority=priority, normalizing_factor=normalizing_factor, language=language,
+                          counts=counts)
+
+
+score_cache = ScoreCache(
+    maxsize=getattr(settings, 'POINT_SCORE_CACHE_SIZE', 4096),
+    persistent=getattr(settings, 'POINT_SCORE_PERSISTENT_CACHE', False),
+)
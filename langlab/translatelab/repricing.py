@@ -0,0 +1,90 @@
+import threading
+from collections import namedtuple
+import numpy as np
+from django.db.models import Count, Max, Sum
+
+from .models import Client, Task
+from .point_score import PointScore
+
+ClientImpact = namedtuple('ClientImpact', ['client_id', 'name', 'tasks', 'current_points', 'new_points'])
+
+Repricing = namedtuple('Repricing', ['tasks', 'current_points', 'new_points', 'clients'])
+
+
+class Corpus:
+    """
+    The text statistics of all tasks, as NumPy arrays. Loaded with a single projected query, and kept in memory
+    until the fingerprint of the task table changes.
+    """
+    fields = ('client_id', 'priority', 'point_score', 'word_count', 'sentence_count', 'long_words_count')
+
+    _lock = threading.Lock()
+    _cached = None
+
+    def __init__(self, fingerprint, rows):
+        self.fingerprint = fingerprint
+        columns = np.array(rows, dtype=np.int64).reshape(-1, len(self.fields))
+        client_ids = columns[:, 0]
+        self.client_ids, self.client_index = np.unique(client_ids, return_inverse=True)
+        self.priority = columns[:, 1]
+        self.point_score = columns[:, 2]
+        self.word_count = columns[:, 3]
+        self.sentence_count = columns[:, 4]
+        self.long_words_count = columns[:, 5]
+
+    @staticmethod
+    def fingerprint():
+        return tuple(Task.objects.aggregate(Count('pk'), Max('pk'), Max('time_updated'), Sum('point_score'),
+                                            Sum('word_count')).values())
+
+    @classmethod
+    def load(cls):
+        fingerprint = cls.fingerprint()
+        with cls._lock:
+            if cls._cached is None or cls._cached.fingerprint != fingerprint:
+                rows = Task.objects.order_by().values_list(*cls.fields)
+                rows = [(row[0] or 0, ) + row[1:] for row in rows]
+                cls._cached = cls(fingerprint, rows)
+            return cls._cached
+
+
+def reprice(normalizing_factor=50, priority_factor=None, corpus=None):
+    """
+    Recomputes the point score of every task under another normalizing factor or priority factor table, using the
+    stored text statistics instead of the texts. Follows PointScore.score() step by step, so with the default
+    parameters the new points equal the stored ones. Tasks without statistics keep their current score.
+    Returns a Repricing with the totals, and the impact per client (client_id 0 is tasks without a client).
+    """
+    if priority_factor is None:
+        priority_factor = PointScore.priority_factor
+    if corpus is None:
+        corpus = Corpus.load()
+
+    word_count = corpus.word_count
+    sentence_count = corpus.sentence_count
+    has_stats = (word_count > 0) & (sentence_count > 0)
+    words = np.where(has_stats, word_count, 1)
+    sentences = np.where(has_stats, sentence_count, 1)
+
+    lix = words / sentences + (100 * corpus.long_words_count) / words
+    scaling_factor = ((lix + normalizing_factor) / 2) * 0.02
+    score = np.maximum(np.trunc(words * scaling_factor), 10)
+
+    factors = np.ones(max(list(priority_factor) + [int(corpus.priority.max(initial=0))]) + 1)
+    for priority, factor in priority_factor.items():
+        if factor:
+            factors[priority] = factor
+    score = np.trunc(score * factors[corpus.priority]).astype(np.int64)
+    new_points = np.where(has_stats, score, corpus.point_score)
+
+    current_by_client = np.bincount(corpus.client_index, weights=corpus.point_score,
+                                    minlength=len(corpus.client_ids))
+    new_by_client = np.bincount(corpus.client_index, weights=new_points, minlength=len(corpus.client_ids))
+    tasks_by_client = np.bincount(corpus.client_index, minlength=len(corpus.client_ids))
+
+    names = dict(Client.objects.filter(pk__in=corpus.client_ids.tolist()).values_list('pk', 'name'))
+    clients = [ClientImpact(int(client_id), names.get(int(client_id), '-'), int(tasks), int(current), int(new))
+               for client_id, tasks, current, new
+               in zip(corpus.client_ids, tasks_by_client, current_by_client, new_by_client)]
+    clients.sort(key=lambda c: abs(c.new_points - c.current_points), reverse=True)
+    return Repricing(len(new_points), int(corpus.point_score.sum()), int(new_points.sum()), clients)
@@ -0,0 +1,60 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from django.db import connections, transaction
+from django.db.models import Q
+
+from .models import Task, language_code
+from .point_score import PointScore, score_cache, score_texts
+
+RescoreChange = namedtuple('RescoreChange', ['task_id', 'name', 'old_score', 'new_score',
+                                             'old_word_count', 'new_word_count'])
+
+
+def stale_tasks():
+    """Tasks scored by an older version of the point score algorithm, or without text statistics"""
+    return Task.objects.filter(Q(point_score_version__lt=PointScore.version) | Q(sentence_count=0, word_count__gt=0))
+
+
+def rescore_batches(batch_size=500, processes=None, dry_run=False, start_after=0):
+    """
+    Re-scores all stale tasks, in batches ordered by id. Yields (last_id, count, changes) after each batch, where
+    changes is a list of RescoreChange for the tasks whose score or word count changed.
+
+    The texts of a batch are scored in parallel by score_texts, and the results are written back with a single
+    bulk update per batch. Since rescored tasks are no longer stale, an interrupted run can simply be started again.
+    It can also be resumed from a given task id with `start_after`, which is useful with `dry_run`, where nothing is
+    written. With processes=1 the texts are scored in the current process, without a pool.
+    """
+    if processes == 1:
+        pool = nullcontext()  # score_texts counts in this process when it has no executor
+    else:
+        connections.close_all()  # don't share the database connection with the worker processes
+        pool = ProcessPoolExecutor(max_workers=processes)
+    last_id = start_after
+    with pool as executor:
+        while True:
+            tasks = list(stale_tasks().filter(pk__gt=last_id).order_by('pk').select_related('source_language')
+                         .only('pk', 'name', 'source_content', 'priority', 'point_score', 'word_count',
+                               'source_language__code')[:batch_size])
+            if not tasks:
+                break
+            items = [(task.source_content, task.priority, language_code(task.source_language)) for task in tasks]
+            results = score_texts(items, processes=processes, cache=score_cache, executor=executor)
+
+            changes = []
+            for task, result in zip(tasks, results):
+                if task.point_score != result.score or task.word_count != result.word_count:
+                    changes.append(RescoreChange(task.pk, task.name, task.point_score, result.score,
+                                                 task.word_count, result.word_count))
+                task.point_score = result.score
+                task.word_count = result.word_count
+                task.sentence_count = result.sentence_count
+                task.long_words_count = result.long_words_count
+                task.point_score_version = result.version
+            if not dry_run:
+                with transaction.atomic():
+                    Task.objects.bulk_update(tasks, ['point_score', 'word_count', 'sentence_count', 'long_words_count',
+                                                     'point_score_version'])
+            last_id = tasks[-1].pk
+            yield last_id, len(tasks), changes
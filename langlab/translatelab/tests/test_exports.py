@@ -0,0 +1,119 @@
+import csv
+import io
+import zipfile
+from xml.etree import ElementTree
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+
+from ..csv_data import csv_rows
+from ..models import ImportBatch, Language, Task
+from ..xml_data import tmx_lines, xliff_archive
+from .utils import make_languages, make_supervisor, make_task, make_translator
+
+XLIFF = '{urn:oasis:names:tc:xliff:document:2.0}'
+XML_LANG = '{http://www.w3.org/XML/1998/namespace}lang'
+
+
+def read_csv(lines):
+    return list(csv.DictReader(io.StringIO(''.join(lines))))
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.english, cls.german, cls.danish = make_languages('English', 'German', 'Danish')
+        cls.supervisor = make_supervisor()
+        anna = make_translator('anna', cls.english, cls.german, cls.danish)
+        cls.tasks = [make_task(cls.supervisor, cls.english, [cls.german, cls.danish], name='Task %d' % i,
+                               text='Source text %d, with <markup> & a \x0b control character.' % i)
+                     for i in range(7)]
+        for task in cls.tasks[:4]:
+            translation = task.translations.get(language=cls.german)
+            translation.claim_translation(anna)
+            translation.text = 'Übersetzung %s' % task.name
+            translation.save_translation(('text', ), finish=True)
+
+    def queryset(self):
+        return Task.objects.filter(pk__in=[task.pk for task in self.tasks])
+
+    def test_csv_rows(self):
+        # the languages up front, then the tasks and their translations a chunk at a time
+        with self.assertNumQueries(1 + 3 * 2):
+            rows = read_csv(csv_rows(self.queryset(), chunk_size=3))
+        self.assertEqual([row['name'] for row in rows], ['Task %d' % i for i in range(7)])
+        self.assertEqual(rows[0]['original_language'], 'English')
+        self.assertEqual(rows[0]['translation_german'], 'Übersetzung Task 0')
+        self.assertEqual(rows[6]['translation_german'], '')
+        self.assertIn('translation_danish', rows[0])
+
+    def test_csv_export_view_streams(self):
+        self.client.force_login(self.supervisor)
+        response = self.client.post(reverse('supervisors:csv_export'),
+                                    {'task_list': [str(task.pk) for task in self.tasks[:2]], 'format': 'csv'})
+        self.assertTrue(response.streaming)
+        rows = read_csv(b''.join(response.streaming_content).decode('utf-8'))
+        self.assertEqual([row['name'] for row in rows], ['Task 0', 'Task 1'])
+
+    def test_export_view_rejects_bad_ids(self):
+        self.client.force_login(self.supervisor)
+        response = self.client.post(reverse('supervisors:csv_export'), {'task_list': ['1', 'x'], 'format': 'csv'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_xliff_archive(self):
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(xliff_archive(self.queryset()))))
+        names = sorted(archive.namelist())
+        self.assertEqual(names, ['english_%d-danish_%d.xlf' % (self.english.pk, self.danish.pk),
+                                 'english_%d-german_%d.xlf' % (self.english.pk, self.german.pk)])
+        root = ElementTree.fromstring(archive.read(names[1]))
+        self.assertEqual((root.get('srcLang'), root.get('trgLang')), ('en', 'de'))
+        units = root.findall('%sfile/%sunit' % (XLIFF, XLIFF))
+        self.assertEqual([unit.get('name') for unit in units], ['Task %d' % i for i in range(7)])
+        segment = units[0].find(XLIFF + 'segment')
+        self.assertEqual(segment.get('state'), 'translated')
+        self.assertEqual(segment.find(XLIFF + 'source').text, 'Source text 0, with <markup> & a  control character.')
+        self.assertEqual(segment.find(XLIFF + 'target').text, 'Übersetzung Task 0')
+        self.assertIsNone(units[6].find(XLIFF + 'segment/' + XLIFF + 'target'))
+
+    def test_xliff_names_of_languages_with_the_same_name(self):
+        Language.objects.filter(pk=self.danish.pk).update(name='German')
+        names = zipfile.ZipFile(io.BytesIO(b''.join(xliff_archive(self.queryset())))).namelist()
+        self.assertEqual(len(set(names)), 2)
+
+    def test_tmx(self):
+        root = ElementTree.fromstring(''.join(tmx_lines(self.queryset(), chunk_size=2)).encode('utf-8'))
+        units = root.findall('body/tu')
+        self.assertEqual(len(units), 4)  # tasks without any translated text are left out
+        self.assertEqual(units[0].get('srclang'), 'en')
+        self.assertEqual([(tuv.get(XML_LANG), tuv.find('seg').text) for tuv in units[0].findall('tuv')],
+                         [('en', 'Source text 0, with <markup> & a  control character.'),
+                          ('de', 'Übersetzung Task 0')])
+
+
+class ImportRoundTripTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_languages('English', 'German', 'Danish')
+        cls.supervisor = make_supervisor()
+
+    def test_imported_tasks_export_as_they_were_read(self):
+        lines = ['name,text,source_language,target_languages,priority,instructions']
+        lines += ['Imported %d,"Text %d, quoted",english,German;dk,%d,' % (i, i, i % 5 + 1) for i in range(5)]
+        lines.append('Invalid,,english,all,3,')
+        self.client.force_login(self.supervisor)
+        upload = SimpleUploadedFile('tasks.csv', '\n'.join(lines).encode('utf-8'))
+        response = self.client.post(reverse('supervisors:task_csv_import'), {'csv_file': upload})
+        batch = ImportBatch.objects.get()
+        self.assertRedirects(response, reverse('supervisors:task_csv_import_review', args=[batch.pk]))
+        self.assertEqual((batch.row_count, batch.error_count), (6, 1))
+
+        self.client.post(reverse('supervisors:task_csv_import_review', args=[batch.pk]), {'action': 'import'})
+        tasks = Task.objects.filter(owner=self.supervisor).order_by('pk')
+        self.assertEqual(tasks.count(), 5)
+        self.assertEqual([task.stages_total for task in tasks], [8] * 5)
+
+        rows = read_csv(csv_rows(tasks))
+        self.assertEqual([(row['name'], row['original_text'], row['original_language']) for row in rows],
+                         [('Imported %d' % i, 'Text %d, quoted' % i, 'English') for i in range(5)])
+        self.assertEqual(sorted(column for column in rows[0] if column.startswith('translation_')),
+                         ['translation_danish', 'translation_german'])
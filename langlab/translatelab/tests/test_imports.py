@@ -0,0 +1,114 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from ..imports import importable_rows, promote_import, stage_import
+from ..models import ImportBatch, ImportRow, Task, Translation, WorkItem, recount_task_progress
+from ..point_score import PointScore
+from .utils import TEXT, make_languages, make_supervisor
+
+
+class ImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.english, cls.german, cls.danish = make_languages('English', 'German', 'Danish')
+        cls.supervisor = make_supervisor()
+
+    def row(self, name, priority=3, source=None, targets=None, text=TEXT):
+        return {'name': name, 'text': text, 'instructions': '', 'priority': priority,
+                'source_language': (source or self.english).pk,
+                'target_languages': [language.pk for language in (targets or [self.german, self.danish])]}
+
+    def stage(self, rows, **options):
+        return stage_import(rows, self.supervisor, file_name='tasks.csv', processes=1, **options)
+
+    def test_rows_are_staged_with_their_errors(self):
+        rows = [self.row('Valid'), self.row(''), self.row('No text', text=''), self.row('Priority', priority=None),
+                dict(self.row('Unknown source'), source_language=None)]
+        batch = self.stage(rows, batch_size=2)
+        self.assertEqual((batch.status, batch.row_count, batch.error_count), (ImportBatch.STAGED, 5, 4))
+        self.assertEqual(list(batch.rows.order_by('line').values_list('line', 'errors')),
+                         [(2, ''), (3, 'no name'), (4, 'no text'), (5, 'priority is not 1 to 5'),
+                          (6, 'unknown source language')])
+        self.assertEqual(list(importable_rows(batch).values_list('name', flat=True)), ['Valid'])
+
+    def test_scores_are_those_of_the_model(self):
+        rows = [self.row('Priority %d' % priority, priority=priority) for priority in range(1, 6)]
+        batch = self.stage(rows)
+        promote_import(batch)
+        for task in Task.objects.all():
+            with self.subTest(priority=task.priority):
+                score = PointScore(TEXT, priority=task.priority, language='gb')
+                self.assertEqual(type(task.point_score), int)
+                self.assertEqual((task.point_score, task.point_score_version, task.word_count),
+                                 (int(score.score()), PointScore.version, score.word_count))
+
+    def test_promotion_creates_tasks_translations_and_work(self):
+        rows = [self.row('First'), self.row('Second', targets=[self.english, self.german]), self.row('')]
+        batch = self.stage(rows)
+        self.assertEqual(promote_import(batch), 2)
+        first, second = Task.objects.order_by('pk')
+        self.assertEqual((first.name, first.owner, first.import_row.line), ('First', self.supervisor, 2))
+        self.assertEqual(first.translations.count(), 2)
+        self.assertEqual(list(second.translations.values_list('language', flat=True)), [self.german.pk])
+        self.assertEqual(recount_task_progress([first.pk, second.pk], dry_run=True), [])
+        self.assertEqual(WorkItem.objects.filter(kind=WorkItem.TRANSLATE, state=WorkItem.AVAILABLE).count(), 3)
+        self.assertEqual(ImportBatch.objects.get(pk=batch.pk).status, ImportBatch.IMPORTED)
+
+    def test_a_batch_is_promoted_once(self):
+        batch = self.stage([self.row('Once')])
+        self.assertEqual(promote_import(batch), 1)
+        self.assertIsNone(promote_import(batch))
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_check_rolls_the_promotion_back(self):
+        batch = self.stage([self.row('Rolled back')])
+
+        def check():
+            raise RuntimeError('lost the claim')
+        with self.assertRaises(RuntimeError):
+            promote_import(batch, check=check)
+        self.assertFalse(Task.objects.exists())
+        self.assertFalse(Translation.objects.exists())
+        self.assertEqual(ImportBatch.objects.get(pk=batch.pk).status, ImportBatch.STAGED)
+
+    def test_failed_staging_leaves_no_batch(self):
+        def rows():
+            yield self.row('First')
+            raise ValueError('broken file')
+        with self.assertRaises(ValueError):
+            self.stage(rows())
+        self.assertFalse(ImportBatch.objects.exists())
+        self.assertFalse(ImportRow.objects.exists())
+
+
+class ImportReviewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        english, german = make_languages('English', 'German')
+        cls.supervisor = make_supervisor()
+        rows = [{'name': 'Row %d' % i, 'text': TEXT, 'instructions': '', 'priority': 3,
+                 'source_language': english.pk, 'target_languages': [german.pk]} for i in range(4)]
+        cls.batch = stage_import(rows, cls.supervisor, processes=1)
+        cls.url = reverse('supervisors:task_csv_import_review', args=[cls.batch.pk])
+
+    def setUp(self):
+        self.client.force_login(self.supervisor)
+
+    def test_excluded_rows_are_not_imported(self):
+        excluded = list(self.batch.rows.filter(name__in=['Row 1', 'Row 2']).values_list('pk', flat=True))
+        self.client.post(self.url, {'action': 'exclude', 'rows': excluded})
+        response = self.client.get(self.url + '?tab=excluded')
+        self.assertEqual({row.name for row in response.context['page']}, {'Row 1', 'Row 2'})
+        self.client.post(self.url, {'action': 'import'})
+        self.assertEqual(sorted(Task.objects.values_list('name', flat=True)), ['Row 0', 'Row 3'])
+
+    def test_discard(self):
+        self.client.post(self.url, {'action': 'discard'})
+        self.assertFalse(ImportBatch.objects.exists())
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_other_supervisors_do_not_see_the_batch(self):
+        self.client.force_login(make_supervisor('other'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.post(self.url, {'action': 'import'}).status_code, 404)
+        self.assertFalse(Task.objects.exists())
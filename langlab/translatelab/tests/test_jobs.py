@@ -0,0 +1,243 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import jobs
+from ..jobs import (JobError, JobKind, JobLost, claim_job, enqueue, export_path, keep_claim, purge_job_files,
+                    report_progress, run_job, work)
+from ..models import ImportBatch, Job, Task
+from .utils import make_languages, make_supervisor, make_task
+
+
+def succeed(job, total=3):
+    for done in range(total + 1):
+        keep_claim(job, done, total)
+    job.result_url = '/done/'
+    return 'All done'
+
+
+def fail(job):
+    raise RuntimeError('Database went away')
+
+
+def give_up(job):
+    raise JobError('Nothing to retry')
+
+
+def silence_job_errors(test):
+    """Keeps the failures the tests cause out of the test output"""
+    logging.disable(logging.CRITICAL)
+    test.addCleanup(logging.disable, logging.NOTSET)
+
+
+TEST_KINDS = {
+    'succeed': JobKind(succeed, 'Succeeding'),
+    'fail': JobKind(fail, 'Failing'),
+    'give_up': JobKind(give_up, 'Giving up'),
+}
+
+
+@mock.patch.dict(jobs.JOB_KINDS, TEST_KINDS)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        silence_job_errors(self)
+
+    def due(self, job):
+        """Makes a queued job due now, instead of after its retry delay"""
+        Job.objects.filter(pk=job.pk).update(run_after=datetime.now(timezone.utc))
+
+    def expire(self, job):
+        Job.objects.filter(pk=job.pk).update(locked_until=datetime.now(timezone.utc) - timedelta(seconds=1))
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            enqueue('unknown')
+
+    def test_a_job_is_claimed_once(self):
+        job = enqueue('succeed', total=2)
+        claimed = claim_job('first')
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts, claimed.worker),
+                         (job.pk, Job.RUNNING, 1, 'first'))
+        self.assertIsNone(claim_job('second'))
+
+    def test_jobs_are_not_claimed_before_they_are_due(self):
+        job = enqueue('succeed')
+        Job.objects.filter(pk=job.pk).update(run_after=datetime.now(timezone.utc) + timedelta(minutes=1))
+        self.assertIsNone(claim_job('worker'))
+
+    def test_success(self):
+        job = enqueue('succeed', total=3)
+        self.assertTrue(run_job(claim_job('worker')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.total, job.message, job.result_url),
+                         (Job.DONE, 3, 3, 'All done', '/done/'))
+        self.assertIsNone(job.locked_until)
+
+    def test_failures_are_retried_with_a_growing_delay(self):
+        job = enqueue('fail')
+        for attempt in range(1, settings.JOB_MAX_ATTEMPTS):
+            before = datetime.now(timezone.utc)
+            self.assertFalse(run_job(claim_job('worker')))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.QUEUED, attempt))
+            self.assertEqual(job.message, 'RuntimeError: Database went away')
+            self.assertGreaterEqual(job.run_after, before + timedelta(seconds=settings.JOB_RETRY_DELAY
+                                                                      * 2 ** (attempt - 1)))
+            self.assertIsNone(claim_job('worker'))
+            self.due(job)
+        run_job(claim_job('worker'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, settings.JOB_MAX_ATTEMPTS))
+        self.assertIsNotNone(job.time_finished)
+
+    def test_job_error_fails_at_once(self):
+        job = enqueue('give_up')
+        run_job(claim_job('worker'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.message), (Job.FAILED, 1, 'Nothing to retry'))
+
+    def test_expired_lease_is_taken_over(self):
+        job = enqueue('succeed')
+        stale = claim_job('first')
+        self.expire(job)
+        taken = claim_job('second')
+        self.assertEqual((taken.pk, taken.attempts, taken.worker), (job.pk, 2, 'second'))
+        self.assertFalse(report_progress(stale, 1))
+        with self.assertRaises(JobLost):
+            keep_claim(stale)
+        # the first worker stops, and leaves the job to the second
+        self.assertFalse(run_job(stale))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.progress), (Job.RUNNING, 'second', 0))
+        self.assertTrue(run_job(taken))
+
+    def test_expired_lease_on_the_last_attempt_fails(self):
+        job = enqueue('succeed')
+        Job.objects.filter(pk=job.pk).update(attempts=settings.JOB_MAX_ATTEMPTS - 1)
+        claim_job('first')
+        self.expire(job)
+        self.assertIsNone(claim_job('second'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_work_runs_the_due_jobs(self):
+        enqueue('succeed')
+        enqueue('give_up')
+        self.assertEqual(work(burst=True), 2)
+        self.assertEqual(sorted(Job.objects.values_list('status', flat=True)), [Job.DONE, Job.FAILED])
+
+
+class JobFileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.english, cls.german = make_languages('English', 'German')
+        cls.supervisor = make_supervisor()
+
+    def setUp(self):
+        job_files = tempfile.TemporaryDirectory()
+        self.addCleanup(job_files.cleanup)
+        self.job_files = job_files.name
+        job_settings = override_settings(JOB_FILES_DIR=self.job_files)
+        job_settings.enable()
+        self.addCleanup(job_settings.disable)
+        silence_job_errors(self)
+        self.client.force_login(self.supervisor)
+
+    def files(self):
+        return sorted(os.listdir(self.job_files))
+
+    def upload(self, rows=3):
+        lines = ['name,text,source_language,target_languages'] + ['Task %d,Text %d.,English,German' % (i, i)
+                                                                   for i in range(rows)]
+        with override_settings(IMPORT_INLINE_LIMIT=2):
+            self.client.post(reverse('supervisors:task_csv_import'),
+                             {'csv_file': SimpleUploadedFile('tasks.csv', '\n'.join(lines).encode('utf-8'))})
+        return Job.objects.get(kind='stage_import')
+
+    def test_large_uploads_are_staged_by_a_job(self):
+        job = self.upload()
+        self.assertEqual(len(self.files()), 1)
+        work(burst=True)
+        job.refresh_from_db()
+        batch = ImportBatch.objects.get()
+        self.assertEqual((job.status, batch.status, batch.row_count), (Job.DONE, ImportBatch.STAGED, 3))
+        self.assertEqual(job.result_url, reverse('supervisors:task_csv_import_review', args=[batch.pk]))
+        self.assertEqual(self.files(), [])
+
+    def test_upload_is_kept_until_the_last_attempt(self):
+        job = self.upload()
+        with mock.patch.object(jobs, 'stage_import', side_effect=RuntimeError('Database went away')):
+            for attempt in range(settings.JOB_MAX_ATTEMPTS):
+                Job.objects.filter(pk=job.pk).update(run_after=datetime.now(timezone.utc))
+                self.assertEqual(len(self.files()), 1)
+                run_job(claim_job('worker'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(self.files(), [])
+
+    def test_unreadable_upload_fails_and_is_removed(self):
+        path = jobs.job_file('upload-bad.csv')
+        with open(path, 'wb') as upload:
+            upload.write(b'\xff\xfe\x00 not UTF-8')
+        job = enqueue('stage_import', owner=self.supervisor, path=path, file_name='bad.csv')
+        run_job(claim_job('worker'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 1))
+        self.assertTrue(job.message.startswith('Could not read the file'))
+        self.assertEqual(self.files(), [])
+
+    def test_export_job_and_download(self):
+        task = make_task(self.supervisor, self.english, [self.german], name='Exported')
+        response = self.client.post(reverse('supervisors:csv_export'),
+                                    {'task_list': [task.pk], 'format': 'csv', 'background': '1'})
+        job = Job.objects.get(kind='export')
+        self.assertRedirects(response, job.get_absolute_url())
+        work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual(self.files(), [os.path.basename(export_path(job)[0])])
+        response = self.client.get(job.result_url)
+        self.assertIn(b'Exported', b''.join(response.streaming_content))
+        response.close()
+        self.client.force_login(make_supervisor('other'))
+        self.assertEqual(self.client.get(job.result_url).status_code, 404)
+
+    def test_purge_removes_old_files_no_job_needs(self):
+        export = enqueue('export', owner=self.supervisor, format='csv', tasks=[])
+        work(burst=True)
+        export.refresh_from_db()
+        queued = self.upload()
+        for name in ('upload-orphan.csv', 'export-999-task_export.csv.2.part'):
+            open(os.path.join(self.job_files, name), 'w').close()
+        self.assertEqual(purge_job_files(), 0)
+
+        old = time.time() - settings.JOB_FILES_RETENTION - 1
+        for name in self.files():
+            os.utime(os.path.join(self.job_files, name), (old, old))
+        self.assertEqual(purge_job_files(), 3)
+        self.assertEqual(self.files(), [os.path.basename(json.loads(queued.arguments)['path'])])
+        export.refresh_from_db()
+        self.assertEqual(export.result_url, '')
+        self.assertEqual(self.client.get(reverse('supervisors:job_download', args=[export.pk])).status_code, 404)
+
+    def test_promote_import_job(self):
+        self.upload()
+        work(burst=True)
+        batch = ImportBatch.objects.get()
+        job = enqueue('promote_import', owner=self.supervisor, batch=batch.pk)
+        work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.message), (Job.DONE, '3 tasks imported'))
+        self.assertEqual(Task.objects.count(), 3)
+        batch.delete()
+        job = enqueue('promote_import', owner=self.supervisor, batch=batch.pk)
+        work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.message), (Job.FAILED, 'The import was discarded'))
@@ -0,0 +1,75 @@
+from django.test import TestCase
+
+from ..ledger import approve_task, replay_balances, roll_up_points
+from ..models import Client, PointsEntry, Task, Translation, Translator
+from .utils import make_languages, make_supervisor, make_task, make_translator
+
+
+class LedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        english, german, french = make_languages('English', 'German', 'French')
+        cls.anna = make_translator('anna', english, german, french)
+        cls.bert = make_translator('bert', english, german, french)
+        cls.client_account = Client.objects.create(name='Client', code='client')
+        cls.task = make_task(make_supervisor(), english, [german, french], client=cls.client_account,
+                             point_score=10)
+        for translation in cls.task.translations.all():
+            translation.claim_translation(cls.anna)
+            translation.text = 'Translated'
+            translation.save_translation(('text', ), finish=True)
+            translation.claim_validation(cls.bert)
+            translation.save_validation((), finish=True)
+
+    def balances(self):
+        return (Translator.objects.get(pk=self.anna.pk).get_points(),
+                Translator.objects.get(pk=self.bert.pk).get_points(),
+                Client.objects.get(pk=self.client_account.pk).get_points())
+
+    def test_approving_books_the_points_once(self):
+        task = Task.objects.get(pk=self.task.pk)
+        self.assertTrue(approve_task(task))
+        self.assertFalse(approve_task(Task.objects.get(pk=self.task.pk)))
+        self.assertEqual(PointsEntry.objects.filter(task=task).count(), 5)  # two translations, two validations, order
+        self.assertEqual(self.balances(), (20, 20, 10))
+
+    def test_unfinished_task_is_not_approved(self):
+        Translation.objects.filter(task=self.task).update(validation_time_finished=None)
+        Task.objects.filter(pk=self.task.pk).update(status=75)
+        self.assertFalse(approve_task(Task.objects.get(pk=self.task.pk)))
+        self.assertFalse(PointsEntry.objects.exists())
+
+    def test_roll_up_keeps_the_balances(self):
+        approve_task(Task.objects.get(pk=self.task.pk))
+        self.assertEqual(roll_up_points(), 3)
+        self.assertFalse(PointsEntry.objects.filter(rolled_up=False).exists())
+        self.assertEqual(Translator.objects.get(pk=self.anna.pk).points_earned, 20)
+        self.assertEqual(Client.objects.get(pk=self.client_account.pk).points_owed, 10)
+        self.assertEqual(self.balances(), (20, 20, 10))
+        self.assertEqual(roll_up_points(), 0)
+        self.assertEqual(replay_balances(), [])
+
+    def test_roll_up_in_batches(self):
+        PointsEntry.objects.bulk_create([PointsEntry(translator=self.anna, points=1, reason=PointsEntry.OPENING)
+                                         for _ in range(7)])
+        roll_up_points(batch_size=2)
+        self.assertEqual(Translator.objects.get(pk=self.anna.pk).points_earned, 7)
+        self.assertEqual(replay_balances(), [])
+
+    def test_roll_up_until(self):
+        entries = PointsEntry.objects.bulk_create([PointsEntry(pk=pk, client=self.client_account, points=pk,
+                                                               reason=PointsEntry.OPENING) for pk in (1, 2, 3)])
+        roll_up_points(until=entries[1].pk)
+        self.assertEqual(Client.objects.get(pk=self.client_account.pk).points_owed, 3)
+        self.assertEqual(self.balances()[2], 6)
+
+    def test_late_entry_with_a_lower_id_is_rolled_up(self):
+        # an entry whose transaction commits after a roll-up that saw entries with higher ids
+        PointsEntry.objects.create(pk=100, translator=self.anna, points=5, reason=PointsEntry.OPENING)
+        roll_up_points()
+        PointsEntry.objects.create(pk=50, translator=self.anna, points=3, reason=PointsEntry.OPENING)
+        self.assertEqual(self.balances()[0], 8)
+        roll_up_points()
+        self.assertEqual(Translator.objects.get(pk=self.anna.pk).points_earned, 8)
+        self.assertEqual(self.balances()[0], 8)
+        self.assertEqual(replay_balances(), [])
@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Client, User
+from ..pagination import KeysetPage, chunks
+from .utils import make_supervisor
+
+
+def walk(queryset, ordering, per_page, cursor=None, backwards=False):
+    """The pages of a queryset, followed from `cursor` through their next, or previous, cursors"""
+    pages = []
+    while True:
+        page = KeysetPage(queryset, ordering, cursor, per_page=per_page)
+        pages.append([row.pk for row in page])
+        cursor = page.previous_cursor if backwards else page.next_cursor
+        if cursor is None:
+            return pages
+
+
+class KeysetPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # few distinct balances, so that most pages break within a run of equal sort keys
+        Client.objects.bulk_create([Client(name='Client %02d' % (i % 4), code='c%d' % i, points_owed=i % 3 * 10)
+                                    for i in range(23)])
+
+    def expected(self, *ordering):
+        return list(Client.objects.order_by(*ordering).values_list('pk', flat=True))
+
+    def test_pages_cover_every_row_once(self):
+        for ordering in (('name', 'pk'), ('-points_owed', '-pk')):
+            with self.subTest(ordering=ordering):
+                pages = walk(Client.objects.all(), ordering, per_page=5)
+                self.assertEqual([len(page) for page in pages], [5, 5, 5, 5, 3])
+                self.assertEqual(sum(pages, []), self.expected(*ordering))
+
+    def test_previous_cursors_lead_back(self):
+        ordering = ('-points_owed', '-pk')
+        forwards = walk(Client.objects.all(), ordering, per_page=5)
+        last = KeysetPage(Client.objects.all(), ordering, per_page=5)
+        for _ in forwards[1:]:
+            last = KeysetPage(Client.objects.all(), ordering, last.next_cursor, per_page=5)
+        self.assertFalse(last.has_next)
+        backwards = walk(Client.objects.all(), ordering, per_page=5, cursor=last.previous_cursor, backwards=True)
+        self.assertEqual(backwards, forwards[-2::-1])
+        self.assertFalse(KeysetPage(Client.objects.all(), ordering, per_page=5).has_previous)
+
+    def test_a_deep_page_is_one_query(self):
+        page = KeysetPage(Client.objects.all(), ('name', 'pk'), per_page=5)
+        for _ in range(3):
+            page = KeysetPage(Client.objects.all(), ('name', 'pk'), page.next_cursor, per_page=5)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(page), 5)
+            self.assertTrue(page.has_next)
+
+    def test_bad_cursors_give_the_first_page(self):
+        first = [row.pk for row in KeysetPage(Client.objects.all(), ('name', 'pk'), per_page=5)]
+        for cursor in ('n', 'nnot-base64', 'n' + 'W10=', 'xW1swXQ=='):
+            with self.subTest(cursor=cursor):
+                page = KeysetPage(Client.objects.all(), ('name', 'pk'), cursor, per_page=5)
+                self.assertEqual([row.pk for row in page], first)
+
+    def test_datetime_sort_keys(self):
+        joined = datetime(2020, 1, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        now = datetime.now(timezone.utc)
+        User.objects.bulk_create([User(username='user%d' % i, date_joined=joined if i % 2 else now) for i in range(9)])
+        pages = walk(User.objects.all(), ('-date_joined', '-pk'), per_page=2)
+        self.assertEqual(sum(pages, []),
+                         list(User.objects.order_by('-date_joined', '-pk').values_list('pk', flat=True)))
+
+    def test_chunks(self):
+        rows = [[client.pk for client in chunk] for chunk in chunks(Client.objects.all(), size=10)]
+        self.assertEqual([len(chunk) for chunk in rows], [10, 10, 3])
+        self.assertEqual(sum(rows, []), self.expected('pk'))
+
+
+class ListViewPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.supervisor = make_supervisor()
+        Client.objects.bulk_create([Client(name='Client %d' % i, code='c%d' % i, points_owed=i % 5)
+                                    for i in range(60)])
+
+    def test_client_list_pages(self):
+        self.client.force_login(self.supervisor)
+        url = reverse('supervisors:client_list')
+        for sort, ordering in (('name', ('name', 'pk')), ('points', ('-points_owed', '-pk'))):
+            with self.subTest(sort=sort):
+                seen = []
+                query = 'sort=%s' % sort
+                while query:
+                    response = self.client.get(url + '?' + query)
+                    seen += [client.pk for client in response.context['page']]
+                    query = response.context['next_query']
+                self.assertEqual(seen, list(Client.objects.order_by(*ordering).values_list('pk', flat=True)))
+
+    def test_search(self):
+        self.client.force_login(self.supervisor)
+        response = self.client.get(reverse('supervisors:client_list') + '?q=client 1')
+        self.assertEqual({client.name for client in response.context['page']},
+                         {'Client 1'} | {'Client 1%d' % i for i in range(10)})
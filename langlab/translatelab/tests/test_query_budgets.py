@@ -0,0 +1,133 @@
+import tempfile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from langlab.middleware.query_stats import query_budget
+from ..management.commands._dataset import seed_dataset
+from ..management.commands.check_query_budgets import ROUTES, pick_samples, run_sample_export, stage_sample_import
+from ..models import ImportBatch, Job, Task, Translation
+
+
+def statements(queries):
+    """The queries captured, without the savepoints that the atomic blocks of the code become under TestCase"""
+    return [query['sql'] for query in queries.captured_queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT'))]
+
+
+class QueryBudgetTests(TestCase):
+    """
+    The routes of translatelab within their query budgets, QUERY_STATS_BUDGETS, on a seeded dataset, as with the
+    check_query_budgets command. The routes that write are held to their exact number of queries, which must not
+    depend on how much they write.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.job_files = tempfile.TemporaryDirectory()
+        cls.job_settings = override_settings(JOB_FILES_DIR=cls.job_files.name)
+        cls.job_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.job_settings.disable()
+        cls.job_files.cleanup()
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(prefix='budget')
+        stage_sample_import('budget', 30)
+        run_sample_export('budget')
+
+    def setUp(self):
+        self.samples = pick_samples('budget')
+        self.client.force_login(self.samples.supervisor)
+
+    def request(self, method, url, data=None):
+        response = getattr(self.client, method)(url, data)
+        if response.streaming:
+            b''.join(response.streaming_content)  # the queries of a streaming response run as it is read
+        self.assertLess(response.status_code, 400, url)
+        return response
+
+    def assertQueries(self, name, count, url, data=None, method='post'):
+        """Requests a route, which must run `count` queries, savepoints included, and be within its budget"""
+        with self.assertNumQueries(count), CaptureQueriesContext(connection) as queries:
+            response = self.request(method, url, data)
+        self.assertLessEqual(len(statements(queries)), query_budget(name))
+        return response
+
+    def test_every_route_is_within_its_budget(self):
+        # the routes that change the data go last, so that they do not change what the others see
+        for name, spec in sorted(ROUTES.items(), key=lambda item: (item[1].stateful, item[0])):
+            url = reverse(name, kwargs=spec.kwargs(self.samples))
+            if spec.query:
+                url += '?' + spec.query
+            for role in spec.roles:
+                with self.subTest(route=name, role=role):
+                    self.client.force_login(getattr(self.samples, role))
+                    with CaptureQueriesContext(connection) as queries:
+                        self.request('get', url)
+                    self.assertLessEqual(len(statements(queries)), query_budget(name))
+
+    def test_export(self):
+        url = reverse('supervisors:csv_export')
+        tasks = list(Task.objects.values_list('pk', flat=True))
+        for export_format, count in (('csv', 5), ('xliff', 4), ('tmx', 4)):
+            for size in (1, len(tasks)):
+                with self.subTest(format=export_format, tasks=size):
+                    self.assertQueries('supervisors:csv_export', count, url,
+                                       {'task_list': tasks[:size], 'format': export_format})
+
+    def test_background_export(self):
+        self.assertQueries('supervisors:csv_export', 3, reverse('supervisors:csv_export'),
+                           {'task_list': list(Task.objects.values_list('pk', flat=True)), 'format': 'csv',
+                            'background': '1'})
+        self.assertTrue(Job.objects.filter(kind='export', status=Job.QUEUED).exists())
+
+    def test_import(self):
+        url = reverse('supervisors:task_csv_import')
+        for size in (1, 50):
+            with self.subTest(rows=size):
+                lines = ['name,text,source_language,target_languages,priority']
+                lines += ['Imported %d,Imported text %d.,English,German;French,3' % (i, i) for i in range(size)]
+                upload = SimpleUploadedFile('tasks.csv', '\n'.join(lines).encode('utf-8'))
+                self.assertQueries('supervisors:task_csv_import', 12, url, {'csv_file': upload})
+                self.assertEqual(ImportBatch.objects.order_by('-pk').first().row_count, size)
+
+    def test_import_review(self):
+        batch = self.samples.import_batch
+        url = reverse('supervisors:task_csv_import_review', args=[batch.pk])
+        rows = list(batch.rows.values_list('pk', flat=True)[:5])
+        self.assertQueries('supervisors:task_csv_import_review', 4, url, {'action': 'exclude', 'rows': rows})
+        self.assertQueries('supervisors:task_csv_import_review', 12, url, {'action': 'import'})
+        self.assertEqual(ImportBatch.objects.get(pk=batch.pk).status, ImportBatch.IMPORTED)
+
+    def test_approve(self):
+        task = Task.objects.filter(status=100, approved=False).first()
+        self.assertQueries('supervisors:task_approve', 8, reverse('supervisors:task_approve', args=[task.pk]))
+        self.assertTrue(Task.objects.get(pk=task.pk).approved)
+
+    def test_repricing(self):
+        self.assertQueries('supervisors:task_repricing', 3, reverse('supervisors:task_repricing'))
+        self.assertTrue(Job.objects.filter(kind='rescore').exists())
+
+    def test_claim_and_save(self):
+        self.client.force_login(self.samples.translator)
+        translation = self.samples.open_translation
+        url = reverse('translators:translate_task', args=[translation.pk])
+        self.assertQueries('translators:translate_task', 16, url, {'text': 'Draft', 'comment': '', 'draft': '1'})
+        self.assertQueries('translators:translate_task', 12, url, {'text': 'Final', 'comment': '', 'finish': '1'})
+        translation = Translation.objects.get(pk=translation.pk)
+        self.assertEqual((translation.translator_id, translation.text), (self.samples.translator.pk, 'Final'))
+
+    def test_claim_validation(self):
+        self.client.force_login(self.samples.translator)
+        translation = self.samples.open_validation
+        url = reverse('translators:validate_task', args=[translation.pk])
+        self.assertQueries('translators:validate_task', 18, url,
+                           {'validated_text': 'Checked', 'comment': '', 'finish': '1'})
+        self.assertIsNotNone(Translation.objects.get(pk=translation.pk).validation_time_finished)
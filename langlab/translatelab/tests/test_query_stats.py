@@ -0,0 +1,48 @@
+import json
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .utils import make_languages, make_supervisor, make_task
+
+
+@override_settings(QUERY_STATS_SAMPLE_RATE=1)
+class QueryStatsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        english, german = make_languages('English', 'German')
+        cls.supervisor = make_supervisor()
+        cls.tasks = [make_task(cls.supervisor, english, [german], name='Task %d' % i) for i in range(3)]
+
+    def setUp(self):
+        self.client.force_login(self.supervisor)
+
+    def test_response_headers_and_line(self):
+        with self.assertLogs('langlab.query_stats', 'INFO') as logs:
+            response = self.client.get(reverse('supervisors:client_list'))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(response['X-Query-Count'], str(line['queries']))
+        self.assertEqual((line['view'], line['status'], line['streamed']), ('supervisors:client_list', 200, False))
+
+    def test_streaming_response_is_logged_once_sent(self):
+        with self.assertLogs('langlab.query_stats', 'INFO') as logs:
+            response = self.client.post(reverse('supervisors:csv_export'),
+                                        {'task_list': [task.pk for task in self.tasks], 'format': 'csv'})
+            self.assertNotIn('X-Query-Count', response)
+            self.assertEqual(logs.records, [])
+            b''.join(response.streaming_content)
+            response.close()
+        self.assertEqual(len(logs.records), 1)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertTrue(line['streamed'])
+        # the session and the user, then the languages, the tasks and their translations as the content is read
+        self.assertEqual(line['queries'], 5)
+
+    def test_streaming_response_closed_early_is_logged(self):
+        with self.assertLogs('langlab.query_stats', 'INFO') as logs:
+            response = self.client.post(reverse('supervisors:csv_export'),
+                                        {'task_list': [task.pk for task in self.tasks], 'format': 'csv'})
+            next(iter(response.streaming_content))
+            response.close()
+            response.close()
+        self.assertEqual(len(logs.records), 1)
+        self.assertTrue(json.loads(logs.records[0].getMessage())['streamed'])
@@ -0,0 +1,123 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Translation, WorkItem, recount_task_progress
+from .utils import make_languages, make_supervisor, make_task, make_translator
+
+
+class StageWriteTests(TestCase):
+    """Claims, saves and cancels of a translation are conditional UPDATEs, see Translation.claim_translation()"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.english, cls.german = make_languages('English', 'German')
+        cls.supervisor = make_supervisor()
+        cls.anna = make_translator('anna', cls.english, cls.german)
+        cls.bert = make_translator('bert', cls.english, cls.german)
+        cls.task = make_task(cls.supervisor, cls.english, [cls.german])
+        cls.translation = cls.task.translations.get()
+
+    def load(self):
+        return Translation.objects.get(pk=self.translation.pk)
+
+    def assertProgress(self, stages_done):
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.stages_total, self.task.stages_done), (4, stages_done))
+        self.assertEqual(recount_task_progress([self.task.pk], dry_run=True), [])
+
+    def test_one_of_two_claims_wins(self):
+        first, second = self.load(), self.load()
+        self.assertTrue(first.claim_translation(self.anna))
+        self.assertFalse(second.claim_translation(self.bert))
+        self.assertEqual(self.load().translator, self.anna)
+        item = WorkItem.objects.get(translation=self.translation, kind=WorkItem.TRANSLATE)
+        self.assertEqual((item.state, item.assignee_id), (WorkItem.DRAFT, self.anna.pk))
+        self.assertProgress(1)
+
+    def test_validation_is_not_claimed_by_its_translator(self):
+        translation = self.load()
+        translation.claim_translation(self.anna)
+        translation.text = 'Translated'
+        self.assertTrue(translation.save_translation(('text', ), finish=True))
+        self.assertFalse(self.load().claim_validation(self.anna))
+        self.assertTrue(self.load().claim_validation(self.bert))
+        self.assertFalse(self.load().claim_validation(self.anna))
+        self.assertProgress(3)
+
+    def test_finishing_twice_counts_once(self):
+        translation = self.load()
+        translation.claim_translation(self.anna)
+        stale = self.load()
+        self.assertTrue(translation.save_translation((), finish=True))
+        self.assertFalse(stale.save_translation((), finish=True))
+        self.assertProgress(2)
+
+    def test_save_after_cancel_is_refused(self):
+        translation = self.load()
+        translation.claim_translation(self.anna)
+        self.assertTrue(self.load().cancel_translation())
+        translation.text = 'Lost'
+        self.assertFalse(translation.save_translation(('text', )))
+        self.assertEqual(self.load().text, '')
+        self.assertIsNone(self.load().translator)
+        self.assertProgress(0)
+
+    def test_stale_cancel_leaves_a_finished_translation(self):
+        translation = self.load()
+        translation.claim_translation(self.anna)
+        stale = self.load()
+        translation.save_translation((), finish=True)
+        self.assertFalse(stale.cancel_translation())
+        self.assertEqual(self.load().translator, self.anna)
+        self.assertProgress(2)
+
+    def test_stale_cancel_leaves_the_next_claim(self):
+        translation = self.load()
+        translation.claim_translation(self.anna)
+        stale = self.load()
+        self.load().cancel_translation()
+        self.load().claim_translation(self.bert)
+        self.assertFalse(stale.cancel_translation())
+        self.assertEqual(self.load().translator, self.bert)
+        self.assertProgress(1)
+
+
+class TranslateViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        english, german = make_languages('English', 'German')
+        cls.anna = make_translator('anna', english, german)
+        cls.bert = make_translator('bert', english, german)
+        cls.translation = make_task(make_supervisor(), english, [german]).translations.get()
+        cls.url = reverse('translators:translate_task', args=[cls.translation.pk])
+
+    def setUp(self):
+        self.client.force_login(self.anna.user)
+
+    def test_claimed_translation_is_refused_to_others(self):
+        self.client.get(self.url)
+        self.client.force_login(self.bert.user)
+        response = self.client.post(self.url, {'text': 'Mine', 'comment': '', 'draft': '1'})
+        self.assertRedirects(response, reverse('translators:task_list'))
+        translation = Translation.objects.get(pk=self.translation.pk)
+        self.assertEqual((translation.translator, translation.text), (self.anna, ''))
+
+    def test_post_writes_the_form_fields(self):
+        self.client.post(self.url, {'text': 'Draft', 'comment': 'Note', 'draft': '1'})
+        self.client.post(self.url, {'text': 'Final', 'comment': 'Note', 'finish': '1'})
+        translation = Translation.objects.get(pk=self.translation.pk)
+        self.assertEqual((translation.text, translation.comment), ('Final', 'Note'))
+        self.assertIsNotNone(translation.translation_time_finished)
+
+    def test_post_on_a_finished_translation_is_refused(self):
+        self.client.post(self.url, {'text': 'Final', 'comment': '', 'finish': '1'})
+        response = self.client.post(self.url, {'text': 'Changed', 'comment': '', 'draft': '1'})
+        self.assertRedirects(response, reverse('translators:task_list'))
+        self.assertEqual(Translation.objects.get(pk=self.translation.pk).text, 'Final')
+
+    def test_cancel_releases_the_translation(self):
+        self.client.get(self.url)
+        self.client.get(reverse('translators:translation_cancel', args=[self.translation.pk]))
+        translation = Translation.objects.get(pk=self.translation.pk)
+        self.assertIsNone(translation.translator)
+        item = WorkItem.objects.get(translation=translation, kind=WorkItem.TRANSLATE)
+        self.assertEqual(item.state, WorkItem.AVAILABLE)
@@ -0,0 +1,72 @@
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from io import StringIO
+
+from ..jobs import pending_jobs, work
+from ..models import Job, Translation, User, WorkItem, get_sentinel_user, recount_task_progress
+from ..users import delete_user
+from .utils import make_languages, make_supervisor, make_task, make_translator
+
+
+class DeleteUserTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        english, german, french = make_languages('English', 'German', 'French')
+        cls.supervisor = make_supervisor()
+        cls.anna = make_translator('anna', english, german, french)
+        cls.bert = make_translator('bert', english, german, french)
+        cls.tasks = [make_task(cls.supervisor, english, [german, french], name='Task %d' % i) for i in range(3)]
+        for task in cls.tasks:
+            translated, validated = task.translations.order_by('pk')
+            translated.claim_translation(cls.anna)
+            validated.claim_translation(cls.bert)
+            validated.save_translation((), finish=True)
+            validated.claim_validation(cls.anna)
+
+    def assertHandedOver(self):
+        sentinel = get_sentinel_user()
+        self.assertFalse(User.objects.filter(pk=self.anna.pk).exists())
+        self.assertEqual(Translation.objects.filter(translator_id=sentinel.pk).count(), 3)
+        self.assertEqual(Translation.objects.filter(validator_id=sentinel.pk).count(), 3)
+        self.assertEqual(WorkItem.objects.filter(assignee_id=sentinel.pk).count(), 6)
+        self.assertEqual(recount_task_progress([task.pk for task in self.tasks], dry_run=True), [])
+
+    def test_work_is_handed_to_the_sentinel(self):
+        delete_user(User.objects.get(pk=self.anna.pk))
+        self.assertHandedOver()
+        self.assertEqual(Translation.objects.filter(translator=self.bert).count(), 3)
+
+    def test_check_rolls_the_deletion_back(self):
+        def check():
+            raise RuntimeError('lost the claim')
+        with self.assertRaises(RuntimeError):
+            delete_user(User.objects.get(pk=self.anna.pk), check=check)
+        self.assertTrue(User.objects.filter(pk=self.anna.pk).exists())
+        self.assertEqual(Translation.objects.filter(translator=self.anna).count(), 3)
+
+    def test_delete_view_deletes_within_the_request(self):
+        self.client.force_login(self.supervisor)
+        response = self.client.post(reverse('supervisors:user_delete', args=[self.anna.pk]))
+        self.assertRedirects(response, reverse('supervisors:user_list'))
+        self.assertHandedOver()
+
+    @override_settings(USER_DELETE_INLINE_LIMIT=1)
+    def test_delete_view_leaves_large_deletions_to_a_job(self):
+        self.client.force_login(self.supervisor)
+        self.client.post(reverse('supervisors:user_delete', args=[self.anna.pk]))
+        self.assertTrue(User.objects.get(pk=self.anna.pk).is_deleted)
+        self.assertTrue(pending_jobs('delete_user', user=self.anna.pk).exists())
+        work(burst=True)
+        self.assertHandedOver()
+
+    def test_delete_users_queues_a_job_per_user_once(self):
+        User.objects.filter(pk=self.anna.pk).update(is_deleted=True, is_active=False)
+        call_command('delete_users', stdout=StringIO())
+        call_command('delete_users', stdout=StringIO())
+        self.assertEqual(Job.objects.filter(kind='delete_user').count(), 1)
+        self.assertTrue(User.objects.filter(pk=self.anna.pk).exists())  # deleted by the workers only
+        work(burst=True)
+        self.assertHandedOver()
+        call_command('delete_users', stdout=StringIO())
+        self.assertEqual(Job.objects.filter(kind='delete_user').count(), 1)
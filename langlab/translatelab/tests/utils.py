@@ -0,0 +1,29 @@
+from ..models import Language, Task, Translation, Translator, User
+
+TEXT = 'The first sentence of the source text. And the second one, which is a little longer than the first.'
+
+
+def make_languages(*names):
+    """Languages by name, with the flags of LANGUAGES in _dataset.py"""
+    codes = {'English': 'gb', 'Danish': 'dk', 'German': 'de', 'French': 'fr', 'Spanish': 'es'}
+    return [Language.objects.create(name=name, code=codes.get(name, '')) for name in names]
+
+
+def make_supervisor(username='supervisor'):
+    return User.objects.create_user(username, password='password', is_supervisor=True)
+
+
+def make_translator(username, *languages):
+    user = User.objects.create_user(username, password='password', is_translator=True)
+    translator = Translator.objects.create(user=user)
+    translator.languages.add(*languages)
+    return translator
+
+
+def make_task(owner, source, targets, name='Task', text=TEXT, **fields):
+    """A task from `source` with an open translation into every language of `targets`"""
+    task = Task.objects.create(owner=owner, name=name, source_content=text, source_language=source, **fields)
+    for target in targets:
+        Translation.objects.create(task=task, language=target)
+    task.refresh_from_db()
+    return task
@@ -20,6 +20,7 @@ urlpatterns = [
     path('supervisors/', include(([
         path('', supervisors.TaskListView.as_view(), name='task_change_list'),
         path('languages/', supervisors.LanguageEditView.as_view(), name='languages_edit'),
+        path('languages/staffing/', supervisors.language_staffing, name='language_staffing'),
         path('languages/<int:pk>/delete/', supervisors.LanguageDeleteView.as_view(), name='language_delete'),
         path('languages/<int:pk>/update/', supervisors.LanguageUpdateView.as_view(), name='language_update'),
         path('users/', supervisors.UserListView.as_view(), name='user_list'),
@@ -33,12 +34,16 @@ urlpatterns = [
         path('task/add/', supervisors.TaskCreateView.as_view(), name='task_add'),
         path('task/export/', supervisors.task_csv_export_multi, name='csv_export'),
         path('task/import/', supervisors.task_csv_import, name='task_csv_import'),
-        path('task/import/register/', supervisors.task_csv_import_register, name='task_csv_import_register'),
+        path('task/import/<int:pk>/', supervisors.ImportReviewView.as_view(), name='task_csv_import_review'),
+        path('jobs/<int:pk>/', supervisors.JobDetailsView.as_view(), name='job_details'),
+        path('jobs/<int:pk>/status/', supervisors.job_status, name='job_status'),
+        path('jobs/<int:pk>/download/', supervisors.job_download, name='job_download'),
+        path('task/repricing/', supervisors.task_repricing, name='task_repricing'),
         path('task/<int:pk>/', supervisors.TaskDetailsView.as_view(), name='task_details'),
         path('task/<int:pk>/edit/', supervisors.TaskUpdateView.as_view(), name='task_change'),
         path('task/<int:pk>/delete/', supervisors.TaskDeleteView.as_view(), name='task_delete'),
         path('task/<int:pk>/approve/', supervisors.task_approve, name='task_approve'),
-        path('task/<int:pk>/export/', supervisors.task_csv_export_single, name='csv_export_single'),
+        path('task/<int:task_pk>/export/', supervisors.task_csv_export_single, name='csv_export_single'),
         path('task/<int:pk>/translation/<int:language_pk>/add/', supervisors.translation_add, name='translation_add'),
         path('task/<int:task_pk>/translation/<int:translation_pk>/', supervisors.TranslationDetailsView.as_view(), name='translation_details'),
         path('task/<int:task_pk>/translation/<int:translation_pk>/edit/', supervisors.translation_change, name='translation_change'),
@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Translation, User, get_sentinel_user, recount_task_progress, sync_work_items
+
+BATCH_SIZE = 500  # ids per IN clause
+
+
+def _batches(ids):
+    for i in range(0, len(ids), BATCH_SIZE):
+        yield ids[i:i + BATCH_SIZE]
+
+
+def count_user_work(user):
+    """Number of translations and validations of a user"""
+    return Translation.objects.filter(Q(translator_id=user.pk) | Q(validator_id=user.pk)).count()
+
+
+def delete_user(user, check=None):
+    """
+    Deletes a user, in one transaction. Their translations and validations are first handed over to the sentinel
+    translator with two UPDATEs. Then the progress of every affected task is recounted once, and the work queue items
+    of the affected translations are resynced, in batches. `check` is called after every batch and before the
+    transaction commits, and may raise to roll it back.
+    """
+    sentinel = get_sentinel_user()
+    with transaction.atomic():
+        work = Translation.objects.filter(Q(translator_id=user.pk) | Q(validator_id=user.pk))
+        translation_ids = list(work.order_by('pk').values_list('pk', flat=True))
+        task_ids = sorted(set(work.exclude(task=None).values_list('task_id', flat=True)))
+        Translation.objects.filter(translator_id=user.pk).update(translator_id=sentinel.pk)
+        Translation.objects.filter(validator_id=user.pk).update(validator_id=sentinel.pk)
+        for batch in _batches(task_ids):
+            recount_task_progress(batch)
+            if check:
+                check()
+        for batch in _batches(translation_ids):
+            sync_work_items(batch)
+            if check:
+                check()
+        user.delete()
+        if check:
+            check()
+
+
+def pending_deletions():
+    """Users marked for deletion in the background. The sentinel user is marked as deleted, but stays"""
+    return User.objects.filter(is_deleted=True).exclude(username=get_sentinel_user().username)
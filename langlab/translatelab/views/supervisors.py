@@ -1,3 +1,7 @@
+import csv
+import os
+from itertools import islice
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
@@ -5,18 +9,28 @@ from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
 from django.utils.decorators import method_decorator
+from django.utils.functional import cached_property
 from django.views.generic import (CreateView, DeleteView, DetailView, ListView, UpdateView)
-from django.http import HttpResponseRedirect
-from django.db.models.functions import Lower
+from django.http import FileResponse, Http404, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
+from django.db.models import Count, Max, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.crypto import get_random_string
-from io import TextIOWrapper
 
 from ..decorators import supervisor_required
 from ..forms import TranslationForm, SupervisorSignUpForm, TaskCreateForm, TaskUpdateForm, LanguageEditForm, \
-    TaskSelectForm, ClientEditForm
-from ..models import Translation, Task, User, Language, Client, get_sentinel_user
-from ..point_score import PointScore
+    TaskSelectForm, ClientEditForm, RepricingForm
+from ..models import Translation, Task, User, Language, Client, WorkItem, ImportBatch, ImportRow, ImportRowLanguage, \
+    Job, get_sentinel_user, language_code, qualified_translator_counts, subquery_count, translation_batch
+from ..point_score import score_cache
 from ..csv_data import csv_export, csv_import
+from ..imports import promote_import, stage_import
+from ..jobs import enqueue, export_path, job_file, job_label
+from ..ledger import approve_task, points_balance
+from ..pagination import KeysetListMixin
+from ..repricing import reprice
+from ..rescoring import stale_tasks
+from ..users import count_user_work, delete_user
+from ..xml_data import tmx_export, xliff_export
 
 
 class SupervisorSignUpView(CreateView):
@@ -35,18 +49,48 @@ class SupervisorSignUpView(CreateView):
 
 
 @method_decorator([login_required, supervisor_required], name='dispatch')
-class UserListView(ListView):
+class UserListView(KeysetListMixin, ListView):
     model = User
     context_object_name = 'users'
     template_name = 'translatelab/supervisors/user_list.html'
 
-    def get_queryset(self):
+    tabs = {
+        'all': Q(pk__isnull=False),
+        'translators': Q(is_translator=True),
+        'supervisors': Q(is_supervisor=True),
+    }
+    default_tab = 'all'
+    sort_orders = {
+        'name': ('username', 'pk'),
+        'joined': ('-date_joined', '-pk'),
+    }
+    default_sort = 'name'
+    search_fields = ('username__icontains', 'email__icontains')
+
+    def get(self, request, *args, **kwargs):
         dummy = get_sentinel_user()  # this is a dirty hack, just to make sure that the "deleted user" is present, in case a user tries to sign up with that name
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
         queryset = User.objects.all()\
-            .exclude(is_deleted=True)\
-            .select_related('translator').order_by(Lower('username'))
+            .exclude(is_deleted=True)
         return queryset
 
+    def annotate_queryset(self, queryset):
+        # the translator of a user has the same pk
+        work = WorkItem.objects.filter(assignee=OuterRef('pk'))
+        return queryset\
+            .only('username', 'is_active', 'is_translator', 'date_joined', 'last_login')\
+            .annotate(points_balance=points_balance('translator', prefix='translator__'),
+                      translation_count=subquery_count(Translation.objects.filter(translator=OuterRef('pk')),
+                                                       'translator'),
+                      validation_count=subquery_count(Translation.objects.filter(validator=OuterRef('pk')),
+                                                      'validator'),
+                      draft_count=subquery_count(work.filter(state=WorkItem.DRAFT), 'assignee'),
+                      last_activity=Subquery(work.order_by().values('assignee')
+                                             .annotate(last=Max(Coalesce('time_finished', 'time_started')))
+                                             .values('last')))
+
 
 @method_decorator([login_required, supervisor_required], name='dispatch')
 class UserDetailsView(DetailView):
@@ -56,26 +100,23 @@ class UserDetailsView(DetailView):
 
 @method_decorator([login_required, supervisor_required], name='dispatch')
 class UserDeleteView(DeleteView):
-    model = Language
+    model = User
     template_name = 'translatelab/supervisors/user_delete_confirm.html'
     context_object_name = 'task'
     success_url = reverse_lazy('supervisors:user_list')
 
     def delete(self, request, *args, **kwargs):
-        user = self.get_object()
-
-        sentinel = get_sentinel_user()
-        transen = sentinel.translator
-        ex_trans = user.translator.translations
-        for t in ex_trans.all():
-            t.translator = transen
-            t.save()
-        ex_validations = user.translator.validated_translations
-        for t in ex_validations.all():
-            t.validator = transen
-            t.save()
-        messages.success(request, 'The user %s was deleted with success!' % user.username)
-        return super().delete(request, *args, **kwargs)
+        user = self.object = self.get_object()
+        if count_user_work(user) > settings.USER_DELETE_INLINE_LIMIT:
+            # too much work to hand over within the request, leave it to a background job
+            User.objects.filter(pk=user.pk).update(is_active=False, is_deleted=True)
+            messages.success(request, 'The user %s was deactivated, and will be deleted in the background.'
+                             % user.username)
+            return redirect(enqueue('delete_user', owner=request.user, user=user.pk))
+        else:
+            delete_user(user)
+            messages.success(request, 'The user %s was deleted with success!' % user.username)
+        return HttpResponseRedirect(self.get_success_url())
 
     def get_queryset(self):
         return User.objects.all()
@@ -97,30 +138,44 @@ def user_toggle_active(request, pk):
 
 
 @method_decorator([login_required, supervisor_required], name='dispatch')
-class TaskListView(ListView):
+class TaskListView(KeysetListMixin, ListView):
     model = Task
-    ordering = ('name', )
     context_object_name = 'tasks'
     template_name = 'translatelab/supervisors/task_list.html'
 
+    tabs = {
+        'active': Q(status__lt=100, approved=False),
+        'awaiting': Q(status=100, approved=False),
+        'completed': Q(approved=True),
+    }
+    default_tab = 'active'
+    sort_orders = {
+        'newest': ('-pk', ),
+        'oldest': ('pk', ),
+        'name': ('name', 'pk'),
+        'points': ('-point_score', '-pk'),
+    }
+    default_sort = 'name'
+    default_sorts = {'active': 'newest'}
+    search_fields = ('name__icontains', 'client__name__icontains')
+    board_fields = ('name', 'time_created', 'point_score', 'priority', 'status', 'approved',
+                    'client__name', 'source_language__name', 'source_language__code', 'owner__username')
+
     def get_queryset(self):
-        queryset = Task.objects.all().select_related('source_language', 'owner').prefetch_related('translations')
+        queryset = Task.objects.all().select_related('client', 'source_language', 'owner').only(*self.board_fields)
         return queryset
 
-    def tasks_active(self):
-        qs = super().get_queryset()
-        active = qs.filter(status__lt=100, approved=False).order_by('-time_created')
-        return active
-
-    def tasks_awaiting(self):
-        qs = super().get_queryset()
-        awaiting = qs.filter(status=100, approved=False)
-        return awaiting
-
-    def tasks_completed(self):
-        qs = super().get_queryset()
-        completed = qs.filter(approved=True)
-        return completed
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # one query for the target languages of all the rows on the page
+        tasks = {task.pk: task for task in self.page}
+        for task in tasks.values():
+            task.target_languages = []
+        translations = Translation.objects.filter(task_id__in=list(tasks)).select_related('language')\
+            .only('task_id', 'language__name', 'language__code').order_by('pk')
+        for translation in translations:
+            tasks[translation.task_id].target_languages.append(translation.language)
+        return context
 
 
 @method_decorator([login_required, supervisor_required], name='dispatch')
@@ -132,14 +187,19 @@ class TaskCreateView(CreateView):
     def form_valid(self, form):
         task = form.save(commit=False)
         task.owner = self.request.user
-        ps = PointScore(text=form.cleaned_data['source_content'], priority=form.cleaned_data['priority'])
+        ps = score_cache.point_score(text=form.cleaned_data['source_content'], priority=form.cleaned_data['priority'],
+                                     language=language_code(form.cleaned_data['source_language']))
         task.word_count = ps.word_count
+        task.sentence_count = ps.sentence_count
+        task.long_words_count = ps.long_words_count
         task.point_score = ps.score()
         task.point_score_version = ps.version
-        task.save()
-        for lang in form.cleaned_data['languages']:
-            if not lang == task.source_language:  # filter out the source language
-                t = task.translations.create(language=lang)
+        with translation_batch() as batch:
+            task.save()
+            Translation.objects.bulk_create([Translation(task=task, language=lang)
+                                             for lang in form.cleaned_data['languages']
+                                             if not lang == task.source_language])  # filter out the source language
+            batch.add_tasks([task.pk])
         form.save_m2m()  # save the many-to-many data for the form
         messages.success(self.request, 'The task was created')
         return redirect('supervisors:task_details', task.pk)
@@ -154,18 +214,21 @@ class TaskUpdateView(UpdateView):
 
     def get_context_data(self, **kwargs):
         kwargs['other_target_languages'] = Language.objects\
-            .exclude(translations__task__id=self.get_object().id)\
-            .exclude(tasks_source__id=self.get_object().id)
+            .exclude(translations__task__id=self.object.id)\
+            .exclude(tasks_source__id=self.object.id)
         # this gets target languages not selected for this task
         return super().get_context_data(**kwargs)
 
     def get_queryset(self):
-        return Task.objects.all()
+        return Task.objects.prefetch_related(Prefetch('translations', Translation.objects.select_related('language')))
 
     def form_valid(self, form):
         task = form.save(commit=False)
-        ps = PointScore(text=form.cleaned_data['source_content'], priority=form.cleaned_data['priority'])
+        ps = score_cache.point_score(text=form.cleaned_data['source_content'], priority=form.cleaned_data['priority'],
+                                     language=language_code(form.cleaned_data['source_language']))
         task.word_count = ps.word_count
+        task.sentence_count = ps.sentence_count
+        task.long_words_count = ps.long_words_count
         task.point_score = ps.score()
         task.point_score_version = ps.version
         task.save()
@@ -198,27 +261,40 @@ class TaskDetailsView(DetailView):
     model = Task
     template_name = 'translatelab/supervisors/task_details.html'
 
+    def get_queryset(self):
+        translations = Translation.objects.select_related('language', 'translator__user', 'validator__user')
+        return Task.objects.select_related('owner', 'client', 'source_language')\
+            .prefetch_related(Prefetch('translations', translations))
+
 
 @login_required
 @supervisor_required
 def task_approve(request, pk):
     task = get_object_or_404(Task, pk=pk)
     if task.get_status() == 100:
-        points = task.point_score
-        for translation in task.translations.all():
-            translator = translation.translator
-            validator = translation.validator
-            translator.points_earned += points
-            validator.points_earned += points
-            translator.save()
-            validator.save()
-        if task.client:
-            task.client.points_owed += points
-        task.approved = True
-        task.save()
+        approve_task(task)
     return redirect('supervisors:task_details', task.pk)
 
 
+@login_required
+@supervisor_required
+def task_repricing(request):
+    # Simulates the point scores of all tasks under other point score parameters, from the stored text statistics
+    if request.method == 'POST':
+        # re-scoring the tasks behind the point score algorithm writes them all, so it is left to a background job
+        return redirect(enqueue('rescore', owner=request.user))
+    form = RepricingForm(request.GET or None)
+    repricing = None
+    if form.is_valid():
+        repricing = reprice(normalizing_factor=form.cleaned_data['normalizing_factor'],
+                            priority_factor=form.priority_factor())
+    return render(request, 'translatelab/supervisors/task_repricing.html', {
+        'form': form,
+        'repricing': repricing,
+        'stale_count': stale_tasks().count(),
+    })
+
+
 @login_required
 @supervisor_required
 def translation_add(request, pk, language_pk):
@@ -270,14 +346,11 @@ def translation_change(request, task_pk, translation_pk):
 def translation_cancel(request, task_pk, translation_pk):
     translation = get_object_or_404(Translation, pk=translation_pk)
 
-    if translation.translator and not translation.translation_time_finished:
-        translation.translator = None
-        translation.translation_time_started = None
-        translation.save()
-    elif translation.validator and not translation.validation_time_finished:
-        translation.validator = None
-        translation.validation_time_started = None
-        translation.save()
+    # conditional UPDATEs, which leave alone a claim or a finish made since the translation was read
+    if translation.translator_id and not translation.translation_time_finished:
+        translation.cancel_translation()
+    elif translation.validator_id and not translation.validation_time_finished:
+        translation.cancel_validation()
 
     return redirect('supervisors:task_details', task_pk)
 
@@ -348,15 +421,48 @@ class LanguageDeleteView(DeleteView):
     success_url = reverse_lazy('supervisors:languages_edit')
 
 
+@login_required
+@supervisor_required
+def language_staffing(request):
+    # Open work and qualified translators for every language pair with open work
+    languages = {language.pk: language for language in Language.objects.all()}
+    open_work = WorkItem.objects.filter(state=WorkItem.AVAILABLE).order_by()\
+        .values_list('source_language_id', 'language_id')\
+        .annotate(translations=Count('pk', filter=Q(kind=WorkItem.TRANSLATE)),
+                  validations=Count('pk', filter=Q(kind=WorkItem.VALIDATE)))
+    pairs = [(languages[source_id], languages[target_id], translations, validations)
+             for source_id, target_id, translations, validations in open_work
+             if source_id in languages and target_id in languages]
+    translators = qualified_translator_counts([(source, target) for source, target, _, _ in pairs])
+    rows = [{'source_language': source, 'language': target, 'translations': translations,
+             'validations': validations, 'translators': translators[source, target]}
+            for source, target, translations, validations in pairs]
+    rows.sort(key=lambda row: (row['translators'] or 0) - row['translations'] - row['validations'])
+    return render(request, 'translatelab/supervisors/language_staffing.html', {'rows': rows})
+
+
+# the formats of the task export page, by the value of its format field
+EXPORT_FORMATS = {
+    'csv': csv_export,
+    'xliff': xliff_export,
+    'tmx': tmx_export,
+}
+
+
 @login_required
 @supervisor_required
 def task_csv_export_multi(request):
-    tasks = Task.objects.all()
+    tasks = Task.objects.select_related('source_language')\
+        .prefetch_related(Prefetch('translations', Translation.objects.select_related('language')))
     if request.method == 'POST':
         list_of_ids = request.POST.getlist('task_list')
-        task_list = Task.objects.filter(id__in=list_of_ids)
-        response = csv_export(task_list)
-        return response
+        if not all(pk.isdigit() for pk in list_of_ids):
+            return HttpResponseBadRequest('Task ids must be whole numbers')
+        list_of_ids = [int(pk) for pk in list_of_ids]
+        export_format = request.POST.get('format') if request.POST.get('format') in EXPORT_FORMATS else 'csv'
+        if request.POST.get('background'):
+            return redirect(enqueue('export', owner=request.user, format=export_format, tasks=list_of_ids))
+        return EXPORT_FORMATS[export_format](Task.objects.filter(id__in=list_of_ids))
 
     return render(request, 'translatelab/supervisors/task_csv_export.html', {
         'tasks': tasks
@@ -366,9 +472,8 @@ def task_csv_export_multi(request):
 @login_required
 @supervisor_required
 def task_csv_export_single(request, task_pk):
-    task = get_object_or_404(Task, pk=task_pk)
-    response = csv_export([task])
-    return response
+    get_object_or_404(Task.objects.only('pk'), pk=task_pk)
+    return csv_export(Task.objects.filter(pk=task_pk))
 
 
 @login_required
@@ -379,70 +484,154 @@ def task_csv_import(request):
         if not csv_file.name.endswith('.csv'):
             messages.error(request, 'File is not CSV type')
             return HttpResponseRedirect(reverse("supervisors:task_csv_import"))
-        # if file is too large, return
-        if csv_file.multiple_chunks():
-            messages.error(request, "Uploaded file is too big (%.2f MB)." % (csv_file.size / (1000 * 1000),))
+        # the rows are staged in the database for review, within the request for small files, else by a background job
+        rows = csv_import(csv_file)
+        try:
+            head = list(islice(rows, settings.IMPORT_INLINE_LIMIT + 1))
+            rows.close()
+            if len(head) <= settings.IMPORT_INLINE_LIMIT:
+                batch = stage_import(head, request.user, file_name=csv_file.name, processes=1)
+                return redirect('supervisors:task_csv_import_review', pk=batch.pk)
+        except (UnicodeDecodeError, csv.Error) as e:
+            messages.error(request, 'Could not read the file: %s' % e)
             return HttpResponseRedirect(reverse("supervisors:task_csv_import"))
-        # perform csv import routine
-        csv_input = csv_import(csv_file)
-        request.session['csv_input'] = csv_input
-        return redirect('supervisors:task_csv_import_register')
+        path = job_file('upload-%s.csv' % get_random_string(32))
+        with open(path, 'wb') as upload:
+            for chunk in csv_file.chunks():
+                upload.write(chunk)
+        return redirect(enqueue('stage_import', owner=request.user, path=path, file_name=csv_file.name))
     else:
-        return render(request, 'translatelab/supervisors/task_csv_import.html')
+        batches = ImportBatch.objects.filter(owner=request.user, status=ImportBatch.STAGED).order_by('-pk')
+        return render(request, 'translatelab/supervisors/task_csv_import.html', {'batches': batches})
+
+
+@method_decorator([login_required, supervisor_required], name='dispatch')
+class ImportReviewView(KeysetListMixin, ListView):
+    model = ImportRow
+    context_object_name = 'rows'
+    template_name = 'translatelab/supervisors/task_csv_import_review.html'
+
+    tabs = {
+        'included': Q(accepted=True, errors=''),
+        'excluded': Q(accepted=False, errors=''),
+        'invalid': ~Q(errors=''),
+    }
+    default_tab = 'included'
+    sort_orders = {
+        'line': ('line', 'pk'),
+        'name': ('name', 'pk'),
+        'points': ('-point_score', '-pk'),
+    }
+    default_sort = 'line'
+    search_fields = ('name__icontains', )
+
+    @cached_property
+    def batch(self):
+        return get_object_or_404(ImportBatch, pk=self.kwargs['pk'], owner=self.request.user,
+                                 status=ImportBatch.STAGED)
+
+    def get_queryset(self):
+        return ImportRow.objects.filter(batch=self.batch)
+
+    def annotate_queryset(self, queryset):
+        return queryset.select_related('source_language')\
+            .annotate(target_count=subquery_count(ImportRowLanguage.objects.filter(row=OuterRef('pk')), 'row'))
+
+    def get_context_data(self, **kwargs):
+        kwargs['batch'] = self.batch
+        return super().get_context_data(**kwargs)
+
+    def post(self, request, *args, **kwargs):
+        action = request.POST.get('action')
+        if action in ('exclude', 'include'):
+            # only rows without errors can be imported, so only those can be taken in or left out
+            self.get_queryset().filter(pk__in=request.POST.getlist('rows'), errors='')\
+                .update(accepted=action == 'include')
+            return HttpResponseRedirect(request.get_full_path())
+        if action == 'discard':
+            self.batch.delete()
+            messages.success(request, 'The import of %s was discarded' % self.batch.file_name)
+            return redirect('supervisors:task_csv_import')
+        if action == 'import':
+            if self.batch.row_count > settings.IMPORT_INLINE_LIMIT:
+                return redirect(enqueue('promote_import', owner=request.user, batch=self.batch.pk))
+            created = promote_import(self.batch)
+            messages.success(request, '%d tasks imported' % (created or 0))
+            return redirect('supervisors:task_change_list')
+        return HttpResponseRedirect(request.get_full_path())
+
+
+@method_decorator([login_required, supervisor_required], name='dispatch')
+class JobDetailsView(DetailView):
+    model = Job
+    context_object_name = 'job'
+    template_name = 'translatelab/supervisors/job_details.html'
+
+    def get_queryset(self):
+        return Job.objects.filter(owner=self.request.user)
+
+    def get_context_data(self, **kwargs):
+        kwargs['label'] = job_label(self.object)
+        return super().get_context_data(**kwargs)
 
 
 @login_required
 @supervisor_required
-def task_csv_import_register(request):
-    csv_input = request.session['csv_input']
-    if not csv_input:
-        messages.error(request, 'Could not process data')
-        return HttpResponseRedirect(reverse("supervisors:task_csv_import"))
-
-    tasks = []
-    num = 1
-    for c in csv_input:
-        task = Task(name=c['name'], source_content=c['text'], instructions=c['instructions'], priority=c['priority'])
-        if c.get('source_language', None):
-            task.source_language = Language.objects.get(id=c.get('source_language'))
-        langs = Language.objects.filter(id__in=c['target_languages']).exclude(name="Unknown")
-        form = TaskCreateForm(instance=task, initial={'languages': langs}, prefix='task'+str(num))
-        d = {'task': task, 'form': form, 'raw_data': str(c), 'num': num}
-        tasks.append(d)
-        num += 1
+def job_status(request, pk):
+    # polled by the job page while the job runs
+    job = get_object_or_404(Job, pk=pk, owner=request.user)
+    return JsonResponse({
+        'id': job.pk,
+        'kind': job.kind,
+        'label': job_label(job),
+        'status': job.get_status_display().lower(),
+        'finished': job.status in (Job.DONE, Job.FAILED),
+        'attempts': job.attempts,
+        'progress': job.progress,
+        'total': job.total,
+        'percent': job.get_percent(),
+        'message': job.message,
+        'url': job.result_url if job.status == Job.DONE else '',
+    })
 
-    if request.method == 'POST':
-        for task in tasks:
-            form = TaskCreateForm(request.POST, instance=task['task'], prefix='task'+str(task['num']))
-            print(form)
-            if form.is_valid():
-                task = form.save(commit=False)
-                task.owner = request.user
-                ps = PointScore(text=form.cleaned_data['source_content'], priority=form.cleaned_data['priority'])
-                task.word_count = ps.word_count
-                task.point_score = ps.score()
-                task.point_score_version = ps.version
-                task.save()
-                for lang in form.cleaned_data['languages']:
-                    if not lang == task.source_language:  # filter out the source language
-                        t = task.translations.create(language=lang)
-                form.save_m2m()  # save the many-to-many data for the form
-        messages.success(request, 'Tasks added')
-        return redirect('supervisors:task_change_list')
 
-    return render(request, 'translatelab/supervisors/task_csv_import_register.html', {'tasks': tasks})
+@login_required
+@supervisor_required
+def job_download(request, pk):
+    job = get_object_or_404(Job, pk=pk, owner=request.user, kind='export', status=Job.DONE)
+    path, file_name = export_path(job)
+    if not os.path.exists(path):
+        raise Http404('The export is no longer there')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=file_name)
 
 
 @method_decorator([login_required, supervisor_required], name='dispatch')
-class ClientListView(ListView):
+class ClientListView(KeysetListMixin, ListView):
     model = Client
     context_object_name = 'clients'
     template_name = 'translatelab/supervisors/client_list.html'
 
+    sort_orders = {
+        'name': ('name', 'pk'),
+        'points': ('-points_owed', '-pk'),  # as of the last roll-up, as the balance shown has no index to sort on
+    }
+    default_sort = 'name'
+    search_fields = ('name__icontains', 'code__icontains')
+
     def get_queryset(self):
         queryset = Client.objects.all()
         return queryset
 
+    def annotate_queryset(self, queryset):
+        tasks = Task.objects.filter(client=OuterRef('pk'))
+        return queryset\
+            .only('name', 'code', 'points_owed')\
+            .annotate(points_balance=points_balance('client'),
+                      task_count=subquery_count(tasks, 'client'),
+                      open_task_count=subquery_count(tasks.filter(approved=False), 'client'),
+                      last_order=Subquery(tasks.order_by().values('client').annotate(last=Max('time_created'))
+                                          .values('last')))
+
 
 @method_decorator([login_required, supervisor_required], name='dispatch')
 class ClientCreateView(CreateView):
@@ -466,6 +655,10 @@ class ClientDetailsView(DetailView):
     model = Client
     template_name = 'translatelab/supervisors/client_details.html'
 
+    def get_context_data(self, **kwargs):
+        kwargs['tasks'] = self.object.tasks.only('client', 'name', 'status', 'approved').order_by('-pk')
+        return super().get_context_data(**kwargs)
+
 
 @method_decorator([login_required, supervisor_required], name='dispatch')
 class ClientUpdateView(UpdateView):
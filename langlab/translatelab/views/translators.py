@@ -1,17 +1,17 @@
 from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
-from django.db import transaction
-from django.db.models import Count
+from django.db.models import Q
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
+from django.utils.functional import cached_property
 from django.views.generic import CreateView, ListView, UpdateView, DetailView
-from datetime import datetime, timezone
 
 from ..decorators import translator_required
 from ..forms import TranslatorLanguagesForm, TranslatorSignUpForm, TranslationForm, ValidationForm
-from ..models import Task, Translator, Translation, User, Language
+from ..models import Translator, Translation, User, WorkItem
+from ..pagination import KeysetListMixin
 
 
 class TranslatorSignUpView(CreateView):
@@ -45,56 +45,35 @@ class TranslatorLanguagesView(UpdateView):
 
 
 @method_decorator([login_required, translator_required], name='dispatch')
-class TaskListView(ListView):
-    model = Translation
-    ordering = ('name', )
-    context_object_name = 'translations'
+class TaskListView(KeysetListMixin, ListView):
+    model = WorkItem
+    context_object_name = 'work_items'
     template_name = 'translatelab/translators/task_list.html'
 
+    default_tab = 'available'
+    sort_orders = {
+        'newest': ('-pk', ),
+        'oldest': ('pk', ),
+    }
+    default_sort = 'oldest'
+    default_sorts = {'drafts': 'newest', 'completed': 'newest'}
+    search_fields = ('translation__task__name__icontains', )
+
+    @cached_property
+    def tabs(self):
+        translator_id = self.request.user.pk
+        pair_codes = self.request.user.translator.eligible_pair_codes()
+        return {
+            'available': Q(state=WorkItem.AVAILABLE, pair_code__in=pair_codes) & ~Q(excluded_id=translator_id),
+            'drafts': Q(assignee_id=translator_id, state=WorkItem.DRAFT),
+            'completed': Q(assignee_id=translator_id, state=WorkItem.COMPLETED),
+        }
+
     def get_queryset(self):
-        translator = self.request.user.translator
-        translator_languages = translator.languages.values_list('pk', flat=True)
-
-        queryset_trans = Translation.objects.filter(language__in=translator_languages)\
-            .filter(task__source_language__in=translator_languages).exclude(translator__isnull=False)\
-            .select_related('task').select_related('language')
-        queryset_valid = Translation.objects.filter(language__in=translator_languages)\
-            .filter(task__source_language__in=translator_languages)\
-            .exclude(translator__isnull=True)\
-            .exclude(translation_time_finished__isnull=True)\
-            .exclude(validator__isnull=False)\
-            .exclude(translator=translator)\
-            .select_related('task').select_related('language')
-        queryset = queryset_trans | queryset_valid
-        return queryset
-
-    def drafts(self):
-        queryset_tran = self.request.user.translator.translations.filter(translation_time_finished__isnull=True) \
-            .select_related('task').select_related('language') \
-            .order_by('task__name')
-        for t in queryset_tran:
-            t.tasktype = 'Translation'
-        queryset_val = self.request.user.translator.validated_translations.filter(translation_time_finished__isnull=True)\
-            .select_related('task').select_related('language') \
-            .order_by('task__name')
-        for v in queryset_val:
-            v.tasktype = 'Validation'
-        queryset = queryset_tran | queryset_val
-        return queryset
-
-    def completed(self):
-        queryset_tran = self.request.user.translator.translations.filter(translation_time_finished__isnull=False) \
-            .select_related('task').select_related('language') \
-            .order_by('task__name')
-        for t in queryset_tran:
-            t.tasktype = 'Translation'
-        queryset_val = self.request.user.translator.validated_translations.filter(validation_time_finished__isnull=False) \
-            .select_related('task').select_related('language') \
-            .order_by('task__name')
-        for v in queryset_val:
-            v.tasktype = 'Validation'
-        queryset = queryset_tran | queryset_val
-        return queryset
+        return WorkItem.objects.select_related('translation__task', 'source_language', 'language')\
+            .only('kind', 'state', 'translation_id', 'time_started', 'time_finished', 'translation__task__name',
+                  'translation__task__point_score', 'translation__task__priority', 'source_language__name',
+                  'source_language__code', 'language__name', 'language__code')
 
 
 @method_decorator([login_required, translator_required], name='dispatch')
@@ -156,29 +135,24 @@ def translate_task(request, pk):
     translation = get_object_or_404(Translation, pk=pk)
     translator = request.user.translator
 
-    # If another translator has accepted the task already, redirect back to list
-    if translation.translator and translation.translator != translator:
+    # Claim the task, unless another translator has accepted it already
+    if translation.translator_id != translator.pk and not translation.claim_translation(translator):
         messages.error(request, 'This task has already been accepted by another translator.')
         return redirect('translators:task_list')
 
-    # Now, the translator has accepted the task. Register the information
-    if not translation.translator:
-        translation.translator = translator
-        translation.translation_time_started = datetime.now(timezone.utc)
-        translation.save()
-
     if request.method == 'POST':
+        if translation.translation_time_finished:
+            messages.error(request, 'This translation is finished, and can no longer be changed.')
+            return redirect('translators:task_list')
         form = TranslationForm(request.POST, instance=translation)
         if form.is_valid():
-            with transaction.atomic():
-                finished_translation = form.save(commit=False)
-                if 'finish' in request.POST:
-                    finished_translation.translation_time_finished = datetime.now(timezone.utc)
-                    messages.success(request, 'Translation was marked as finished. It will now be validated.')
-                elif 'draft' in request.POST:
-                    messages.success(request, 'Translation was saved as draft and can be resumed later.')
-                finished_translation.save()
-                form.save_m2m()
+            # only the fields of the form are written, and only while the translation is still an unfinished draft
+            if not form.save(commit=False).save_translation(form.Meta.fields, finish='finish' in request.POST):
+                messages.error(request, 'This translation was finished or cancelled meanwhile, and was not saved.')
+            elif 'finish' in request.POST:
+                messages.success(request, 'Translation was marked as finished. It will now be validated.')
+            elif 'draft' in request.POST:
+                messages.success(request, 'Translation was saved as draft and can be resumed later.')
             return redirect('translators:task_list')
 
     else:
@@ -197,30 +171,31 @@ def validate_task(request, pk):
     validator = request.user.translator
 
     # Make sure the validator and translator are not the same
-    if translation.translator and translation.translator == validator:
-        messages.error(request, 'This task has already been accepted by another translator.')
+    if translation.translator_id == validator.pk:
+        messages.error(request, 'You cannot validate your own translation.')
         return redirect('translators:task_list')
 
-    # Now, the translator has accepted the task. Register the information
-    if not translation.validator:
-        translation.validator = validator
-        translation.validation_time_started = datetime.now(timezone.utc)
-        translation.save()
+    # Claim the validation, unless another translator has accepted it already
+    if translation.validator_id != validator.pk and not translation.claim_validation(validator):
+        messages.error(request, 'This task has already been accepted by another translator.')
+        return redirect('translators:task_list')
 
     if request.method == 'POST':
+        if translation.validation_time_finished:
+            messages.error(request, 'This validation is finished, and can no longer be changed.')
+            return redirect('translators:task_list')
         form = ValidationForm(request.POST, instance=translation, initial={'validated_text': translation.text})
         if form.is_valid():
-            with transaction.atomic():
-                finished_validation = form.save(commit=False)
-                if 'finish' in request.POST:
-                    finished_validation.validation_time_finished = datetime.now(timezone.utc)
-                    messages.success(request, 'Validation was marked as finished. It will be sent to a supervisor for final approval.')
-                    if finished_validation.validated_text == finished_validation.text:
-                        finished_validation.validated_text = ""
-                elif 'draft' in request.POST:
-                    messages.success(request, 'Validation was saved as draft and can be resumed later.')
-                finished_validation.save()
-                form.save_m2m()
+            finished_validation = form.save(commit=False)
+            if 'finish' in request.POST and finished_validation.validated_text == finished_validation.text:
+                finished_validation.validated_text = ""
+            # only the fields of the form are written, and only while the validation is still an unfinished draft
+            if not finished_validation.save_validation(form.Meta.fields, finish='finish' in request.POST):
+                messages.error(request, 'This validation was finished or cancelled meanwhile, and was not saved.')
+            elif 'finish' in request.POST:
+                messages.success(request, 'Validation was marked as finished. It will be sent to a supervisor for final approval.')
+            elif 'draft' in request.POST:
+                messages.success(request, 'Validation was saved as draft and can be resumed later.')
             return redirect('translators:task_list')
 
     else:
@@ -238,13 +213,10 @@ def translation_cancel(request, pk):
     translation = get_object_or_404(Translation, pk=pk)
     user = request.user
 
+    # conditional UPDATEs, which leave alone a stage that was finished since the translation was read
     if translation.translator_id == user.id and not translation.translation_time_finished:
-        translation.translator = None
-        translation.translation_time_started = None
-        translation.save()
+        translation.cancel_translation()
     elif translation.validator_id == user.id and not translation.validation_time_finished:
-        translation.validator = None
-        translation.validation_time_started = None
-        translation.save()
+        translation.cancel_validation()
 
     return redirect('translators:task_list')
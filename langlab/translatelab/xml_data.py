@@ -0,0 +1,160 @@
+import re
+import zipfile
+from itertools import groupby
+from xml.sax.saxutils import escape, quoteattr
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils.text import slugify
+
+from .csv_data import EXPORT_CHUNK_SIZE
+from .models import Language, Translation
+from .pagination import chunks
+from .point_score import flag_language
+
+# Characters that XML 1.0 does not allow, even escaped
+_XML_INVALID = re.compile('[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+ZIP_BUFFER_SIZE = 64 * 1024  # bytes of the XLIFF archive collected before they are sent
+
+
+def xml_text(value):
+    return escape(_XML_INVALID.sub('', value or ''))
+
+
+def xml_attr(value):
+    return quoteattr(_XML_INVALID.sub('', str(value)))
+
+
+def language_tag(language):
+    """BCP 47 tag of a Language, from the flag in Language.code, or 'und' (undetermined) for a flag not known"""
+    return flag_language(language.code if language else None, 'und')
+
+
+def translation_text(translation):
+    return translation.validated_text or translation.text
+
+
+def segment_state(translation):
+    if translation.task.approved:
+        return 'final'
+    if translation.validation_time_finished:
+        return 'reviewed'
+    if translation.translation_time_finished:
+        return 'translated'
+    return 'initial'
+
+
+def xliff_lines(translations, source, target):
+    """XLIFF 2.0 document of translations of tasks from `source` into `target`, in pieces"""
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<xliff xmlns="urn:oasis:names:tc:xliff:document:2.0" version="2.0" srcLang=%s trgLang=%s>\n' % (
+        xml_attr(language_tag(source)), xml_attr(language_tag(target)))
+    yield '  <file id="f1">\n'
+    for translation in translations:
+        task = translation.task
+        lines = ['    <unit id="u%d" name=%s>\n' % (translation.pk, xml_attr(task.name))]
+        if task.instructions:
+            lines.append('      <notes><note category="instructions">%s</note></notes>\n'
+                         % xml_text(task.instructions))
+        lines.append('      <segment state="%s">\n' % segment_state(translation))
+        lines.append('        <source>%s</source>\n' % xml_text(task.source_content))
+        if translation_text(translation):
+            lines.append('        <target>%s</target>\n' % xml_text(translation_text(translation)))
+        lines.append('      </segment>\n    </unit>\n')
+        yield ''.join(lines)
+    yield '  </file>\n</xliff>\n'
+
+
+class ZipBuffer:
+    """Write-only file that zipfile writes an archive into, and that a streaming response takes the bytes out of"""
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        self.size = 0
+        return data
+
+
+def xliff_archive(tasks, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Bytes of a ZIP archive with an XLIFF 2.0 file per language pair of a queryset of tasks, as XLIFF has a single
+    source and target language per document. The translations are read with a single query, ordered by language pair,
+    and the archive is written and sent as they are read.
+    """
+    languages = Language.objects.in_bulk()
+    translations = Translation.objects.filter(task__in=tasks).select_related('task')\
+        .only('language_id', 'text', 'validated_text', 'translation_time_finished', 'validation_time_finished',
+              'task__name', 'task__source_content', 'task__source_language_id', 'task__instructions',
+              'task__approved')\
+        .order_by('task__source_language', 'language', 'pk')
+    buffer = ZipBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for (source_id, target_id), pair in groupby(translations.iterator(chunk_size=chunk_size),
+                                                    key=lambda t: (t.task.source_language_id, t.language_id)):
+            source, target = languages.get(source_id), languages.get(target_id)
+            # the ids keep the names apart when two languages have the same name
+            name = '%s-%s.xlf' % tuple('%s_%d' % (slugify(language.name) if language else 'none', language_id or 0)
+                                       for language, language_id in ((source, source_id), (target, target_id)))
+            with archive.open(name, 'w', force_zip64=True) as file:
+                for piece in xliff_lines(pair, source, target):
+                    file.write(piece.encode('utf-8'))
+                    if buffer.size >= ZIP_BUFFER_SIZE:
+                        yield buffer.take()
+    yield buffer.take()
+
+
+def xliff_export(tasks):
+    """Streams the XLIFF export of a queryset of tasks as a download"""
+    response = StreamingHttpResponse(xliff_archive(tasks), content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="task_export.zip"'
+    return response
+
+
+def tmx_lines(tasks, chunk_size=EXPORT_CHUNK_SIZE):
+    """TMX 1.4 document of a queryset of tasks, a translation unit per task with text in every language, in pieces"""
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<tmx version="1.4">\n'
+    yield '  <header creationtool="langlab" creationtoolversion="1" segtype="paragraph" o-tmf="langlab" ' \
+          'adminlang="en" srclang="*all*" datatype="plaintext"/>\n'
+    yield '  <body>\n'
+    translations = Translation.objects.select_related('language')\
+        .only('task_id', 'text', 'validated_text', 'language__code')
+    tasks = tasks.select_related('source_language').only('name', 'source_content', 'source_language__code')\
+        .prefetch_related(Prefetch('translations', translations))
+    for chunk in chunks(tasks, chunk_size):
+        for task in chunk:
+            variants = [(language_tag(translation.language), translation_text(translation))
+                        for translation in task.translations.all() if translation_text(translation)]
+            if not variants:
+                continue
+            source = language_tag(task.source_language)
+            lines = ['    <tu tuid="%d" srclang=%s>\n' % (task.pk, xml_attr(source)),
+                     '      <prop type="x-name">%s</prop>\n' % xml_text(task.name)]
+            for tag, text in [(source, task.source_content)] + variants:
+                lines.append('      <tuv xml:lang=%s><seg>%s</seg></tuv>\n' % (xml_attr(tag), xml_text(text)))
+            lines.append('    </tu>\n')
+            yield ''.join(lines)
+    yield '  </body>\n</tmx>\n'
+
+
+def tmx_export(tasks):
+    """Streams the TMX export of a queryset of tasks as a download"""
+    response = StreamingHttpResponse(tmx_lines(tasks), content_type='application/x-tmx+xml; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="task_export.tmx"'
+    return response